@@ -24,6 +24,14 @@ def create_app(config_class=Config, config_name=None):
     # 3. Register Blueprints (Routes)
     from .routes import register_blueprints
     register_blueprints(app)
+    from .cli import register_commands
+    register_commands(app)
+    from .services.report_cache import init_report_cache
+    init_report_cache(app)
+    from .instrumentation import init_instrumentation
+    init_instrumentation(app)
+    from .profiling import init_profiling
+    init_profiling(app)
 
     # 4. Import Models (Required to create the database tables)
     # This line ensures SQLAlchemy knows about all your classes (Property, Unit, etc.)
@@ -34,6 +42,9 @@ def create_app(config_class=Config, config_name=None):
     with app.app_context():
         # Only create tables if the database doesn't exist
         db.create_all()
+        # create_all leaves existing tables alone, so add any indexes they are missing
+        models.ensure_indexes(db.engine)
+        models.ensure_database_identity(db.engine)
 
     @app.route('/')
     def index():
@@ -0,0 +1,137 @@
+# Service-level benchmarks, run with `flask --app src:create_app benchmark`.
+#
+# Every scale gets a fresh SQLite file filled by services.synthetic.generate_portfolio with
+# a fixed seed, so runs on different commits measure the same data. Each case reports its
+# wall time over several runs, the SQL statements it issued and its peak Python memory
+# (traced in a separate run, as tracing slows the code down).
+from . import create_app, db
+from .services.synthetic import generate_portfolio
+from .services.rent_roll import generate_rent_roll
+from .services.kpis import move_in_out_counts, occupancy_rate_for_month
+from .instrumentation import count_queries
+from .models import Property
+from sqlalchemy import select, func
+from datetime import date, datetime, timezone
+import os
+import platform
+import statistics
+import tempfile
+import time
+import tracemalloc
+
+# generate_portfolio() arguments of each named scale
+BENCHMARK_SCALES = {
+    'small': {'properties': 2, 'units_per_property': 20, 'years': 2},
+    'medium': {'properties': 10, 'units_per_property': 100, 'years': 3},
+    'large': {'properties': 40, 'units_per_property': 250, 'years': 5},
+}
+
+BENCHMARK_START = date(2020, 1, 1)
+
+
+def run_benchmarks(config_class, scales=('small',), repeat=3, seed=0, database_dir=None):
+    """
+    Runs every case at each scale (names from BENCHMARK_SCALES, or a {name: arguments}
+    dict) and returns the results as a JSON-serialisable dict.
+    """
+    if not isinstance(scales, dict):
+        unknown = [name for name in scales if name not in BENCHMARK_SCALES]
+        if unknown:
+            raise ValueError(f"Unknown scale(s) {', '.join(unknown)}. Use: {', '.join(BENCHMARK_SCALES)}")
+        scales = {name: BENCHMARK_SCALES[name] for name in scales}
+    results = {
+        'generated_at': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'seed': seed,
+        'repeat': repeat,
+        'scales': [],
+    }
+    with tempfile.TemporaryDirectory(dir=database_dir) as directory:
+        for name, arguments in scales.items():
+            results['scales'].append(
+                _run_scale(config_class, name, arguments, repeat, seed, os.path.join(directory, f'{name}.db')))
+    return results
+
+
+def _run_scale(config_class, name, arguments, repeat, seed, path):
+    config = type('BenchmarkConfig', (config_class,), {
+        'SQLALCHEMY_DATABASE_URI': 'sqlite:///' + path,
+        'REPORT_CACHE_MAX_ENTRIES': 0,
+        'TESTING': True,
+    })
+    app = create_app(config_class=config)
+    with app.app_context():
+        started = time.perf_counter()
+        rows = generate_portfolio(start_date=BENCHMARK_START, seed=seed, **arguments)
+        db.session.commit()
+        load_seconds = time.perf_counter() - started
+        property_id = db.session.execute(select(func.min(Property.id))).scalar()
+        db.session.remove()
+
+    years = arguments.get('years', 3)
+    last_year = BENCHMARK_START.year + years - 1
+    year_start, year_end = date(last_year, 1, 1), date(last_year, 12, 31)
+    client = app.test_client()
+    cases = [
+        ('rent_roll_sweep_year', lambda: generate_rent_roll(property_id, year_start, year_end)),
+        ('rent_roll_computed_year', lambda: _without_facts(
+            app, lambda: generate_rent_roll(property_id, year_start, year_end))),
+        ('rent_roll_legacy_month', lambda: generate_rent_roll(
+            property_id, year_start, date(last_year, 1, 31), engine='legacy')),
+        ('occupancy_rate_for_month', lambda: occupancy_rate_for_month(property_id, last_year, 6)),
+        ('move_in_out_counts_year', lambda: move_in_out_counts(property_id, year_start, year_end)),
+        ('list_properties', lambda: _get(client, '/properties')),
+        ('list_units_page', lambda: _get(client, '/units?limit=500')),
+        ('list_residents_page', lambda: _get(client, '/residents?limit=500')),
+        ('list_occupancies_page', lambda: _get(client, '/occupancies?limit=500')),
+    ]
+    results = [_measure(app, case_name, case, repeat) for case_name, case in cases]
+    with app.app_context():
+        db.session.remove()
+        db.engine.dispose()
+    return {'scale': name, 'arguments': arguments, 'rows': rows, 'load_seconds': round(load_seconds, 4),
+            'cases': results}
+
+
+def _measure(app, name, case, repeat):
+    timings = []
+    queries = 0
+    for _ in range(max(repeat, 1)):
+        with app.app_context(), count_queries() as stats:
+            started = time.perf_counter()
+            case()
+            timings.append(time.perf_counter() - started)
+            db.session.remove()
+        queries = stats.count
+    with app.app_context():
+        tracemalloc.start()
+        try:
+            case()
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+            db.session.remove()
+    return {
+        'name': name,
+        'wall_seconds': {'min': round(min(timings), 6), 'median': round(statistics.median(timings), 6),
+                         'max': round(max(timings), 6)},
+        'queries': queries,
+        'peak_memory_bytes': peak,
+    }
+
+
+def _without_facts(app, compute):
+    use_facts = app.config.get('USE_FACT_TABLE', True)
+    app.config['USE_FACT_TABLE'] = False
+    try:
+        return compute()
+    finally:
+        app.config['USE_FACT_TABLE'] = use_facts
+
+
+def _get(client, url):
+    response = client.get(url)
+    if response.status_code != 200:
+        raise RuntimeError(f'GET {url} returned {response.status_code}')
+    return response.get_data()
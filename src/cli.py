@@ -0,0 +1,157 @@
+# Flask CLI commands, e.g. `flask --app src:create_app rebuild-facts`
+import click
+
+
+def register_commands(app):
+    @app.cli.command('rebuild-facts')
+    @click.option('--property-id', type=int, default=None, help='Only rebuild the units of this property.')
+    def rebuild_facts_command(property_id):
+        """Recompute the rent roll fact table from the source tables."""
+        from . import db
+        from .services.facts import rebuild_facts
+        count = rebuild_facts(property_id)
+        db.session.commit()
+        click.echo(f'Rebuilt facts for {count} unit(s)')
+
+    @app.cli.command('import-data')
+    @click.argument('path', type=click.Path(exists=True, dir_okay=False))
+    @click.option('--format', 'fmt', type=click.Choice(['csv', 'ndjson']), default=None,
+                  help='Defaults from the file extension.')
+    @click.option('--dry-run', is_flag=True, help='Only validate the file.')
+    def import_data_command(path, fmt, dry_run):
+        """Bulk import properties, units, residents and occupancies from a CSV or NDJSON file."""
+        from . import db
+        from .services.bulk_import import parse_import, import_records
+        fmt = fmt or ('csv' if path.lower().endswith('.csv') else 'ndjson')
+        with open(path, encoding='utf-8') as f:
+            records = parse_import(f.read(), fmt)
+        counts, errors = import_records(records, dry_run=dry_run)
+        if errors:
+            for error in errors:
+                click.echo(f"row {error['row']}: {error['error']}", err=True)
+            raise click.ClickException(f'{len(errors)} invalid row(s); nothing was imported')
+        if not dry_run:
+            db.session.commit()
+        summary = ', '.join(f'{n} {kind}' for kind, n in counts.items())
+        click.echo(f"{'Validated' if dry_run else 'Imported'} {summary}")
+
+    @app.cli.command('escalate-rents')
+    @click.option('--effective-date', required=True, type=click.DateTime(formats=['%Y-%m-%d']))
+    @click.option('--percent', type=float, default=None, help='Percentage increase, e.g. 3.5.')
+    @click.option('--amount', type=int, default=None, help='Fixed increase per lease.')
+    @click.option('--property-id', type=int, default=None, help='Only escalate leases of this property.')
+    @click.option('--dry-run', is_flag=True, help='Only report the changes.')
+    def escalate_rents_command(effective_date, percent, amount, property_id, dry_run):
+        """Add a rent increase for every lease active on the effective date."""
+        from . import db
+        from .services.rent_escalation import escalate_rents
+        rule = {'property_id': property_id}
+        if percent is not None:
+            rule['percent'] = percent
+        if amount is not None:
+            rule['amount'] = amount
+        try:
+            changes = escalate_rents(effective_date.date(), [rule], dry_run=dry_run)
+        except ValueError as e:
+            raise click.ClickException(str(e))
+        if not dry_run:
+            db.session.commit()
+        click.echo(f"{'Would escalate' if dry_run else 'Escalated'} {len(changes)} lease(s)")
+
+    @app.cli.command('generate-data')
+    @click.option('--properties', type=click.IntRange(min=1), default=10, show_default=True)
+    @click.option('--units', 'units_per_property', type=click.IntRange(min=1), default=50, show_default=True, help='Units per property.')
+    @click.option('--years', type=click.IntRange(min=1), default=3, show_default=True, help='Years of turnover history.')
+    @click.option('--start-date', type=click.DateTime(formats=['%Y-%m-%d']), default='2022-01-01', show_default=True)
+    @click.option('--rent-changes', 'rent_changes_per_year', type=float, default=1, show_default=True,
+                  help='Rent changes per year of stay.')
+    @click.option('--status-toggles', 'status_toggles_per_year', type=float, default=0.1, show_default=True,
+                  help='Inactive stretches per unit and year.')
+    @click.option('--occupancy-rate', type=float, default=0.9, show_default=True)
+    @click.option('--seed', type=int, default=0, show_default=True)
+    @click.option('--name-prefix', default='Synthetic', show_default=True)
+    def generate_data_command(start_date, **options):
+        """Bulk-load a deterministic synthetic portfolio into the configured database."""
+        from . import db
+        from .services.synthetic import generate_portfolio
+        counts = generate_portfolio(start_date=start_date.date(), **options)
+        db.session.commit()
+        click.echo('Generated ' + ', '.join(f'{n} {kind}' for kind, n in counts.items()))
+
+    @app.cli.command('benchmark')
+    @click.option('--scale', 'scales', multiple=True, default=['small'], show_default=True,
+                  help='small, medium or large; repeat the option to run several.')
+    @click.option('--repeat', type=int, default=3, show_default=True, help='Timed runs per case.')
+    @click.option('--seed', type=int, default=0, show_default=True)
+    @click.option('--output', type=click.Path(dir_okay=False, writable=True), default=None,
+                  help='Write the JSON results here instead of to stdout.')
+    def benchmark_command(scales, repeat, seed, output):
+        """Time the rent roll, KPI and list endpoints on synthetic data (each scale in its own temporary database)."""
+        import json
+        from .benchmark import run_benchmarks
+        try:
+            # Same settings as this app, but every scale uses its own temporary database
+            base_config = type('BenchmarkBaseConfig', (), dict(app.config))
+            results = run_benchmarks(base_config, scales=scales, repeat=repeat, seed=seed)
+        except ValueError as e:
+            raise click.ClickException(str(e))
+        body = json.dumps(results, indent=2)
+        if output:
+            with open(output, 'w', encoding='utf-8') as f:
+                f.write(body + '\n')
+            for scale in results['scales']:
+                click.echo(f"{scale['scale']}: " + ', '.join(
+                    f"{case['name']} {case['wall_seconds']['median'] * 1000:.1f}ms/{case['queries']}q"
+                    for case in scale['cases']), err=True)
+        else:
+            click.echo(body)
+
+    @app.cli.command('loadtest')
+    @click.option('--url', default=None, help='Base URL of a running instance; defaults to calling this app in-process.')
+    @click.option('--clients', type=int, default=8, show_default=True, help='Concurrent clients.')
+    @click.option('--duration', type=float, default=10.0, show_default=True, help='Seconds to run for.')
+    @click.option('--requests', 'requests_per_client', type=int, default=None,
+                  help='Stop each client after this many requests instead of after --duration.')
+    @click.option('--mix', default=None, help='Scenario weights, e.g. rent_roll=2,kpi=3,list=3,turnover=2.')
+    @click.option('--seed', type=int, default=0, show_default=True)
+    @click.option('--read-start', type=click.DateTime(formats=['%Y-%m-%d']), default=None,
+                  help='First day the reads cover [default: a year before --read-end].')
+    @click.option('--read-end', type=click.DateTime(formats=['%Y-%m-%d']), default=None,
+                  help='Last day the reads cover [default: today].')
+    @click.option('--synthetic-properties', type=click.IntRange(min=0), default=0, show_default=True,
+                  help='In-process only: read a synthetic portfolio of this many properties generated for the run.')
+    @click.option('--synthetic-units', type=click.IntRange(min=1), default=50, show_default=True, help='Units per synthetic property.')
+    @click.option('--synthetic-years', type=click.IntRange(min=1), default=3, show_default=True, help='Years of synthetic history.')
+    @click.option('--allow-writes', is_flag=True,
+                  help='Run turnovers against --url; their rows stay in the target database.')
+    @click.option('--output', type=click.Path(dir_okay=False, writable=True), default=None,
+                  help='Write the JSON report here instead of to stdout.')
+    def loadtest_command(url, clients, duration, requests_per_client, mix, seed, read_start, read_end,
+                         synthetic_properties, synthetic_units, synthetic_years, allow_writes, output):
+        """Replay a mix of concurrent reads and writes and report latency percentiles per endpoint."""
+        import json
+        from .loadtest import run_load_test
+        try:
+            weights = None
+            if mix:
+                weights = {name.strip(): float(weight) for name, weight in
+                           (part.split('=', 1) for part in mix.split(','))}
+            report = run_load_test(app=None if url else app, url=url, clients=clients, duration=duration,
+                                   requests_per_client=requests_per_client, mix=weights, seed=seed,
+                                   read_start=read_start.date() if read_start else None,
+                                   read_end=read_end.date() if read_end else None,
+                                   synthetic_properties=synthetic_properties, synthetic_units=synthetic_units,
+                                   synthetic_years=synthetic_years, allow_writes=allow_writes)
+        except ValueError as e:
+            raise click.ClickException(str(e))
+        body = json.dumps(report, indent=2)
+        if output:
+            with open(output, 'w', encoding='utf-8') as f:
+                f.write(body + '\n')
+            for endpoint, stats in report['endpoints'].items():
+                latency = stats['latency_ms']
+                click.echo(f"{endpoint}: {stats['requests']} req, {stats['throughput_per_second']}/s, "
+                           f"p50 {latency['p50']}ms p95 {latency['p95']}ms p99 {latency['p99']}ms, "
+                           f"errors {stats['error_rate']:.1%}", err=True)
+        else:
+            click.echo(body)
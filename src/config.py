@@ -29,10 +29,49 @@ class Config:
     # Secret Key is required by Flask
     SECRET_KEY = os.environ.get('SECRET_KEY') or 'a-very-secret-and-hard-to-guess-string'
 
+    # Largest page a list endpoint will return when ?limit= is used
+    MAX_PAGE_SIZE = int(os.environ.get('MAX_PAGE_SIZE', 1000))
+
+    # Largest number of items accepted by the batch move-in / rent-change endpoints
+    MAX_BATCH_ITEMS = int(os.environ.get('MAX_BATCH_ITEMS', 10000))
+
+    # Portfolio rent rolls: pool size (0 = one per CPU) and pool type ('thread' or 'process')
+    PORTFOLIO_WORKERS = int(os.environ.get('PORTFOLIO_WORKERS', 0))
+    PORTFOLIO_EXECUTOR = os.environ.get('PORTFOLIO_EXECUTOR', 'thread')
+
+    # Read rent rolls and occupancy KPIs from the precomputed fact table when it is fresh
+    USE_FACT_TABLE = os.environ.get('USE_FACT_TABLE', '1') == '1'
+
+    # Cache of rent roll and KPI responses (0 entries disables it). The 'memory' backend is
+    # per process; 'sqlite' shares one file (REPORT_CACHE_PATH) between all worker processes
+    # and expires entries after REPORT_CACHE_TTL seconds (0 = never)
+    REPORT_CACHE_BACKEND = os.environ.get('REPORT_CACHE_BACKEND', 'memory')
+    REPORT_CACHE_PATH = os.environ.get('REPORT_CACHE_PATH', os.path.join(BASEDIR, 'report_cache.db'))
+    REPORT_CACHE_TTL = int(os.environ.get('REPORT_CACHE_TTL', 3600))
+    REPORT_CACHE_MAX_ENTRIES = int(os.environ.get('REPORT_CACHE_MAX_ENTRIES', 256))
+    REPORT_CACHE_MAX_BYTES = int(os.environ.get('REPORT_CACHE_MAX_BYTES', 64 * 1024 * 1024))
+    REPORT_CACHE_MAX_ENTRY_BYTES = int(os.environ.get('REPORT_CACHE_MAX_ENTRY_BYTES', 8 * 1024 * 1024))
+
+    # Count and time the SQL of every request: Server-Timing headers, a log line per request
+    # (logger 'src.requests') and per-endpoint totals at GET /metrics
+    REQUEST_METRICS = os.environ.get('REQUEST_METRICS', '1') == '1'
+
+    # Opt-in profiling of requests sent with `X-Profile: 1` or `?profile=1`. PROFILER is
+    # 'sampling' (collapsed stacks for flame graphs, sampled every PROFILE_SAMPLE_INTERVAL
+    # seconds) or 'cprofile' (pstats); the newest PROFILE_MAX_FILES profiles are kept in
+    # PROFILE_DIR and served at GET /admin/profiles
+    PROFILING_ENABLED = os.environ.get('PROFILING_ENABLED', '0') == '1'
+    PROFILER = os.environ.get('PROFILER', 'sampling')
+    PROFILE_DIR = os.environ.get('PROFILE_DIR', os.path.join(BASEDIR, 'profiles'))
+    PROFILE_MAX_FILES = int(os.environ.get('PROFILE_MAX_FILES', 20))
+    PROFILE_SAMPLE_INTERVAL = float(os.environ.get('PROFILE_SAMPLE_INTERVAL', 0.005))
+
 class TestingConfig(Config):
     """Configuration used specifically for running Pytest."""
     TESTING = True
     # Crucial: Use an in-memory SQLite database for fast, isolated testing
     SQLALCHEMY_DATABASE_URI = 'sqlite:///:memory:'
     # Disabling logging during tests for cleaner output
-    SQLALCHEMY_ECHO = False
\ No newline at end of file
+    SQLALCHEMY_ECHO = False
+    # Each test rolls its data back, so ids (and data versions) are reused across tests
+    REPORT_CACHE_MAX_ENTRIES = 0
\ No newline at end of file
@@ -0,0 +1,186 @@
+# Per-request SQL instrumentation.
+#
+# Engine events count every statement and time it. While a request is being handled its
+# totals go to the request (g) and come back out as a Server-Timing header, one structured
+# log line per request and per-endpoint aggregates served by GET /metrics. Outside requests,
+# count_queries() and assert_max_queries() collect the same numbers for a block of code,
+# e.g. in tests:
+#
+#     with assert_max_queries(4):
+#         generate_rent_roll(property_id, start, end)
+#
+# Statements run by other threads (e.g. portfolio rent roll workers) count towards the
+# code running on those threads, not the request that started them.
+from contextlib import contextmanager
+from functools import partial
+from flask import g, has_app_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from threading import Lock, local
+import json
+import logging
+import time
+
+request_logger = logging.getLogger('src.requests')
+
+_counters = local()
+
+
+class QueryStats:
+    """Number of statements executed and seconds spent executing them."""
+
+    def __init__(self, keep_statements=False):
+        self.count = 0
+        self.seconds = 0.0
+        self.statements = [] if keep_statements else None
+
+    def add(self, statement, seconds):
+        self.count += 1
+        self.seconds += seconds
+        if self.statements is not None:
+            self.statements.append(statement)
+
+
+@contextmanager
+def count_queries(keep_statements=False):
+    """Collects the QueryStats of the statements this thread executes inside the block."""
+    stats = QueryStats(keep_statements)
+    active = _counters.__dict__.setdefault('active', [])
+    active.append(stats)
+    try:
+        yield stats
+    finally:
+        active.remove(stats)
+
+
+@contextmanager
+def assert_max_queries(limit):
+    """Fails with the executed statements if the block runs more than limit statements."""
+    with count_queries(keep_statements=True) as stats:
+        yield stats
+    if stats.count > limit:
+        listing = '\n'.join(f'  {" ".join(statement.split())}' for statement in stats.statements)
+        raise AssertionError(f'{stats.count} queries executed, expected at most {limit}:\n{listing}')
+
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _start_timer(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('_query_started', []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def _record_query(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info.get('_query_started')
+    if not started:
+        return
+    seconds = time.perf_counter() - started.pop()
+    for stats in getattr(_counters, 'active', ()):
+        stats.add(statement, seconds)
+    if has_app_context():
+        stats = g.get('_request_query_stats')
+        if stats is not None:
+            stats.add(statement, seconds)
+
+
+@event.listens_for(Engine, 'handle_error')
+def _drop_timer(exception_context):
+    connection = exception_context.connection
+    if connection is not None and connection.info.get('_query_started'):
+        connection.info['_query_started'].pop()
+
+
+class RequestMetrics:
+    """Thread-safe per-endpoint totals of request count, latency, statements and DB time."""
+
+    def __init__(self):
+        self._lock = Lock()
+        self._endpoints = {}
+
+    def record(self, endpoint, status, seconds, stats):
+        with self._lock:
+            totals = self._endpoints.get(endpoint)
+            if totals is None:
+                totals = self._endpoints[endpoint] = {
+                    'requests': 0, 'errors': 0, 'seconds': 0.0, 'max_seconds': 0.0,
+                    'queries': 0, 'max_queries': 0, 'db_seconds': 0.0,
+                }
+            totals['requests'] += 1
+            totals['errors'] += status >= 500
+            totals['seconds'] += seconds
+            totals['max_seconds'] = max(totals['max_seconds'], seconds)
+            totals['queries'] += stats.count
+            totals['max_queries'] = max(totals['max_queries'], stats.count)
+            totals['db_seconds'] += stats.seconds
+
+    def snapshot(self):
+        with self._lock:
+            endpoints = {endpoint: dict(totals) for endpoint, totals in self._endpoints.items()}
+        return {
+            endpoint: {
+                'requests': totals['requests'],
+                'errors': totals['errors'],
+                'avg_ms': round(totals['seconds'] * 1000 / totals['requests'], 3),
+                'max_ms': round(totals['max_seconds'] * 1000, 3),
+                'avg_queries': round(totals['queries'] / totals['requests'], 2),
+                'max_queries': totals['max_queries'],
+                'avg_db_ms': round(totals['db_seconds'] * 1000 / totals['requests'], 3),
+            }
+            for endpoint, totals in sorted(endpoints.items())
+        }
+
+    def reset(self):
+        with self._lock:
+            self._endpoints.clear()
+
+
+def init_instrumentation(app):
+    """Hooks the request timing into app unless REQUEST_METRICS is off."""
+    if not app.config.get('REQUEST_METRICS', True):
+        return
+    metrics = app.extensions['request_metrics'] = RequestMetrics()
+
+    @app.before_request
+    def _start_request():
+        g._request_started = time.perf_counter()
+        g._request_query_stats = QueryStats()
+        # g outlives the request while an outer app context is pushed, so clear the last request's state
+        g._recorded_on_close = False
+        g.pop('_response_status', None)
+
+    @app.after_request
+    def _add_server_timing(response):
+        stats = g.get('_request_query_stats')
+        if stats is None:
+            return response
+        elapsed = time.perf_counter() - g._request_started
+        response.headers['Server-Timing'] = (
+            f'db;dur={stats.seconds * 1000:.2f};desc="{stats.count} queries", app;dur={elapsed * 1000:.2f}')
+        g._response_status = response.status_code
+        if response.is_streamed:
+            # A streamed body runs more statements after this, so record the request once it has been sent
+            g._recorded_on_close = True
+            response.call_on_close(partial(
+                _record_request, metrics, _endpoint(), request.full_path, response.status_code,
+                g._request_started, stats))
+        return response
+
+    @app.teardown_request
+    def _record_unstreamed_request(exc):
+        stats = g.get('_request_query_stats')
+        if stats is None or g.get('_recorded_on_close'):
+            return
+        status = 500 if exc is not None else g.get('_response_status', 200)
+        _record_request(metrics, _endpoint(), request.full_path, status, g._request_started, stats)
+
+
+def _endpoint():
+    return f'{request.method} {request.url_rule.rule if request.url_rule else "<unmatched>"}'
+
+
+def _record_request(metrics, endpoint, path, status, started, stats):
+    elapsed = time.perf_counter() - started
+    metrics.record(endpoint, status, elapsed, stats)
+    request_logger.info(json.dumps({
+        'event': 'request', 'endpoint': endpoint, 'path': path.rstrip('?'), 'status': status,
+        'duration_ms': round(elapsed * 1000, 3), 'queries': stats.count, 'db_ms': round(stats.seconds * 1000, 3),
+    }))
@@ -0,0 +1,354 @@
+# HTTP load tests, run with `flask --app src:create_app loadtest`.
+#
+# Many concurrent clients replay a weighted mix of scenarios (rent roll and KPI reads, list
+# endpoints, and resident move-in/rent-change/move-out turnovers) either against a running
+# instance (--url) or in-process against the WSGI app through Flask test clients, and the
+# latency of every request is recorded per endpoint.
+#
+# Reads go to properties that already have units, or in-process to a synthetic portfolio
+# generated for the run (services.synthetic), so the percentiles reflect real report sizes.
+# Turnovers write to a property created for the run, with one unit per client, so clients
+# never reject each other's stays; what they do share is the database, so lock waits show
+# up as latency and errors. In-process runs delete everything they created when they end.
+# The API has no delete endpoints, so against --url turnovers only run with allow_writes
+# (--allow-writes) and their rows are left behind.
+from . import db
+from .models import Property, Resident
+from .services.synthetic import generate_portfolio, delete_properties, _letters
+from sqlalchemy import select, delete
+from datetime import date, timedelta
+from threading import Barrier
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+import http.client
+import json
+import random
+import time
+
+# Scenario weights used when no mix is given (without the write scenarios when writes are not allowed)
+DEFAULT_LOAD_MIX = {'rent_roll': 2, 'kpi': 3, 'list': 3, 'turnover': 2}
+
+# Scenarios that write to the target database
+WRITE_SCENARIOS = ('turnover',)
+
+# Dates written by turnover scenarios start here, well clear of real data
+LOAD_TEST_START = date(2090, 1, 1)
+
+# Most existing properties the read scenarios spread over
+MAX_READ_PROPERTIES = 100
+
+# Days covered by one rent roll read
+RENT_ROLL_READ_DAYS = 90
+
+
+def run_load_test(app=None, url=None, clients=8, duration=10.0, requests_per_client=None, mix=None, seed=0,
+                  read_start=None, read_end=None, synthetic_properties=0, synthetic_units=50, synthetic_years=3,
+                  allow_writes=False):
+    """
+    Runs the load test against url (e.g. http://localhost:5000) or, without one, against
+    app in-process. Each client runs scenarios drawn from mix ({scenario: weight}, see
+    LOAD_SCENARIOS) until duration seconds have passed, or until it has made
+    requests_per_client requests when that is given.
+
+    Reads cover [read_start, read_end] (by default the last year) of up to
+    MAX_READ_PROPERTIES existing properties with units. In-process runs can instead read
+    synthetic_properties properties of synthetic_units units with synthetic_years of
+    history generated for the run, in which case the dates default to that history.
+    Against url, write scenarios need allow_writes.
+
+    Returns the report of summarize_latencies(), plus the run's settings.
+    """
+    # In-process runs delete their rows again, so they may always write
+    allow_writes = allow_writes or url is None
+    mix = mix or {name: weight for name, weight in DEFAULT_LOAD_MIX.items()
+                  if allow_writes or name not in WRITE_SCENARIOS}
+    unknown = [name for name in mix if name not in LOAD_SCENARIOS]
+    if unknown or not any(weight > 0 for weight in mix.values()):
+        raise ValueError(f"mix needs a positive weight for some of: {', '.join(LOAD_SCENARIOS)}")
+    if (app is None) == (url is None):
+        raise ValueError('Pass either app or url')
+    if not 1 <= clients <= 1000:
+        raise ValueError('clients must be between 1 and 1000')
+    writes = [name for name in WRITE_SCENARIOS if mix.get(name, 0) > 0]
+    if writes and not allow_writes:
+        raise ValueError(f"{', '.join(writes)} writes rows to the target database that the API cannot delete; "
+                         "allow writes (--allow-writes) to run it against a URL")
+    if synthetic_properties and url:
+        raise ValueError('Synthetic properties can only be generated for in-process runs')
+    transport = (lambda: _HTTPTransport(url)) if url else (lambda: _WSGITransport(app))
+
+    run = {'token': _letters(int(time.time() * 1000) % 26 ** 8 + seed).capitalize(),
+           'read_property_ids': [], 'created_property_ids': [], 'created_resident_ids': []}
+    try:
+        _setup(run, app, transport(), clients, seed, mix, read_start, read_end,
+               synthetic_properties, synthetic_units, synthetic_years)
+        report = _run_clients(run, transport, clients, duration, requests_per_client, mix, seed)
+    finally:
+        if url is None:
+            _cleanup(app, run['created_property_ids'], run['created_resident_ids'])
+    report['settings'] = {'target': url or 'in-process', 'clients': clients, 'duration': duration,
+                          'requests_per_client': requests_per_client, 'mix': dict(mix), 'seed': seed,
+                          'read_properties': len(run['read_property_ids']),
+                          'read_start': run['read_start'].isoformat(), 'read_end': run['read_end'].isoformat(),
+                          'synthetic_properties': synthetic_properties,
+                          'write_property_id': run.get('property_id'),
+                          'rows_left_behind': bool(url and writes)}
+    return report
+
+
+def _run_clients(run, transport, clients, duration, requests_per_client, mix, seed):
+    names, weights = zip(*((name, weight) for name, weight in mix.items() if weight > 0))
+    start_line = Barrier(clients)
+
+    def client(index):
+        rng = random.Random(seed * 1000 + index)
+        state = _ClientState(transport(), run, index)
+        start_line.wait()
+        deadline = time.perf_counter() + duration
+        while True:
+            if requests_per_client is not None:
+                if len(state.samples) >= requests_per_client:
+                    break
+            elif time.perf_counter() >= deadline:
+                break
+            LOAD_SCENARIOS[rng.choices(names, weights)[0]](state, rng)
+        return state.samples
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=clients) as pool:
+        samples = [sample for client_samples in pool.map(client, range(clients)) for sample in client_samples]
+    return summarize_latencies(samples, time.perf_counter() - started)
+
+
+def summarize_latencies(samples, elapsed):
+    """
+    samples are (endpoint, status, seconds) tuples, status None for a request that failed
+    without a response. Returns overall and per-endpoint request counts, throughput,
+    error rates (5xx or no response), rejection rates (4xx) and latency percentiles in ms.
+    """
+    by_endpoint = {}
+    for endpoint, status, seconds in samples:
+        by_endpoint.setdefault(endpoint, []).append((status, seconds))
+    summary = {'elapsed_seconds': round(elapsed, 3), 'overall': _stats([s[1:] for s in samples], elapsed)}
+    summary['endpoints'] = {endpoint: _stats(results, elapsed) for endpoint, results in sorted(by_endpoint.items())}
+    return summary
+
+
+def _stats(results, elapsed):
+    count = len(results)
+    latencies = sorted(seconds * 1000 for _, seconds in results)
+    errors = sum(1 for status, _ in results if status is None or status >= 500)
+    rejected = sum(1 for status, _ in results if status is not None and 400 <= status < 500)
+    return {
+        'requests': count,
+        'throughput_per_second': round(count / elapsed, 2) if elapsed > 0 else None,
+        'error_rate': round(errors / count, 4) if count else 0,
+        'rejection_rate': round(rejected / count, 4) if count else 0,
+        'latency_ms': {
+            'p50': _percentile(latencies, 50),
+            'p95': _percentile(latencies, 95),
+            'p99': _percentile(latencies, 99),
+            'max': round(latencies[-1], 3) if latencies else None,
+        },
+    }
+
+
+def _percentile(ordered, percent):
+    """Nearest-rank percentile of an ascending list."""
+    if not ordered:
+        return None
+    rank = max(1, -(-len(ordered) * percent // 100))
+    return round(ordered[int(rank) - 1], 3)
+
+
+# --- scenarios ------------------------------------------------------------------------
+
+
+class _ClientState:
+    def __init__(self, transport, run, index):
+        self.transport = transport
+        self.run = run
+        self.index = index
+        self.unit_id = run['unit_ids'][index] if 'unit_ids' in run else None
+        self.next_move_in = LOAD_TEST_START
+        self.residents = 0
+        self.samples = []
+
+    def request(self, endpoint, method, path, body=None):
+        """Makes one request, records (endpoint, status, seconds) and returns (status, parsed JSON or None)."""
+        started = time.perf_counter()
+        try:
+            status, data = self.transport.request(method, path, body)
+        except Exception:
+            self.samples.append((endpoint, None, time.perf_counter() - started))
+            return None, None
+        self.samples.append((endpoint, status, time.perf_counter() - started))
+        try:
+            return status, json.loads(data) if data else None
+        except ValueError:
+            return status, None
+
+
+def _read_target(state, rng):
+    """A random read property and a random day of the read window."""
+    run = state.run
+    span = (run['read_end'] - run['read_start']).days
+    return rng.choice(run['read_property_ids']), run['read_start'] + timedelta(days=rng.randint(0, span))
+
+
+def _rent_roll(state, rng):
+    property_id, start = _read_target(state, rng)
+    end = min(start + timedelta(days=RENT_ROLL_READ_DAYS - 1), state.run['read_end'])
+    state.request('GET /reports/rent-roll', 'GET',
+                  f"/reports/rent-roll?property_id={property_id}"
+                  f"&start_date={start.isoformat()}&end_date={end.isoformat()}")
+
+
+def _kpi(state, rng):
+    property_id, day = _read_target(state, rng)
+    if rng.random() < 0.5:
+        state.request('GET /reports/kpi-occupancy', 'GET',
+                      f"/reports/kpi-occupancy?property_id={property_id}&year={day.year}&month={day.month}")
+    else:
+        state.request('GET /reports/kpi-move', 'GET',
+                      f"/reports/kpi-move?property_id={property_id}"
+                      f"&start_date={state.run['read_start'].isoformat()}&end_date={state.run['read_end'].isoformat()}")
+
+
+def _list(state, rng):
+    property_id = rng.choice(state.run['read_property_ids'])
+    endpoint, path = rng.choice([
+        ('GET /units', f"/units?property_id={property_id}&limit=100"),
+        ('GET /occupancies', f"/occupancies?property_id={property_id}&limit=100"),
+        ('GET /residents', '/residents?limit=100'),
+        ('GET /properties', '/properties?limit=100'),
+    ])
+    state.request(endpoint, 'GET', path)
+
+
+def _turnover(state, rng):
+    """A new resident moves into the client's unit, gets a rent change and moves out."""
+    state.residents += 1
+    status, resident = state.request('POST /residents', 'POST', '/residents', {
+        'first_name': 'Load', 'last_name': f"{state.run['token']} {_letters(state.index)} {_letters(state.residents)}"})
+    if status != 201:
+        return
+    # Recorded before the move-in, which may fail and leave the resident without a stay
+    state.run['created_resident_ids'].append(resident['id'])
+    move_in = state.next_move_in
+    state.next_move_in += timedelta(days=rng.randint(30, 120))
+    status, occupancy = state.request('POST /occupancy/move-in', 'POST', '/occupancy/move-in', {
+        'resident_id': resident['id'], 'unit_id': state.unit_id,
+        'move_in_date': move_in.isoformat(), 'initial_rent': rng.randrange(800, 2500, 25)})
+    if status != 201:
+        return
+    stay = (state.next_move_in - move_in).days
+    state.request('POST /occupancy/<id>/rent-change', 'POST', f"/occupancy/{occupancy['id']}/rent-change", {
+        'new_rent': rng.randrange(800, 2500, 25), 'effective_date': (move_in + timedelta(days=stay // 2)).isoformat()})
+    state.request('PUT /occupancy/<id>/move-out', 'PUT', f"/occupancy/{occupancy['id']}/move-out", {
+        'move_out_date': state.next_move_in.isoformat()})
+
+
+LOAD_SCENARIOS = {'rent_roll': _rent_roll, 'kpi': _kpi, 'list': _list, 'turnover': _turnover}
+
+
+def _setup(run, app, transport, clients, seed, mix, read_start, read_end,
+           synthetic_properties, synthetic_units, synthetic_years):
+    """
+    Fills in run: the properties and dates the reads use and, when the mix has turnovers,
+    the run's property with one unit per client. Every property created is recorded in
+    run['created_property_ids'] as soon as it exists, so it can be cleaned up.
+    """
+    if synthetic_properties:
+        synthetic_start = date(date.today().year - synthetic_years, 1, 1)
+        prefix = f"Load test {run['token']}"
+        with app.app_context():
+            generate_portfolio(properties=synthetic_properties, units_per_property=synthetic_units,
+                               years=synthetic_years, start_date=synthetic_start, seed=seed, name_prefix=prefix)
+            db.session.commit()
+            run['read_property_ids'] = db.session.execute(
+                select(Property.id).where(Property.name.like(f'{prefix} %')).order_by(Property.id)).scalars().all()
+        run['created_property_ids'].extend(run['read_property_ids'])
+        read_start = read_start or synthetic_start
+        read_end = read_end or synthetic_start + timedelta(days=round(365.25 * synthetic_years) - 1)
+    elif any(mix.get(name, 0) > 0 for name in ('rent_roll', 'kpi', 'list')):
+        status, data = transport.request('GET', f'/properties?limit={MAX_READ_PROPERTIES}')
+        if status != 200:
+            raise RuntimeError(f'Could not list the properties to read ({status}): {data!r}')
+        run['read_property_ids'] = [prop['id'] for prop in json.loads(data) if prop['unit_count']]
+        if not run['read_property_ids']:
+            raise ValueError('No properties with units to read; load some data or generate synthetic properties')
+    read_end = read_end or date.today()
+    read_start = read_start or read_end - timedelta(days=364)
+    if read_start > read_end:
+        raise ValueError('read_start must not be after read_end')
+    run['read_start'], run['read_end'] = read_start, read_end
+
+    if mix.get('turnover', 0) <= 0:
+        return
+    status, data = transport.request('POST', '/properties', {'name': f"Load test {run['token']}"})
+    if status != 201:
+        raise RuntimeError(f'Could not create the load test property ({status}): {data!r}')
+    run['property_id'] = json.loads(data)['id']
+    run['created_property_ids'].append(run['property_id'])
+    run['unit_ids'] = []
+    for number in range(1, clients + 1):
+        status, data = transport.request('POST', '/units', {'property_id': run['property_id'], 'unit_number': str(number)})
+        if status != 201:
+            raise RuntimeError(f'Could not create load test unit {number} ({status}): {data!r}')
+        run['unit_ids'].append(json.loads(data)['id'])
+
+
+def _cleanup(app, property_ids, resident_ids):
+    """
+    Deletes the properties and residents an in-process run created, with everything
+    written to them.
+    """
+    if not property_ids and not resident_ids:
+        return
+    with app.app_context():
+        delete_properties(property_ids)
+        # Residents whose move-in failed have no stay, so delete_properties does not see them
+        for chunk in range(0, len(resident_ids), 500):
+            db.session.execute(delete(Resident).where(Resident.id.in_(resident_ids[chunk:chunk + 500])))
+        db.session.commit()
+        # Property ids (and so data versions) may be handed out again
+        cache = app.extensions.get('report_cache')
+        if cache is not None:
+            cache.clear()
+
+
+# --- transports -----------------------------------------------------------------------
+
+
+class _WSGITransport:
+    """Calls the app in-process through its own Flask test client."""
+
+    def __init__(self, app):
+        self.client = app.test_client()
+
+    def request(self, method, path, body=None):
+        response = self.client.open(path, method=method, json=body)
+        return response.status_code, response.get_data()
+
+
+class _HTTPTransport:
+    """One keep-alive HTTP connection to a running instance."""
+
+    def __init__(self, url):
+        parts = urlsplit(url)
+        connection_class = http.client.HTTPSConnection if parts.scheme == 'https' else http.client.HTTPConnection
+        self.connection = connection_class(parts.netloc, timeout=60)
+        self.prefix = parts.path.rstrip('/')
+
+    def request(self, method, path, body=None):
+        headers = {'Content-Type': 'application/json'} if body is not None else {}
+        try:
+            self.connection.request(method, self.prefix + path,
+                                    body=json.dumps(body) if body is not None else None, headers=headers)
+            response = self.connection.getresponse()
+            return response.status, response.read()
+        except (http.client.HTTPException, OSError):
+            # Reconnect on the next request rather than reusing a broken connection
+            self.connection.close()
+            raise
@@ -1,7 +1,9 @@
 # src/models.py
 from . import db
 from datetime import date
-from sqlalchemy import desc
+from uuid import uuid4
+from sqlalchemy import select, insert
+from sqlalchemy.exc import IntegrityError
 
 class Property(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -19,6 +21,10 @@ class Unit(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     property_id = db.Column(db.Integer, db.ForeignKey('property.id'), nullable=False)
     unit_number = db.Column(db.String(50), nullable=False)
+
+    __table_args__ = (
+        db.Index('ix_unit_property_id', 'property_id'),
+    )
     
     property = db.relationship('Property', back_populates='units')
     occupancies = db.relationship('Occupancy', back_populates='unit', lazy='dynamic')
@@ -33,11 +39,10 @@ class Unit(db.Model):
         
     def get_status_on_date(self, on_date):
             """Finds the unit's status on a specific date (Unit Status Stretch Goal)."""
-            # Find the MOST RECENT status_history record where start_date <= on_date
-            status = self.status_history.filter(UnitStatus.start_date <= on_date) \
-                                    .order_by(UnitStatus.start_date.desc()) \
-                                    .first()
-            return status.status if status else 'active' # Default to active
+            # The MOST RECENT status_history record where start_date <= on_date, looked up in
+            # the unit's status timeline (loaded once per request, see services.timelines)
+            from .services.timelines import status_timelines
+            return status_timelines([self.id])[self.id].value_on(on_date) # Defaults to active
 
 class Resident(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -75,18 +80,26 @@ class Occupancy(db.Model):
     move_in_date = db.Column(db.Date, nullable=False)
     move_out_date = db.Column(db.Date, nullable=True) # null means currently occupied
 
+    __table_args__ = (
+        # "who occupies this unit on date X" and unit overlap checks
+        db.Index('ix_occupancy_unit_dates', 'unit_id', 'move_in_date', 'move_out_date'),
+        # resident overlap checks and current occupancy lookups
+        db.Index('ix_occupancy_resident_id', 'resident_id'),
+        # move-in/move-out KPI windows
+        db.Index('ix_occupancy_move_in_date', 'move_in_date'),
+        db.Index('ix_occupancy_move_out_date', 'move_out_date'),
+    )
+
     unit = db.relationship('Unit', back_populates='occupancies')
     resident = db.relationship('Resident', back_populates='occupancies')
     rent_history = db.relationship('Rent', back_populates='occupancy', 
                                    order_by='Rent.effective_date', lazy='dynamic')
 
     def get_rent_on_date(self, target_date):
-        rent_record = Rent.query.filter(
-            Rent.occupancy_id == self.id,
-            Rent.effective_date <= target_date
-        ).order_by(desc(Rent.effective_date)).first()
-
-        return rent_record.amount if rent_record else 0
+        # Latest rent effective on or before target_date (0 if none), from the occupancy's
+        # rent timeline (loaded once per request, see services.timelines)
+        from .services.timelines import rent_timelines
+        return rent_timelines([self.id])[self.id].value_on(target_date)
 
 class Rent(db.Model):
     def to_dict(self):
@@ -103,6 +116,10 @@ class Rent(db.Model):
     amount = db.Column(db.Integer, nullable=False) 
     effective_date = db.Column(db.Date, nullable=False)
 
+    __table_args__ = (
+        db.Index('ix_rent_occupancy_effective', 'occupancy_id', 'effective_date'),
+    )
+
     occupancy = db.relationship('Occupancy', back_populates='rent_history')
 
 class UnitStatus(db.Model):
@@ -118,5 +135,78 @@ class UnitStatus(db.Model):
     unit_id = db.Column(db.Integer, db.ForeignKey('unit.id'), nullable=False)
     status = db.Column(db.String(20), nullable=False, default='active') # 'active' | 'inactive'
     start_date = db.Column(db.Date, nullable=False)
+
+    __table_args__ = (
+        db.Index('ix_unit_status_unit_start', 'unit_id', 'start_date'),
+    )
     
-    unit = db.relationship('Unit', back_populates='status_history')
\ No newline at end of file
+    unit = db.relationship('Unit', back_populates='status_history')
+
+
+class RentRollFact(db.Model):
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'unit_id': self.unit_id,
+            'start_date': self.start_date.isoformat() if self.start_date else None,
+            'end_date': self.end_date.isoformat() if self.end_date else None,
+            'unit_status': self.unit_status,
+            'resident_id': self.resident_id,
+            'monthly_rent': self.monthly_rent
+        }
+    """Precomputed rent roll: one row per unit per stretch of days with identical status, resident and rent."""
+    id = db.Column(db.Integer, primary_key=True)
+    unit_id = db.Column(db.Integer, db.ForeignKey('unit.id'), nullable=False)
+    start_date = db.Column(db.Date, nullable=False)
+    end_date = db.Column(db.Date, nullable=False) # inclusive; date.max for the open-ended last span
+    unit_status = db.Column(db.String(20), nullable=False)
+    resident_id = db.Column(db.Integer, db.ForeignKey('resident.id'), nullable=True)
+    monthly_rent = db.Column(db.Integer, nullable=False, default=0)
+
+    __table_args__ = (
+        db.Index('ix_rent_roll_fact_unit_dates', 'unit_id', 'start_date', 'end_date'),
+    )
+
+class RentRollFactState(db.Model):
+    """A row here means the unit's RentRollFact rows are up to date with its source rows."""
+    unit_id = db.Column(db.Integer, db.ForeignKey('unit.id'), primary_key=True)
+    built_at = db.Column(db.DateTime, nullable=False)
+
+
+class PropertyDataVersion(db.Model):
+    """Counter bumped whenever a row that feeds the property's reports changes (see services.data_versions)."""
+    property_id = db.Column(db.Integer, db.ForeignKey('property.id'), primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+
+
+class DatabaseIdentity(db.Model):
+    """
+    Single row holding a random token given to the database when its tables are created.
+    Report cache keys include it, so databases sharing a cache, or a database rebuilt with
+    the same ids, never serve each other's reports (see routes.caching).
+    """
+    id = db.Column(db.Integer, primary_key=True)
+    token = db.Column(db.String(32), nullable=False)
+
+
+def ensure_database_identity(engine):
+    """Gives the database its DatabaseIdentity token if it has none yet."""
+    table = DatabaseIdentity.__table__
+    try:
+        with engine.begin() as conn:
+            if conn.execute(select(table.c.id).where(table.c.id == 1)).first() is None:
+                conn.execute(insert(table).values(id=1, token=uuid4().hex))
+    except IntegrityError:
+        # Another process created it first
+        pass
+
+
+def ensure_indexes(bind):
+    """
+    Creates any index declared on the models that is missing from the database.
+    db.create_all() skips tables that already exist, so databases created before an
+    index was added would otherwise never get it.
+    """
+    for table in db.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(bind=bind, checkfirst=True)
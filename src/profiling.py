@@ -0,0 +1,218 @@
+# Opt-in request profiling.
+#
+# With PROFILING_ENABLED set, a request sent with an `X-Profile: 1` header or a `profile=1`
+# query parameter runs under a profiler: 'sampling' (the default) samples the request
+# thread's stack every PROFILE_SAMPLE_INTERVAL seconds and stores collapsed stacks, the
+# input format of flame graph tools (flamegraph.pl, speedscope, ...); 'cprofile' traces
+# every call and stores a pstats file. Streamed responses are profiled until their body
+# has been sent, so a rent roll's SQL, row building and JSON encoding all show up.
+#
+# Profiles are written to PROFILE_DIR, which keeps only the PROFILE_MAX_FILES newest, and
+# are listed and downloaded through GET /admin/profiles (see routes/admin.py). A profiled
+# response names its profile in the X-Profile-Id header.
+from collections import Counter
+from functools import partial
+from flask import g, request
+from threading import Event, Lock, Thread, get_ident
+import cProfile
+import json
+import marshal
+import os
+import re
+import sys
+import time
+import uuid
+
+PROFILERS = ('sampling', 'cprofile')
+
+PROFILE_ID_RE = re.compile(r'^\d+-[0-9a-f]{8}$')
+
+
+class ProfileStore:
+    """Directory of profiles, each a data file plus a JSON metadata file, pruned to the newest max_files."""
+
+    EXTENSIONS = {'collapsed': 'txt', 'pstats': 'prof'}
+
+    def __init__(self, directory, max_files=20):
+        self.directory = directory
+        self.max_files = max_files
+        self._lock = Lock()
+
+    def save(self, profile_id, fmt, data, metadata):
+        os.makedirs(self.directory, exist_ok=True)
+        metadata = dict(metadata, id=profile_id, format=fmt, size=len(data))
+        with self._lock:
+            with open(self._data_path(profile_id, fmt), 'wb') as f:
+                f.write(data)
+            # The metadata is written last: a profile is listed only once its data is complete
+            with open(self._metadata_path(profile_id), 'w', encoding='utf-8') as f:
+                json.dump(metadata, f)
+            self._prune()
+        return metadata
+
+    def list(self):
+        """Metadata of the stored profiles, newest first."""
+        profiles = []
+        for profile_id in self._ids(newest_first=True):
+            try:
+                with open(self._metadata_path(profile_id), encoding='utf-8') as f:
+                    profiles.append(json.load(f))
+            except (OSError, ValueError):
+                continue
+        return profiles
+
+    def get(self, profile_id):
+        """(metadata, data path) of a stored profile, or None."""
+        if not PROFILE_ID_RE.match(profile_id):
+            return None
+        try:
+            with open(self._metadata_path(profile_id), encoding='utf-8') as f:
+                metadata = json.load(f)
+        except (OSError, ValueError):
+            return None
+        path = self._data_path(profile_id, metadata['format'])
+        return (metadata, path) if os.path.exists(path) else None
+
+    def _ids(self, newest_first=False):
+        try:
+            names = os.listdir(self.directory)
+        except FileNotFoundError:
+            return []
+        ids = [name[:-5] for name in names if name.endswith('.json') and PROFILE_ID_RE.match(name[:-5])]
+        return sorted(ids, key=lambda profile_id: tuple(profile_id.split('-')), reverse=newest_first)
+
+    def _prune(self):
+        ids = self._ids()
+        for profile_id in ids[:max(len(ids) - self.max_files, 0)]:
+            for path in [self._metadata_path(profile_id)] + [
+                    self._data_path(profile_id, fmt) for fmt in self.EXTENSIONS]:
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+
+    def _metadata_path(self, profile_id):
+        return os.path.join(self.directory, f'{profile_id}.json')
+
+    def _data_path(self, profile_id, fmt):
+        return os.path.join(self.directory, f'{profile_id}.{self.EXTENSIONS[fmt]}')
+
+
+class SamplingProfiler:
+    """Samples one thread's stack from a background thread and counts identical stacks."""
+
+    format = 'collapsed'
+
+    def __init__(self, interval=0.005):
+        self.interval = interval
+        self.stacks = Counter()
+        self._stopped = Event()
+        self._thread = None
+
+    def start(self):
+        target = get_ident()
+        self._thread = Thread(target=self._sample, args=(target,), daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stops sampling and returns the collapsed stacks ("outer;...;inner count" lines)."""
+        self._stopped.set()
+        self._thread.join()
+        return ''.join(f'{stack} {count}\n' for stack, count in self.stacks.most_common()).encode()
+
+    def _sample(self, target):
+        while not self._stopped.wait(self.interval):
+            frame = sys._current_frames().get(target)
+            labels = []
+            while frame is not None:
+                code = frame.f_code
+                labels.append(f'{code.co_name} ({_short_path(code.co_filename)}:{code.co_firstlineno})')
+                frame = frame.f_back
+            if labels:
+                self.stacks[';'.join(reversed(labels))] += 1
+
+
+class CProfileProfiler:
+    """cProfile over the request thread, stored in the format of pstats.Stats / Profile.dump_stats."""
+
+    format = 'pstats'
+
+    def __init__(self, interval=None):
+        self.profile = cProfile.Profile()
+
+    def start(self):
+        self.profile.enable()
+
+    def stop(self):
+        self.profile.disable()
+        self.profile.create_stats()
+        return marshal.dumps(self.profile.stats)
+
+
+def _short_path(filename):
+    """Paths from site-packages or the project start at the package directory."""
+    for marker in ('site-packages' + os.sep, os.sep + 'src' + os.sep):
+        index = filename.rfind(marker)
+        if index >= 0:
+            return filename[index + len(marker):] if marker.startswith('site') else filename[index + 1:]
+    return filename
+
+
+def init_profiling(app):
+    """Hooks profiling into app when PROFILING_ENABLED is set."""
+    app.extensions['profile_store'] = None
+    if not app.config.get('PROFILING_ENABLED'):
+        return
+    profiler_name = app.config.get('PROFILER', 'sampling')
+    if profiler_name not in PROFILERS:
+        raise ValueError(f"Unknown PROFILER '{profiler_name}'. Use one of: {', '.join(PROFILERS)}")
+    profiler_class = SamplingProfiler if profiler_name == 'sampling' else CProfileProfiler
+    interval = app.config.get('PROFILE_SAMPLE_INTERVAL', 0.005)
+    store = app.extensions['profile_store'] = ProfileStore(
+        app.config['PROFILE_DIR'], app.config.get('PROFILE_MAX_FILES', 20))
+
+    @app.before_request
+    def _start_profile():
+        if request.headers.get('X-Profile') != '1' and request.args.get('profile') != '1':
+            return
+        profiler = profiler_class(interval)
+        try:
+            profiler.start()
+        except ValueError:
+            # cProfile refuses to run while another profiler is active on the thread
+            return
+        g._profile = (f'{int(time.time() * 1000)}-{uuid.uuid4().hex[:8]}', profiler, time.perf_counter())
+
+    @app.after_request
+    def _name_profile(response):
+        profile = g.get('_profile')
+        if profile is None:
+            return response
+        response.headers['X-Profile-Id'] = profile[0]
+        g._profile_status = response.status_code
+        if response.is_streamed:
+            # Keep profiling while the body is generated
+            g._profile = None
+            response.call_on_close(partial(
+                _save_profile, store, profile, _request_info(profiler_name), response.status_code))
+        return response
+
+    @app.teardown_request
+    def _finish_profile(exc):
+        profile = g.pop('_profile', None)
+        if profile is not None:
+            _save_profile(store, profile, _request_info(profiler_name), g.get('_profile_status', 500))
+
+
+def _request_info(profiler_name):
+    return {'method': request.method, 'path': request.full_path.rstrip('?'),
+            'endpoint': request.url_rule.rule if request.url_rule else None, 'profiler': profiler_name}
+
+
+def _save_profile(store, profile, info, status):
+    profile_id, profiler, started = profile
+    duration = time.perf_counter() - started
+    data = profiler.stop()
+    store.save(profile_id, profiler.format, data, dict(
+        info, status=status, duration_ms=round(duration * 1000, 3),
+        created_at=time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime(int(profile_id.split('-')[0]) / 1000))))
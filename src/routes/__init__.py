@@ -6,6 +6,8 @@ def register_blueprints(app):
     from .occupancy import occupancy_bp
     from .reports import reports_bp
     from .admin import admin_bp
+    from .imports import imports_bp
+    from .metrics import metrics_bp
 
     app.register_blueprint(properties_bp)
     app.register_blueprint(units_bp)
@@ -13,3 +15,5 @@ def register_blueprints(app):
     app.register_blueprint(occupancy_bp)
     app.register_blueprint(reports_bp)
     app.register_blueprint(admin_bp)
+    app.register_blueprint(imports_bp)
+    app.register_blueprint(metrics_bp)
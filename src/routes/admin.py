@@ -1,7 +1,27 @@
-from flask import Blueprint, render_template
+import os
+from flask import Blueprint, render_template, jsonify, current_app, send_file
 
 admin_bp = Blueprint('admin', __name__)
 
 @admin_bp.route('/admin', methods=['GET'])
 def admin_ui():
     return render_template('admin.html')
+
+@admin_bp.route('/admin/profiles', methods=['GET'])
+def list_profiles():
+    store = current_app.extensions.get('profile_store')
+    if store is None:
+        return jsonify({'error': 'Profiling is disabled'}), 404
+    return jsonify({'profiles': store.list()})
+
+@admin_bp.route('/admin/profiles/<profile_id>', methods=['GET'])
+def download_profile(profile_id):
+    store = current_app.extensions.get('profile_store')
+    if store is None:
+        return jsonify({'error': 'Profiling is disabled'}), 404
+    found = store.get(profile_id)
+    if found is None:
+        return jsonify({'error': 'Profile not found'}), 404
+    metadata, path = found
+    mimetype = 'text/plain' if metadata['format'] == 'collapsed' else 'application/octet-stream'
+    return send_file(path, mimetype=mimetype, as_attachment=True, download_name=os.path.basename(path))
@@ -0,0 +1,76 @@
+# Report responses served through the app's ReportCache (see services.report_cache).
+#
+# A response is stored under (database identity, report, property ids, parameters)
+# together with the data versions the properties were at when it was computed, and is only
+# served again while they still are. Every response says whether it came from the cache in X-Report-Cache.
+from flask import Response, current_app, stream_with_context
+from ..services.data_versions import data_versions, database_identity
+
+
+def cached_stream(report, property_ids, params, mimetype, build_chunks, headers=None):
+    """
+    Streams build_chunks() (a callable returning the body chunks) on a miss, storing the
+    body once it has been sent in full; serves the stored body on a hit.
+    """
+    cache, key, version, hit = _lookup(report, property_ids, params)
+    if hit is not None:
+        return _cached_response(hit, headers)
+    chunks = build_chunks()
+    if cache is not None:
+        chunks = _store_when_complete(cache, key, version, mimetype, chunks)
+    response = Response(stream_with_context(chunks), mimetype=mimetype, headers=headers)
+    if cache is not None:
+        response.headers['X-Report-Cache'] = 'miss'
+    return response
+
+
+def cached_json(report, property_ids, params, compute):
+    """jsonify(compute()) on a miss, stored for later hits."""
+    cache, key, version, hit = _lookup(report, property_ids, params)
+    if hit is not None:
+        return _cached_response(hit)
+    response = current_app.json.response(compute())
+    if cache is not None:
+        cache.set(key, version, response.mimetype, response.get_data())
+        response.headers['X-Report-Cache'] = 'miss'
+    return response
+
+
+def _lookup(report, property_ids, params):
+    cache = current_app.extensions.get('report_cache')
+    if cache is None:
+        return None, None, None, None
+    database = database_identity()
+    if database is None:
+        # Without an identity this database's entries could not be told from another's
+        return None, None, None, None
+    property_ids = tuple(property_ids)
+    versions = data_versions(property_ids)
+    version = tuple(versions[pid] for pid in property_ids)
+    key = (database, report, property_ids, tuple(sorted(params.items())))
+    return cache, key, version, cache.get(key, version)
+
+
+def _cached_response(hit, headers=None):
+    mimetype, body = hit
+    response = Response(body, mimetype=mimetype, headers=headers)
+    response.headers['X-Report-Cache'] = 'hit'
+    return response
+
+
+def _store_when_complete(cache, key, version, mimetype, chunks):
+    parts = []
+    size = 0
+    for chunk in chunks:
+        yield chunk
+        if parts is None:
+            continue
+        data = chunk.encode() if isinstance(chunk, str) else chunk
+        size += len(data)
+        if size > cache.max_entry_bytes:
+            # Too large to keep; stream the rest without buffering it
+            parts = None
+        else:
+            parts.append(data)
+    if parts is not None:
+        cache.set(key, version, mimetype, b''.join(parts))
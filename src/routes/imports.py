@@ -0,0 +1,32 @@
+from flask import Blueprint, request, jsonify
+from ..services.bulk_import import parse_import, import_records, IMPORT_FORMATS
+from .. import db
+
+imports_bp = Blueprint('imports', __name__)
+
+@imports_bp.route('/import', methods=['POST'])
+def bulk_import():
+    """
+    Imports properties, units, residents and occupancies from a CSV or NDJSON body (see
+    services.bulk_import for the record layout) in one transaction. ?format= defaults from
+    the Content-Type; ?dry_run=1 only validates. Any invalid row fails the whole import
+    with a 400 listing the errors per row.
+    """
+    fmt = request.args.get('format') or ('csv' if request.mimetype == 'text/csv' else 'ndjson')
+    if fmt not in IMPORT_FORMATS:
+        return jsonify({'error': f"format must be one of: {', '.join(IMPORT_FORMATS)}"}), 400
+    dry_run = request.args.get('dry_run') in ('1', 'true')
+    try:
+        text = request.get_data().decode('utf-8')
+    except UnicodeDecodeError:
+        return jsonify({'error': 'Body must be UTF-8 text'}), 400
+    records = parse_import(text, fmt)
+    if not records:
+        return jsonify({'error': 'No records to import'}), 400
+    counts, errors = import_records(records, dry_run=dry_run)
+    if errors:
+        return jsonify({'error': 'Import has invalid rows; nothing was imported', 'errors': errors}), 400
+    if dry_run:
+        return jsonify({'dry_run': True, 'created': counts}), 200
+    db.session.commit()
+    return jsonify({'created': counts}), 201
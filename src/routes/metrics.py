@@ -0,0 +1,15 @@
+from flask import Blueprint, request, jsonify, current_app
+
+metrics_bp = Blueprint('metrics', __name__)
+
+# Per-endpoint request, latency and SQL totals since start-up (see src/instrumentation.py);
+# ?reset=1 starts a new measurement window after returning the current one
+@metrics_bp.route('/metrics', methods=['GET'])
+def get_metrics():
+    metrics = current_app.extensions.get('request_metrics')
+    if metrics is None:
+        return jsonify({'error': 'Request metrics are disabled (REQUEST_METRICS=0)'}), 404
+    snapshot = metrics.snapshot()
+    if request.args.get('reset') == '1':
+        metrics.reset()
+    return jsonify({'endpoints': snapshot}), 200
@@ -1,8 +1,13 @@
 
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, Response, stream_with_context, current_app
 from ..models import Occupancy, Unit, Resident, Rent
 from .. import db
-from sqlalchemy import or_, and_
+from ..services.facts import refresh_unit_facts
+from ..services.occupancy_batch import batch_move_in, batch_rent_change
+from ..services.rent_escalation import escalate_rents
+from .pagination import parse_page_args, page_response, int_arg, date_arg, keyset_after
+from .streaming import json_array_chunks
+from sqlalchemy import select, or_, and_
 from datetime import date
 
 occupancy_bp = Blueprint('occupancy', __name__)
@@ -58,6 +63,7 @@ def move_in():
         effective_date=move_in_dt
     )
     db.session.add(rent)
+    refresh_unit_facts([occ.unit_id])
     db.session.commit()
     return jsonify(occ.to_dict()), 201
 
@@ -77,6 +83,7 @@ def move_out(id):
     if move_out_dt <= move_in_date:
         return jsonify({'error': 'Move-out date must be after move-in date.'}), 400
     occ.move_out_date = move_out_dt
+    refresh_unit_facts([occ.unit_id])
     db.session.commit()
     return jsonify({'message': 'Move-out successful'}), 200
 
@@ -112,9 +119,65 @@ def rent_change(id):
         effective_date=eff_date
     )
     db.session.add(rent)
+    refresh_unit_facts([occ.unit_id])
     db.session.commit()
     return jsonify(rent.to_dict()), 201
 
+@occupancy_bp.route('/occupancy/move-in/batch', methods=['POST'])
+def move_in_batch():
+    """
+    Applies {"items": [<move-in body>, ...]} atomically: either every move-in is saved
+    (201) or none is (400). The response lists a result per item in request order.
+    """
+    return _apply_batch(batch_move_in)
+
+@occupancy_bp.route('/occupancy/rent-change/batch', methods=['POST'])
+def rent_change_batch():
+    """Same as move_in_batch for {"items": [{"occupancy_id", "new_rent", "effective_date"}, ...]}."""
+    return _apply_batch(batch_rent_change)
+
+def _apply_batch(apply):
+    data = request.get_json(silent=True)
+    items = data.get('items') if isinstance(data, dict) else None
+    if not isinstance(items, list) or not items:
+        return jsonify({'error': 'items must be a non-empty list'}), 400
+    max_items = current_app.config.get('MAX_BATCH_ITEMS', 10000)
+    if len(items) > max_items:
+        return jsonify({'error': f'A batch can hold at most {max_items} items'}), 400
+    results, ok = apply(items)
+    if not ok:
+        return jsonify({'error': 'Batch rejected; no changes were saved', 'results': results}), 400
+    db.session.commit()
+    return jsonify({'results': results}), 201
+
+@occupancy_bp.route('/occupancy/rent-escalation', methods=['POST'])
+def rent_escalation():
+    """
+    Escalates the rent of every lease active on effective_date in one statement. The body
+    has effective_date and either "rules": [{"property_id"?, "percent" | "amount"}, ...] or
+    a single rule at the top level. "dry_run": true returns the changes without saving them.
+    """
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict) or not data.get('effective_date'):
+        return jsonify({'error': 'effective_date is required'}), 400
+    try:
+        eff_date = date.fromisoformat(data['effective_date'])
+    except (ValueError, TypeError):
+        return jsonify({'error': 'Invalid date format. Use YYYY-MM-DD'}), 400
+    rules = data.get('rules')
+    if rules is None:
+        rules = [{k: data[k] for k in ('property_id', 'percent', 'amount') if k in data}]
+    dry_run = bool(data.get('dry_run'))
+    try:
+        changes = escalate_rents(eff_date, rules, dry_run=dry_run)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    result = {'effective_date': eff_date.isoformat(), 'count': len(changes), 'changes': changes}
+    if dry_run:
+        return jsonify({'dry_run': True, **result}), 200
+    db.session.commit()
+    return jsonify(result), 201
+
 @occupancy_bp.route('/occupancy/<int:id>/rents', methods=['GET'])
 def occupancy_rents(id):
     occ = db.session.get(Occupancy, id)
@@ -125,21 +188,62 @@ def occupancy_rents(id):
 
 @occupancy_bp.route('/occupancies', methods=['GET'])
 def list_occupancies():
-    occs = Occupancy.query.order_by(Occupancy.move_in_date).all()
-    out = []
-    for o in occs:
-        unit = db.session.get(Unit, o.unit_id)
-        resident = db.session.get(Resident, o.resident_id)
-        out.append({
-            'id': o.id,
-            'unit_id': o.unit_id,
-            'unit_number': unit.unit_number if unit else None,
-            'resident_id': o.resident_id,
-            'resident_name': f"{resident.first_name} {resident.last_name}" if resident else None,
-            'move_in_date': o.move_in_date.isoformat() if o.move_in_date else None,
-            'move_out_date': o.move_out_date.isoformat() if o.move_out_date else None,
-        })
-    return jsonify(out), 200
+    """
+    Lists occupancies ordered by move-in date, with unit number and resident name joined in
+    a single query. Optional filters: property_id, unit_id, resident_id, active=1 (not yet
+    moved out as of today) and start_date/end_date (occupancies overlapping that window).
+    Supports ?limit= and ?after= keyset pagination; unpaginated listings are streamed.
+    """
+    try:
+        limit, after = parse_page_args((date, int))
+        pid = int_arg('property_id')
+        unit_id = int_arg('unit_id')
+        resident_id = int_arg('resident_id')
+        start_dt = date_arg('start_date')
+        end_dt = date_arg('end_date')
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    active_only = request.args.get('active', '').lower() in ('1', 'true')
+    query = (
+        select(Occupancy.id, Occupancy.unit_id, Unit.unit_number, Occupancy.resident_id,
+               Resident.first_name, Resident.last_name, Occupancy.move_in_date, Occupancy.move_out_date)
+        .outerjoin(Unit, Unit.id == Occupancy.unit_id)
+        .outerjoin(Resident, Resident.id == Occupancy.resident_id)
+    )
+    if pid is not None:
+        query = query.where(Unit.property_id == pid)
+    if unit_id is not None:
+        query = query.where(Occupancy.unit_id == unit_id)
+    if resident_id is not None:
+        query = query.where(Occupancy.resident_id == resident_id)
+    if active_only:
+        query = query.where(or_(Occupancy.move_out_date == None, Occupancy.move_out_date > date.today()))
+    if end_dt:
+        query = query.where(Occupancy.move_in_date <= end_dt)
+    if start_dt:
+        query = query.where(or_(Occupancy.move_out_date == None, Occupancy.move_out_date > start_dt))
+    if after:
+        query = query.where(keyset_after((Occupancy.move_in_date, Occupancy.id), after))
+    query = query.order_by(Occupancy.move_in_date, Occupancy.id)
+    if limit:
+        query = query.limit(limit + 1)
+    rows = (_occupancy_listing_row(row) for row in db.session.execute(query))
+    if limit:
+        return page_response(list(rows), limit, lambda item: (date.fromisoformat(item['move_in_date']), item['id']))
+    return Response(stream_with_context(json_array_chunks(rows)), mimetype='application/json')
+
+
+def _occupancy_listing_row(row):
+    occ_id, unit_id, unit_number, resident_id, first_name, last_name, move_in, move_out = row
+    return {
+        'id': occ_id,
+        'unit_id': unit_id,
+        'unit_number': unit_number,
+        'resident_id': resident_id,
+        'resident_name': f"{first_name} {last_name}" if first_name is not None else None,
+        'move_in_date': move_in.isoformat() if move_in else None,
+        'move_out_date': move_out.isoformat() if move_out else None,
+    }
 
 
 # PATCH endpoint to amend occupancy (move-in/move-out dates, unit assignment)
@@ -152,6 +256,7 @@ def update_occupancy(id):
     move_in_date = data.get('move_in_date')
     move_out_date = data.get('move_out_date')
     unit_id = data.get('unit_id')
+    touched_units = [occ.unit_id]
     # Validate move-in/move-out dates
     if move_in_date:
         try:
@@ -186,6 +291,7 @@ def update_occupancy(id):
         ).first()
         if overlap:
             return jsonify({'error': 'Unit is already occupied during the specified period'}), 400
+        touched_units.append(unit.id)
         occ.unit_id = unit_id
     # If only changing dates, check for overlap in current unit
     else:
@@ -199,5 +305,6 @@ def update_occupancy(id):
             return jsonify({'error': 'Unit is already occupied during the specified period'}), 400
     occ.move_in_date = move_in_dt
     occ.move_out_date = move_out_dt
+    refresh_unit_facts(touched_units)
     db.session.commit()
     return jsonify(occ.to_dict()), 200
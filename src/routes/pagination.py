@@ -0,0 +1,96 @@
+# Keyset (cursor) pagination shared by the list endpoints.
+#
+# A page is requested with ?limit=N and continued with ?after=<cursor>, where the cursor is
+# the opaque value returned in the X-Next-Cursor header of the previous page (a Link header
+# with rel="next" carries the full URL). The body stays a plain JSON array, so clients that
+# do not pass limit keep getting the whole list exactly as before.
+from flask import current_app, jsonify, request
+from sqlalchemy import tuple_
+from datetime import date
+from urllib.parse import urlencode
+import base64
+import json
+
+
+def parse_page_args(key_types):
+    """
+    Reads limit/after from the query string. key_types lists the type of each sort-key
+    column (int or date) so the cursor can be decoded back into comparable values.
+    Returns (limit, after) where either may be None; raises ValueError on bad input.
+    """
+    limit = request.args.get('limit')
+    if limit is not None:
+        try:
+            limit = int(limit)
+        except ValueError:
+            raise ValueError('limit must be an integer')
+        max_limit = current_app.config.get('MAX_PAGE_SIZE', 1000)
+        if not (1 <= limit <= max_limit):
+            raise ValueError(f'limit must be between 1 and {max_limit}')
+    after = request.args.get('after')
+    if after is not None:
+        after = decode_cursor(after, key_types)
+    return limit, after
+
+
+def int_arg(name):
+    """Optional integer filter from the query string; raises ValueError if malformed."""
+    value = request.args.get(name)
+    if value is None or value == '':
+        return None
+    try:
+        return int(value)
+    except ValueError:
+        raise ValueError(f'{name} must be an integer')
+
+
+def date_arg(name):
+    """Optional YYYY-MM-DD filter from the query string; raises ValueError if malformed."""
+    value = request.args.get(name)
+    if value is None or value == '':
+        return None
+    try:
+        return date.fromisoformat(value)
+    except ValueError:
+        raise ValueError(f'Invalid {name} format. Use YYYY-MM-DD')
+
+
+def encode_cursor(key):
+    raw = json.dumps([value.isoformat() if isinstance(value, date) else value for value in key])
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor, key_types):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+        values = json.loads(raw)
+        if not isinstance(values, list) or len(values) != len(key_types):
+            raise ValueError
+        return tuple(date.fromisoformat(v) if t is date else t(v) for v, t in zip(values, key_types))
+    except (ValueError, TypeError, UnicodeDecodeError):
+        raise ValueError('Invalid cursor')
+
+
+def keyset_after(columns, after):
+    """WHERE clause selecting rows strictly after the cursor in (columns...) ascending order."""
+    if len(columns) == 1:
+        return columns[0] > after[0]
+    return tuple_(*columns) > tuple_(*after)
+
+
+def page_response(items, limit, sort_key):
+    """
+    Builds the JSON array response for a page. The query should have fetched limit + 1 rows;
+    the extra row only signals that another page exists and is not returned.
+    """
+    next_cursor = None
+    if limit is not None and len(items) > limit:
+        items = items[:limit]
+        next_cursor = encode_cursor(sort_key(items[-1]))
+    response = jsonify(items)
+    if next_cursor:
+        args = request.args.to_dict()
+        args['after'] = next_cursor
+        response.headers['X-Next-Cursor'] = next_cursor
+        response.headers['Link'] = f'<{request.path}?{urlencode(args)}>; rel="next"'
+    return response, 200
@@ -1,7 +1,11 @@
-from flask import request, jsonify, Blueprint
+from flask import request, jsonify, Blueprint, Response, stream_with_context
 from .. import db
 from ..models import Property, Unit
 from ..config import ValidationConfig
+from ..services.rent_ledger import iter_property_rent_ledger
+from .streaming import json_array_chunks, ndjson_chunks, csv_chunks
+from .pagination import parse_page_args, page_response
+from sqlalchemy import select, func
 import re
 
 properties_bp = Blueprint('properties', __name__)
@@ -35,8 +39,23 @@ def create_property():
 
 @properties_bp.route('/properties', methods=['GET'])
 def get_properties():
-    props = Property.query.all()
-    return jsonify([p.to_dict() for p in props]), 200
+    try:
+        limit, after = parse_page_args((int,))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    # One grouped query instead of a COUNT per property from Property.to_dict()
+    query = (
+        select(Property.id, Property.name, func.count(Unit.id))
+        .outerjoin(Unit, Unit.property_id == Property.id)
+        .group_by(Property.id, Property.name)
+        .order_by(Property.id)
+    )
+    if after:
+        query = query.where(Property.id > after[0])
+    if limit:
+        query = query.limit(limit + 1)
+    items = [{'id': pid, 'name': name, 'unit_count': unit_count} for pid, name, unit_count in db.session.execute(query)]
+    return page_response(items, limit, lambda item: (item['id'],))
 
 @properties_bp.route('/properties/<int:id>', methods=['GET'])
 def get_property(id):
@@ -53,3 +72,20 @@ def get_property_units(id):
 
     units = Unit.query.filter_by(property_id=id).all()
     return jsonify([u.to_dict() for u in units]), 200
+
+@properties_bp.route('/properties/<int:id>/rents', methods=['GET'])
+def get_property_rents(id):
+    """Every rent change for every unit of the property, streamed in unit/occupancy/date order."""
+    prop = db.session.get(Property, id)
+    if not prop:
+        return jsonify({'error': 'Property not found'}), 404
+    fmt = request.args.get('format', 'json')
+    if fmt not in ('json', 'ndjson', 'csv'):
+        return jsonify({'error': 'format must be one of: json, ndjson, csv'}), 400
+    rows = iter_property_rent_ledger(id)
+    if fmt == 'ndjson':
+        return Response(stream_with_context(ndjson_chunks(rows)), mimetype='application/x-ndjson')
+    if fmt == 'csv':
+        headers = {'Content-Disposition': f'attachment; filename="rent_ledger_{id}.csv"'}
+        return Response(stream_with_context(csv_chunks(rows)), mimetype='text/csv', headers=headers)
+    return Response(stream_with_context(json_array_chunks(rows)), mimetype='application/json')
@@ -1,45 +1,88 @@
-from flask import Blueprint, request, jsonify, Response
-from ..services.rent_roll import generate_rent_roll
-from ..services.kpis import move_in_out_counts, occupancy_rate_for_month
+from flask import Blueprint, request, jsonify, current_app
+from ..services.rent_roll import (generate_rent_roll, iter_portfolio_rent_roll, rent_roll_columns,
+                                  portfolio_rent_roll_columns, iter_rent_roll_spans, iter_portfolio_rent_roll_spans,
+                                  rent_roll_summary, portfolio_rent_roll_summary, RENT_ROLL_ENGINES, RENT_ROLL_GROUPINGS)
+from ..services.kpis import move_in_out_counts, move_in_out_counts_by_property, occupancy_rate_for_month, kpi_series, KPI_SERIES_BUCKETS
+from ..models import Property
+from .streaming import json_array_chunks, columnar_chunks, ndjson_chunks, csv_chunks
+from .caching import cached_stream, cached_json
+from .. import db
+from sqlalchemy import select
 from datetime import date
-import csv
-import io
 
 reports_bp = Blueprint('reports', __name__)
 
+RENT_ROLL_FORMATS = ('json', 'ndjson', 'csv', 'columnar', 'spans')
+
 @reports_bp.route('/reports/rent-roll', methods=['GET'])
 def get_rent_roll():
     property_id = request.args.get('property_id')
+    # property_ids=1,2,3 (or property_ids=all) produces one portfolio-wide rent roll
+    property_ids = request.args.get('property_ids')
     start_date = request.args.get('start_date')
     end_date = request.args.get('end_date')
-    if not all([property_id, start_date, end_date]):
+    if not all([property_id or property_ids, start_date, end_date]):
         return jsonify({'error': 'property_id, start_date, and end_date are required'}), 400
     try:
         start_dt = date.fromisoformat(start_date)
         end_dt = date.fromisoformat(end_date)
-        prop_id = int(property_id)
+        if property_ids:
+            prop_ids = None if property_ids == 'all' else [int(pid) for pid in property_ids.split(',')]
+        else:
+            prop_id = int(property_id)
     except (ValueError, TypeError):
         return jsonify({'error': 'Invalid date format. Use YYYY-MM-DD for dates and integer for property_id'}), 400
     if end_dt < start_dt:
         return jsonify({'error': 'End date must be on or after start date.'}), 400
-    rent_roll_data = generate_rent_roll(prop_id, start_dt, end_dt)
-    fmt = request.args.get('format')
+    engine = request.args.get('engine', 'sweep')
+    if engine not in RENT_ROLL_ENGINES:
+        return jsonify({'error': f"engine must be one of: {', '.join(RENT_ROLL_ENGINES)}"}), 400
+    fmt = request.args.get('format', 'json')
+    if fmt not in RENT_ROLL_FORMATS:
+        return jsonify({'error': f"format must be one of: {', '.join(RENT_ROLL_FORMATS)}"}), 400
+    if fmt in ('columnar', 'spans') and engine != 'sweep':
+        return jsonify({'error': f'The {fmt} format only supports the sweep engine'}), 400
+    # group_by=unit,month (any of RENT_ROLL_GROUPINGS) returns one summary row per group instead of daily rows
+    group_by = tuple(request.args.get('group_by', '').split(',')) if request.args.get('group_by') else ()
+    if group_by:
+        if len(set(group_by)) != len(group_by) or not set(group_by) <= set(RENT_ROLL_GROUPINGS):
+            return jsonify({'error': f"group_by must be a comma-separated list of: {', '.join(RENT_ROLL_GROUPINGS)}"}), 400
+        if fmt in ('columnar', 'spans') or engine != 'sweep':
+            return jsonify({'error': 'group_by only supports the json, ndjson and csv formats and the sweep engine'}), 400
+    if property_ids:
+        if engine != 'sweep':
+            return jsonify({'error': 'Portfolio rent rolls only support the sweep engine'}), 400
+        if prop_ids is None:
+            prop_ids = [pid for (pid,) in db.session.execute(select(Property.id).order_by(Property.id))]
+        executor = current_app.config.get('PORTFOLIO_EXECUTOR', 'thread')
+        rows = lambda: iter_portfolio_rent_roll(prop_ids, start_dt, end_dt, executor=executor)
+        columns = lambda: portfolio_rent_roll_columns(prop_ids, start_dt, end_dt, executor=executor)
+        spans = lambda: iter_portfolio_rent_roll_spans(prop_ids, start_dt, end_dt, executor=executor)
+        summary = lambda: portfolio_rent_roll_summary(prop_ids, start_dt, end_dt, group_by, executor=executor)
+        file_label = 'portfolio'
+    else:
+        prop_ids = [prop_id]
+        rows = lambda: generate_rent_roll(prop_id, start_dt, end_dt, engine=engine, stream=True)
+        columns = lambda: rent_roll_columns(prop_id, start_dt, end_dt)
+        spans = lambda: iter_rent_roll_spans(prop_id, start_dt, end_dt)
+        summary = lambda: rent_roll_summary(prop_id, start_dt, end_dt, group_by)
+        file_label = prop_id
+    params = {'start_date': start_dt, 'end_date': end_dt, 'engine': engine, 'format': fmt, 'group_by': group_by}
+    if group_by:
+        rows = summary
+        file_label = f"{file_label}_by_{'_'.join(group_by)}"
+    if fmt == 'columnar':
+        return cached_stream('rent-roll', prop_ids, params, 'application/json', lambda: columnar_chunks(columns()))
+    if fmt == 'spans':
+        return cached_stream('rent-roll', prop_ids, params, 'application/json', lambda: json_array_chunks(spans()))
     if fmt == 'csv':
-        output = io.StringIO()
-        writer = None
-        for row in rent_roll_data:
-            if writer is None:
-                writer = csv.DictWriter(output, fieldnames=list(row.keys()))
-                writer.writeheader()
-            writer.writerow(row)
-        csv_data = output.getvalue()
-        output.close()
         headers = {
-            'Content-Type': 'text/csv',
-            'Content-Disposition': f'attachment; filename="rent_roll_{prop_id}_{start_dt.isoformat()}_{end_dt.isoformat()}.csv"'
+            'Content-Disposition': f'attachment; filename="rent_roll_{file_label}_{start_dt.isoformat()}_{end_dt.isoformat()}.csv"'
         }
-        return Response(csv_data, headers=headers)
-    return jsonify(rent_roll_data), 200
+        return cached_stream('rent-roll', prop_ids, params, 'text/csv', lambda: csv_chunks(rows()), headers=headers)
+    if fmt == 'ndjson':
+        return cached_stream('rent-roll', prop_ids, params, 'application/x-ndjson', lambda: ndjson_chunks(rows()))
+    return cached_stream('rent-roll', prop_ids, params, 'application/json', lambda: json_array_chunks(rows()))
 
 
 # Move-in/out counts for a date range
@@ -48,16 +91,35 @@ def get_kpi_move():
     start_date = request.args.get('start_date')
     end_date = request.args.get('end_date')
     property_id = request.args.get('property_id')
-    if not all([start_date, end_date, property_id]):
+    # property_ids=1,2,3 (or property_ids=all) returns counts for many properties at once
+    property_ids = request.args.get('property_ids')
+    if not all([start_date, end_date, property_id or property_ids]):
         return jsonify({'error': 'start_date, end_date, and property_id are required'}), 400
     try:
         start_dt = date.fromisoformat(start_date)
         end_dt = date.fromisoformat(end_date)
-        prop_id = int(property_id)
+        if property_ids:
+            prop_ids = None if property_ids == 'all' else [int(pid) for pid in property_ids.split(',')]
+        else:
+            prop_id = int(property_id)
     except (ValueError, TypeError):
         return jsonify({'error': 'Invalid date format. Use YYYY-MM-DD for dates and integer for property_id'}), 400
-    result = move_in_out_counts(prop_id, start_dt, end_dt)
-    return jsonify(result), 200
+    params = {'start_date': start_dt, 'end_date': end_dt}
+    if not property_ids:
+        return cached_json('kpi-move', [prop_id], params, lambda: move_in_out_counts(prop_id, start_dt, end_dt)), 200
+    if prop_ids is None:
+        prop_ids = [pid for (pid,) in db.session.execute(select(Property.id).order_by(Property.id))]
+
+    def portfolio_counts():
+        counts = move_in_out_counts_by_property(start_dt, end_dt, property_ids=prop_ids)
+        return {
+            'start_date': start_dt.isoformat(),
+            'end_date': end_dt.isoformat(),
+            'properties': [
+                {'property_id': pid, **counts.get(pid, {'move_ins': 0, 'move_outs': 0})} for pid in prop_ids
+            ]
+        }
+    return cached_json('kpi-move', prop_ids, params, portfolio_counts), 200
 
 # Occupancy rate for a given month
 @reports_bp.route('/reports/kpi-occupancy', methods=['GET'])
@@ -77,5 +139,28 @@ def get_kpi_occupancy():
         return jsonify({'error': 'Month must be between 1 and 12'}), 400
     if year < 1:
         return jsonify({'error': 'Year must be a positive integer'}), 400
-    result = occupancy_rate_for_month(prop_id, year, month)
-    return jsonify(result), 200
+    return cached_json('kpi-occupancy', [prop_id], {'year': year, 'month': month},
+                       lambda: occupancy_rate_for_month(prop_id, year, month)), 200
+
+# Occupancy rate and move counts for every day/week/month bucket in a date range
+@reports_bp.route('/reports/kpi-series', methods=['GET'])
+def get_kpi_series():
+    property_id = request.args.get('property_id')
+    start_date = request.args.get('start_date')
+    end_date = request.args.get('end_date')
+    bucket = request.args.get('bucket', 'month')
+    if not all([property_id, start_date, end_date]):
+        return jsonify({'error': 'property_id, start_date, and end_date are required'}), 400
+    try:
+        start_dt = date.fromisoformat(start_date)
+        end_dt = date.fromisoformat(end_date)
+        prop_id = int(property_id)
+    except (ValueError, TypeError):
+        return jsonify({'error': 'Invalid date format. Use YYYY-MM-DD for dates and integer for property_id'}), 400
+    if end_dt < start_dt:
+        return jsonify({'error': 'End date must be on or after start date.'}), 400
+    if bucket not in KPI_SERIES_BUCKETS:
+        return jsonify({'error': f"bucket must be one of: {', '.join(KPI_SERIES_BUCKETS)}"}), 400
+    return cached_json('kpi-series', [prop_id], {'start_date': start_dt, 'end_date': end_dt, 'bucket': bucket},
+                       lambda: {'property_id': prop_id, 'bucket': bucket,
+                                'series': kpi_series(prop_id, start_dt, end_dt, bucket)}), 200
@@ -2,6 +2,8 @@ from flask import Blueprint, request, jsonify
 from ..models import Resident, Occupancy, Unit
 from ..config import ValidationConfig
 from .. import db
+from .pagination import parse_page_args, page_response, int_arg, date_arg
+from sqlalchemy import select, or_
 import re
 
 residents_bp = Blueprint('residents', __name__)
@@ -35,16 +37,34 @@ def create_resident():
 
 @residents_bp.route('/residents', methods=['GET'])
 def list_residents():
-    property_id = request.args.get('property_id')
-    if property_id:
-        try:
-            pid = int(property_id)
-        except ValueError:
-            return jsonify({'error': 'property_id must be an integer'}), 400
-        residents = Resident.query.join(Occupancy, isouter=True).join(Unit, isouter=True).filter(Unit.property_id == pid).all()
-    else:
-        residents = Resident.query.all()
-    return jsonify([r.to_dict() for r in residents]), 200
+    """
+    Lists residents ordered by id. Optional filters: property_id (residents with an occupancy
+    in that property) and start_date/end_date (residents with an occupancy overlapping that
+    window). Supports ?limit= and ?after= keyset pagination.
+    """
+    try:
+        limit, after = parse_page_args((int,))
+        pid = int_arg('property_id')
+        start_dt = date_arg('start_date')
+        end_dt = date_arg('end_date')
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    query = Resident.query
+    if pid is not None or start_dt or end_dt:
+        stays = select(Occupancy.id).where(Occupancy.resident_id == Resident.id)
+        if pid is not None:
+            stays = stays.join(Unit, Unit.id == Occupancy.unit_id).where(Unit.property_id == pid)
+        if end_dt:
+            stays = stays.where(Occupancy.move_in_date <= end_dt)
+        if start_dt:
+            stays = stays.where(or_(Occupancy.move_out_date == None, Occupancy.move_out_date > start_dt))
+        query = query.filter(stays.exists())
+    if after:
+        query = query.filter(Resident.id > after[0])
+    query = query.order_by(Resident.id)
+    if limit:
+        query = query.limit(limit + 1)
+    return page_response([r.to_dict() for r in query.all()], limit, lambda item: (item['id'],))
 
 @residents_bp.route('/residents/<int:id>', methods=['GET'])
 def get_resident(id):
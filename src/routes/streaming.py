@@ -0,0 +1,65 @@
+# Chunked response bodies shared by the streaming endpoints (rent roll, occupancy listing, ...).
+# Each helper takes an iterable of row dicts and yields strings suitable for a streamed
+# flask.Response, so memory stays proportional to one chunk rather than the whole result.
+from flask import current_app
+import csv
+import io
+
+# Rows are buffered into chunks of this many records before being written to the client
+STREAM_CHUNK_ROWS = 500
+
+
+def chunked(rows):
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= STREAM_CHUNK_ROWS:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def json_array_chunks(rows):
+    """Streams rows as a single JSON array, encoded the same way jsonify would encode each row."""
+    dumps = current_app.json.dumps
+    yield '['
+    first = True
+    for chunk in chunked(rows):
+        body = ','.join(dumps(row) for row in chunk)
+        yield body if first else ',' + body
+        first = False
+    yield ']\n'
+
+
+def ndjson_chunks(rows):
+    dumps = current_app.json.dumps
+    for chunk in chunked(rows):
+        yield ''.join(dumps(row) + '\n' for row in chunk)
+
+
+def csv_chunks(rows):
+    """Streams rows as CSV; the header comes from the first row, so an empty report is an empty body."""
+    buffer = io.StringIO()
+    writer = None
+    for chunk in chunked(rows):
+        if writer is None:
+            writer = csv.DictWriter(buffer, fieldnames=list(chunk[0].keys()))
+            writer.writeheader()
+        writer.writerows(chunk)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+
+
+def columnar_chunks(columns):
+    """Streams a RentRollColumns as one JSON object, writing each column as a separate chunk."""
+    dumps = current_app.json.dumps
+    body = columns.to_dict()
+    arrays = body.pop('columns')
+    yield dumps(body)[:-1] + ',"columns":{'
+    first = True
+    for name, values in arrays.items():
+        yield ('' if first else ',') + dumps(name) + ':' + dumps(values)
+        first = False
+    yield '}}\n'
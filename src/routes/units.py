@@ -1,7 +1,11 @@
 from flask import Blueprint, request, jsonify
 from ..models import Property, Unit, UnitStatus, Occupancy, Resident, Rent
 from ..config import ValidationConfig
+from ..services.rent_ledger import unit_rent_ledger
+from ..services.facts import refresh_unit_facts
 from .. import db
+from .pagination import parse_page_args, page_response, int_arg, date_arg
+from sqlalchemy import select, func
 from datetime import date
 import re
 
@@ -33,21 +37,45 @@ def create_unit():
     
     unit = Unit(property_id=data['property_id'], unit_number=unit_number_int)
     db.session.add(unit)
+    db.session.flush()
+    refresh_unit_facts([unit.id])
     db.session.commit()
     return jsonify(unit.to_dict()), 201
 
 @units_bp.route('/units', methods=['GET'])
 def list_units():
-    property_id = request.args.get('property_id')
-    if property_id:
-        try:
-            pid = int(property_id)
-        except ValueError:
-            return jsonify({'error': 'property_id must be an integer'}), 400
-        units = Unit.query.filter_by(property_id=pid).all()
-    else:
-        units = Unit.query.all()
-    return jsonify([u.to_dict() for u in units]), 200
+    """
+    Lists units ordered by id. Optional filters: property_id, and status (active/inactive)
+    as of ?date= (default today). Supports ?limit= and ?after= keyset pagination.
+    """
+    try:
+        limit, after = parse_page_args((int,))
+        pid = int_arg('property_id')
+        as_of = date_arg('date') or date.today()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    status = request.args.get('status')
+    if status is not None and status not in ['active', 'inactive']:
+        return jsonify({'error': 'Status must be "active" or "inactive"'}), 400
+    query = Unit.query
+    if pid is not None:
+        query = query.filter(Unit.property_id == pid)
+    if status:
+        latest_status = (
+            select(UnitStatus.status)
+            .where(UnitStatus.unit_id == Unit.id, UnitStatus.start_date <= as_of)
+            .order_by(UnitStatus.start_date.desc(), UnitStatus.id.desc())
+            .limit(1)
+            .scalar_subquery()
+        )
+        # Units without any status history are active
+        query = query.filter(func.coalesce(latest_status, 'active') == status)
+    if after:
+        query = query.filter(Unit.id > after[0])
+    query = query.order_by(Unit.id)
+    if limit:
+        query = query.limit(limit + 1)
+    return page_response([u.to_dict() for u in query.all()], limit, lambda item: (item['id'],))
 
 @units_bp.route('/units/<int:id>', methods=['GET'])
 def get_unit(id):
@@ -88,6 +116,7 @@ def update_unit(id):
         if not prop:
             return jsonify({'error': 'Property not found'}), 404
         unit.property_id = data['property_id']
+    refresh_unit_facts([unit.id])
     db.session.commit()
     return jsonify(unit.to_dict()), 200
 
@@ -123,6 +152,7 @@ def set_unit_status(id):
         start_date=start_dt
     )
     db.session.add(status_rec)
+    refresh_unit_facts([id])
     db.session.commit()
     return jsonify({'message': 'Unit status change logged'}), 201
 
@@ -150,27 +180,4 @@ def unit_rents(unit_id):
     unit = db.session.get(Unit, unit_id)
     if not unit:
         return jsonify({'error': 'Unit not found'}), 404
-    occs = unit.occupancies.order_by(Occupancy.move_in_date).all()
-    out = []
-    for occ in occs:
-        resident = occ.resident
-        rents = Rent.query.filter_by(occupancy_id=occ.id).order_by(Rent.effective_date).all()
-        if not rents:
-            out.append({
-                'occupancy_id': occ.id,
-                'resident_id': resident.id if resident else None,
-                'resident_name': resident.full_name if resident else None,
-                'move_in_date': occ.move_in_date.isoformat() if occ.move_in_date else None,
-                'move_out_date': occ.move_out_date.isoformat() if occ.move_out_date else None,
-                'monthly_rent': None
-            })
-        else:
-            for r in rents:
-                out.append({
-                    'occupancy_id': occ.id,
-                    'resident_id': resident.id if resident else None,
-                    'resident_name': resident.full_name if resident else None,
-                    'effective_date': r.effective_date.isoformat(),
-                    'monthly_rent': r.amount
-                })
-    return jsonify(out), 200
+    return jsonify(unit_rent_ledger(unit_id)), 200
@@ -1,6 +1,9 @@
 # services package
 
 from .rent_roll import generate_rent_roll
-from .kpis import move_in_out_counts, occupancy_rate_for_month
+from .rent_ledger import unit_rent_ledger, iter_property_rent_ledger
+from .facts import refresh_unit_facts, rebuild_facts
+from .data_versions import data_versions
+from .kpis import move_in_out_counts, move_in_out_counts_by_property, occupancy_rate_for_month, kpi_series
 
-__all__ = ["generate_rent_roll", "move_in_out_counts", "occupancy_rate_for_month"]
\ No newline at end of file
+__all__ = ["generate_rent_roll", "unit_rent_ledger", "iter_property_rent_ledger", "refresh_unit_facts", "rebuild_facts", "data_versions", "move_in_out_counts", "move_in_out_counts_by_property", "occupancy_rate_for_month", "kpi_series"]
\ No newline at end of file
@@ -0,0 +1,454 @@
+# src/services/bulk_import.py
+"""
+Bulk import of properties, units, residents and occupancies.
+
+Every record has a 'type' (property, unit, resident or occupancy) and the fields of the
+matching POST endpoint. Records can refer to rows created earlier in the same batch by
+natural key instead of id:
+
+    property:  name
+    unit:      property_id or property_name, unit_number
+    resident:  first_name, last_name
+    occupancy: unit_id or (property_id or property_name, unit_number),
+               resident_id or (first_name, last_name),
+               move_in_date, move_out_date (optional), initial_rent
+
+The whole batch is validated first with a handful of set-based queries against the
+existing data (the ValidationConfig rules, name uniqueness, inactive units and
+overlapping occupancies of a unit or a resident, including overlaps within the batch),
+then inserted with one executemany per table in the caller's transaction. Nothing is
+inserted when any record is invalid.
+"""
+from ..models import Property, Unit, Resident, Occupancy, Rent
+from ..config import ValidationConfig
+from .. import db
+from .facts import refresh_after_bulk_write
+from .stays import overlapping_items
+from .timelines import status_timelines
+from sqlalchemy import select, insert, func, tuple_
+from datetime import date
+import csv
+import io
+import json
+import re
+
+IMPORT_FORMATS = ('csv', 'ndjson')
+RECORD_TYPES = ('property', 'unit', 'resident', 'occupancy')
+
+# Values per IN (...) list when looking up existing rows
+LOOKUP_CHUNK_SIZE = 500
+
+
+def parse_import(text, fmt):
+    """
+    Parses a CSV (with a header row) or NDJSON document into a list of records. A line
+    that is not a JSON object is kept as None so that it is reported by import_records().
+    """
+    if fmt not in IMPORT_FORMATS:
+        raise ValueError(f"Unknown import format '{fmt}'. Use one of: {', '.join(IMPORT_FORMATS)}")
+    if fmt == 'csv':
+        # Empty cells mean "not given", like a missing JSON key
+        return [{k: v for k, v in record.items() if k is not None and v not in (None, '')}
+                for record in csv.DictReader(io.StringIO(text))]
+    records = []
+    for line in text.splitlines():
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError:
+            record = None
+        records.append(record if isinstance(record, dict) else None)
+    return records
+
+
+def import_records(records, dry_run=False):
+    """
+    Validates records and, when they are all valid and dry_run is false, inserts them.
+    Returns (counts, errors) where counts is {'properties': n, 'units': n, 'residents': n,
+    'occupancies': n} and errors lists {'row': n, 'error': message}; rows are numbered
+    from 1 in input order, not counting the CSV header.
+    Does not commit.
+    """
+    batch = _Batch(records)
+    batch.validate()
+    if batch.errors or dry_run:
+        return batch.counts(), batch.error_list()
+    batch.insert()
+    return batch.counts(), []
+
+
+def _text(record, field):
+    value = record.get(field)
+    if value is None:
+        return None
+    value = str(value).strip()
+    return value or None
+
+
+def _int(record, field):
+    value = record.get(field)
+    if value is None or value == '':
+        return None
+    if isinstance(value, bool):
+        raise ValueError
+    if isinstance(value, float) and not value.is_integer():
+        raise ValueError
+    return int(value)
+
+
+def _chunks(values):
+    values = list(values)
+    for i in range(0, len(values), LOOKUP_CHUNK_SIZE):
+        yield values[i:i + LOOKUP_CHUNK_SIZE]
+
+
+def _property_key(name):
+    return name.lower() if ValidationConfig.ENFORCE_UNIQUE_PROPERTY_NAME_CASE_INSENSITIVE else name
+
+
+def _resident_key(first_name, last_name):
+    if ValidationConfig.ENFORCE_UNIQUE_RESIDENT_NAME_CASE_INSENSITIVE:
+        return first_name.lower(), last_name.lower()
+    return first_name, last_name
+
+
+class _Batch:
+    """
+    Validation state for one import. Rows created by the batch are referred to as
+    ('new', row_number) and existing rows as ('id', id) until insert() assigns ids.
+    """
+
+    def __init__(self, records):
+        self.records = records
+        self.errors = {}
+        self.rows = {record_type: [] for record_type in RECORD_TYPES}
+        self.properties = {}   # row -> name
+        self.units = {}        # row -> (property ref, unit_number)
+        self.residents = {}    # row -> (first_name, last_name)
+        self.occupancies = {}  # row -> (unit ref, resident ref, move_in, move_out, rent)
+
+    def fail(self, row, message):
+        self.errors.setdefault(row, message)
+
+    def error_list(self):
+        return [{'row': row, 'error': self.errors[row]} for row in sorted(self.errors)]
+
+    def counts(self):
+        return {'properties': len(self.properties), 'units': len(self.units),
+                'residents': len(self.residents), 'occupancies': len(self.occupancies)}
+
+    # --- validation -------------------------------------------------------------------
+
+    def validate(self):
+        for row, record in enumerate(self.records, start=1):
+            if record is None:
+                self.fail(row, 'Row is not a JSON object')
+                continue
+            record_type = _text(record, 'type')
+            if record_type not in RECORD_TYPES:
+                self.fail(row, f"type must be one of: {', '.join(RECORD_TYPES)}")
+                continue
+            self.rows[record_type].append((row, record))
+        self._load_existing()
+        self._validate_properties()
+        self._validate_units()
+        self._validate_residents()
+        self._validate_occupancies()
+
+    def _load_existing(self):
+        """Loads, in a few IN (...) queries, every existing row the batch refers to."""
+        property_names, property_ids, unit_ids, resident_names, resident_ids = set(), set(), set(), set(), set()
+        for record_type in ('property', 'unit', 'occupancy'):
+            for _, record in self.rows[record_type]:
+                name = _text(record, 'name' if record_type == 'property' else 'property_name')
+                if name:
+                    property_names.add(_property_key(name))
+        for record_type in ('resident', 'occupancy'):
+            for _, record in self.rows[record_type]:
+                first_name, last_name = _text(record, 'first_name'), _text(record, 'last_name')
+                if first_name and last_name:
+                    resident_names.add(_resident_key(first_name, last_name))
+        for record_type, field, ids in (('unit', 'property_id', property_ids), ('occupancy', 'property_id', property_ids),
+                                        ('occupancy', 'unit_id', unit_ids), ('occupancy', 'resident_id', resident_ids)):
+            for _, record in self.rows[record_type]:
+                try:
+                    value = _int(record, field)
+                except (ValueError, TypeError):
+                    continue
+                if value is not None:
+                    ids.add(value)
+
+        name_column = func.lower(Property.name) if ValidationConfig.ENFORCE_UNIQUE_PROPERTY_NAME_CASE_INSENSITIVE else Property.name
+        self.existing_properties_by_name = {}
+        for chunk in _chunks(property_names):
+            for pid, name in db.session.execute(select(Property.id, Property.name).where(name_column.in_(chunk))):
+                self.existing_properties_by_name.setdefault(_property_key(name), []).append(pid)
+        self.existing_property_ids = set()
+        for chunk in _chunks(property_ids):
+            self.existing_property_ids.update(db.session.execute(select(Property.id).where(Property.id.in_(chunk))).scalars())
+        self.existing_property_ids.update(pid for pids in self.existing_properties_by_name.values() for pid in pids)
+
+        self.existing_units_by_number = {}
+        self.existing_unit_ids = set()
+        for chunk in _chunks(self.existing_property_ids):
+            for uid, pid, number in db.session.execute(
+                    select(Unit.id, Unit.property_id, Unit.unit_number).where(Unit.property_id.in_(chunk))):
+                self.existing_units_by_number.setdefault((pid, str(number)), []).append(uid)
+                self.existing_unit_ids.add(uid)
+        for chunk in _chunks(unit_ids - self.existing_unit_ids):
+            self.existing_unit_ids.update(db.session.execute(select(Unit.id).where(Unit.id.in_(chunk))).scalars())
+
+        if ValidationConfig.ENFORCE_UNIQUE_RESIDENT_NAME_CASE_INSENSITIVE:
+            name_columns = tuple_(func.lower(Resident.first_name), func.lower(Resident.last_name))
+        else:
+            name_columns = tuple_(Resident.first_name, Resident.last_name)
+        self.existing_residents_by_name = {}
+        for chunk in _chunks(resident_names):
+            for rid, first_name, last_name in db.session.execute(
+                    select(Resident.id, Resident.first_name, Resident.last_name).where(name_columns.in_(chunk))):
+                self.existing_residents_by_name.setdefault(_resident_key(first_name, last_name), []).append(rid)
+        self.existing_resident_ids = {rid for rids in self.existing_residents_by_name.values() for rid in rids}
+        for chunk in _chunks(resident_ids - self.existing_resident_ids):
+            self.existing_resident_ids.update(db.session.execute(select(Resident.id).where(Resident.id.in_(chunk))).scalars())
+
+    def _validate_properties(self):
+        self.new_properties_by_name = {}
+        for row, record in self.rows['property']:
+            name = _text(record, 'name')
+            if not name:
+                self.fail(row, 'Property name is required')
+            elif not re.match(ValidationConfig.PROPERTY_NAME_REGEX, name):
+                self.fail(row, f'Property name must match pattern {ValidationConfig.PROPERTY_NAME_REGEX}')
+            elif len(name) > ValidationConfig.PROPERTY_NAME_MAX_LENGTH:
+                self.fail(row, f'Property name max length is {ValidationConfig.PROPERTY_NAME_MAX_LENGTH}')
+            elif ValidationConfig.ENFORCE_UNIQUE_PROPERTY_NAME and (
+                    _property_key(name) in self.existing_properties_by_name or _property_key(name) in self.new_properties_by_name):
+                self.fail(row, 'Property name must be unique')
+            else:
+                self.new_properties_by_name.setdefault(_property_key(name), []).append(row)
+                self.properties[row] = name
+
+    def _property_ref(self, record):
+        """Resolves a property_id or property_name field to a ref; raises ValueError with the reason."""
+        try:
+            pid = _int(record, 'property_id')
+        except (ValueError, TypeError):
+            raise ValueError('property_id must be an integer')
+        if pid is not None:
+            if pid not in self.existing_property_ids:
+                raise ValueError('Property not found')
+            return ('id', pid)
+        name = _text(record, 'property_name')
+        if not name:
+            raise ValueError('property_id or property_name is required')
+        matches = [('new', row) for row in self.new_properties_by_name.get(_property_key(name), [])]
+        matches += [('id', pid) for pid in self.existing_properties_by_name.get(_property_key(name), [])]
+        if not matches:
+            raise ValueError(f"Property '{name}' not found")
+        if len(matches) > 1:
+            raise ValueError(f"Property name '{name}' is ambiguous")
+        return matches[0]
+
+    def _validate_units(self):
+        self.new_units_by_number = {}
+        for row, record in self.rows['unit']:
+            try:
+                prop = self._property_ref(record)
+            except ValueError as e:
+                self.fail(row, str(e))
+                continue
+            number = _text(record, 'unit_number')
+            if not number:
+                self.fail(row, 'unit_number is required')
+            elif not re.match(ValidationConfig.UNIT_NUMBER_REGEX, number):
+                self.fail(row, f'unit_number must match pattern {ValidationConfig.UNIT_NUMBER_REGEX}')
+            elif len(number) > ValidationConfig.UNIT_NUMBER_MAX_LENGTH:
+                self.fail(row, f'unit_number max length is {ValidationConfig.UNIT_NUMBER_MAX_LENGTH}')
+            elif not number.isdigit():
+                self.fail(row, 'unit_number must be an integer')
+            elif not (ValidationConfig.UNIT_NUMBER_MIN <= int(number) <= ValidationConfig.UNIT_NUMBER_MAX):
+                self.fail(row, f'unit_number must be between {ValidationConfig.UNIT_NUMBER_MIN} and {ValidationConfig.UNIT_NUMBER_MAX}')
+            else:
+                number = str(int(number))
+                # Units are referred to by (property, unit_number), so an import cannot repeat one
+                if (prop, number) in self.new_units_by_number or (
+                        prop[0] == 'id' and (prop[1], number) in self.existing_units_by_number):
+                    self.fail(row, f'Unit {number} already exists in this property')
+                    continue
+                self.new_units_by_number[(prop, number)] = row
+                self.units[row] = (prop, number)
+
+    def _validate_residents(self):
+        self.new_residents_by_name = {}
+        for row, record in self.rows['resident']:
+            names = []
+            for field in ('first_name', 'last_name'):
+                value = _text(record, field)
+                if not value:
+                    self.fail(row, 'first_name and last_name are required')
+                elif not re.match(ValidationConfig.RESIDENT_NAME_REGEX, value):
+                    self.fail(row, f'{field} must match pattern {ValidationConfig.RESIDENT_NAME_REGEX}')
+                elif len(value) > ValidationConfig.RESIDENT_NAME_MAX_LENGTH:
+                    self.fail(row, f'{field} max length is {ValidationConfig.RESIDENT_NAME_MAX_LENGTH}')
+                names.append(value)
+            if row in self.errors:
+                continue
+            key = _resident_key(*names)
+            if ValidationConfig.ENFORCE_UNIQUE_RESIDENT_NAME and (
+                    key in self.existing_residents_by_name or key in self.new_residents_by_name):
+                self.fail(row, 'Resident with this first and last name already exists')
+                continue
+            self.new_residents_by_name.setdefault(key, []).append(row)
+            self.residents[row] = tuple(names)
+
+    def _unit_ref(self, record):
+        try:
+            uid = _int(record, 'unit_id')
+        except (ValueError, TypeError):
+            raise ValueError('unit_id must be an integer')
+        if uid is not None:
+            if uid not in self.existing_unit_ids:
+                raise ValueError('Unit not found')
+            return ('id', uid)
+        prop = self._property_ref(record)
+        number = _text(record, 'unit_number')
+        if not number or not number.isdigit():
+            raise ValueError('unit_id or unit_number is required')
+        number = str(int(number))
+        matches = []
+        if (prop, number) in self.new_units_by_number:
+            matches.append(('new', self.new_units_by_number[(prop, number)]))
+        if prop[0] == 'id':
+            matches += [('id', uid) for uid in self.existing_units_by_number.get((prop[1], number), [])]
+        if not matches:
+            raise ValueError(f'Unit {number} not found')
+        if len(matches) > 1:
+            raise ValueError(f'Unit {number} is ambiguous')
+        return matches[0]
+
+    def _resident_ref(self, record):
+        try:
+            rid = _int(record, 'resident_id')
+        except (ValueError, TypeError):
+            raise ValueError('resident_id must be an integer')
+        if rid is not None:
+            if rid not in self.existing_resident_ids:
+                raise ValueError('Resident not found')
+            return ('id', rid)
+        first_name, last_name = _text(record, 'first_name'), _text(record, 'last_name')
+        if not first_name or not last_name:
+            raise ValueError('resident_id or first_name and last_name are required')
+        key = _resident_key(first_name, last_name)
+        matches = [('new', row) for row in self.new_residents_by_name.get(key, [])]
+        matches += [('id', rid) for rid in self.existing_residents_by_name.get(key, [])]
+        if not matches:
+            raise ValueError(f'Resident {first_name} {last_name} not found')
+        if len(matches) > 1:
+            raise ValueError(f'Resident {first_name} {last_name} is ambiguous')
+        return matches[0]
+
+    def _validate_occupancies(self):
+        candidates = {}
+        for row, record in self.rows['occupancy']:
+            try:
+                unit = self._unit_ref(record)
+                resident = self._resident_ref(record)
+            except ValueError as e:
+                self.fail(row, str(e))
+                continue
+            try:
+                move_in = date.fromisoformat(_text(record, 'move_in_date') or '')
+                move_out = _text(record, 'move_out_date')
+                move_out = date.fromisoformat(move_out) if move_out else None
+            except ValueError:
+                self.fail(row, 'move_in_date is required and dates must be YYYY-MM-DD')
+                continue
+            if move_out and move_in >= move_out:
+                self.fail(row, 'Move-in date must be before move-out date')
+                continue
+            try:
+                rent = _int(record, 'initial_rent')
+            except (ValueError, TypeError):
+                self.fail(row, 'initial_rent must be an integer')
+                continue
+            if rent is None:
+                self.fail(row, 'initial_rent is required')
+                continue
+            if rent <= 0:
+                self.fail(row, 'initial_rent must be positive')
+                continue
+            candidates[row] = (unit, resident, move_in, move_out, rent)
+
+        existing_units = {ref[1] for ref, _, _, _, _ in candidates.values() if ref[0] == 'id'}
+        existing_residents = {ref[1] for _, ref, _, _, _ in candidates.values() if ref[0] == 'id'}
+        statuses = status_timelines(existing_units)
+        stays_by_unit, stays_by_resident = {}, {}
+        seen = set()
+        for column, ids in ((Occupancy.unit_id, existing_units), (Occupancy.resident_id, existing_residents)):
+            for chunk in _chunks(ids):
+                for occ_id, uid, rid, move_in, move_out in db.session.execute(
+                        select(Occupancy.id, Occupancy.unit_id, Occupancy.resident_id,
+                               Occupancy.move_in_date, Occupancy.move_out_date).where(column.in_(chunk))):
+                    if occ_id in seen:
+                        continue
+                    seen.add(occ_id)
+                    stays_by_unit.setdefault(('id', uid), []).append((move_in, move_out, None))
+                    stays_by_resident.setdefault(('id', rid), []).append((move_in, move_out, None))
+
+        for row, (unit, resident, move_in, move_out, rent) in candidates.items():
+            if unit[0] == 'id' and statuses[unit[1]].value_on(move_in) == 'inactive':
+                self.fail(row, f'Unit is inactive on {move_in.isoformat()}')
+                continue
+            stays_by_unit.setdefault(unit, []).append((move_in, move_out, row))
+            stays_by_resident.setdefault(resident, []).append((move_in, move_out, row))
+        self._fail_overlaps(stays_by_unit, 'Unit is already occupied during the specified period')
+        self._fail_overlaps(stays_by_resident, 'Resident has overlapping occupancy')
+        for row, occupancy in candidates.items():
+            if row not in self.errors:
+                self.occupancies[row] = occupancy
+
+    def _fail_overlaps(self, stays_by_owner, message):
+        for row in overlapping_items(stays_by_owner):
+            self.fail(row, message)
+
+    # --- insertion --------------------------------------------------------------------
+
+    def insert(self):
+        property_ids = self._insert_returning(
+            Property, Property.id, [(row, {'name': name}) for row, name in self.properties.items()])
+        resolve = lambda ref, new_ids: ref[1] if ref[0] == 'id' else new_ids[ref[1]]
+        unit_ids = self._insert_returning(Unit, Unit.id, [
+            (row, {'property_id': resolve(prop, property_ids), 'unit_number': number})
+            for row, (prop, number) in self.units.items()
+        ])
+        resident_ids = self._insert_returning(Resident, Resident.id, [
+            (row, {'first_name': first_name, 'last_name': last_name})
+            for row, (first_name, last_name) in self.residents.items()
+        ])
+        occupancy_ids = self._insert_returning(Occupancy, Occupancy.id, [
+            (row, {'unit_id': resolve(unit, unit_ids), 'resident_id': resolve(resident, resident_ids),
+                   'move_in_date': move_in, 'move_out_date': move_out})
+            for row, (unit, resident, move_in, move_out, _) in self.occupancies.items()
+        ])
+        if self.occupancies:
+            db.session.execute(insert(Rent), [
+                {'occupancy_id': occupancy_ids[row], 'amount': rent, 'effective_date': move_in}
+                for row, (_, _, move_in, _, rent) in self.occupancies.items()
+            ])
+
+        touched_units = set(unit_ids.values())
+        touched_units.update(resolve(unit, unit_ids) for unit, _, _, _, _ in self.occupancies.values())
+        touched_properties = set(property_ids.values())
+        for chunk in _chunks(touched_units):
+            touched_properties.update(db.session.execute(select(Unit.property_id).where(Unit.id.in_(chunk))).scalars())
+        refresh_after_bulk_write(touched_properties, touched_units)
+
+    def _insert_returning(self, model, id_column, rows):
+        """executemany INSERT ... RETURNING id; returns {row_number: new id}."""
+        if not rows:
+            return {}
+        new_ids = db.session.execute(
+            insert(model).returning(id_column, sort_by_parameter_order=True), [values for _, values in rows]
+        ).scalars().all()
+        return {row: new_id for (row, _), new_id in zip(rows, new_ids)}
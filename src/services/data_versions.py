@@ -0,0 +1,108 @@
+# src/services/data_versions.py
+"""
+Per-property data versions.
+
+PropertyDataVersion.version is bumped in the same transaction as any flush that creates,
+changes or deletes a unit, unit status, occupancy or rent of the property, or renames one
+of its residents, so every write route (and any other ORM write) moves it forward. A
+report computed while a property was at version N is current for as long as the property
+is still at version N, which is what the report cache keys on.
+
+Property ids and versions start over in a new or rebuilt database, so the cache also keys
+on the database's identity token (models.DatabaseIdentity).
+"""
+from ..models import Unit, Occupancy, Resident, Rent, UnitStatus, PropertyDataVersion, DatabaseIdentity
+from sqlalchemy import select, insert, update, event, inspect
+from sqlalchemy.orm import Session
+from .. import db
+
+
+def data_versions(property_ids):
+    """Returns {property_id: version} for the given properties; unseen properties are at 0."""
+    property_ids = list(property_ids)
+    versions = dict.fromkeys(property_ids, 0)
+    if property_ids:
+        versions.update(db.session.execute(
+            select(PropertyDataVersion.property_id, PropertyDataVersion.version)
+            .where(PropertyDataVersion.property_id.in_(property_ids))
+        ).all())
+    return versions
+
+
+def database_identity():
+    """The current database's identity token, or None if it has not been given one."""
+    return db.session.execute(select(DatabaseIdentity.token).where(DatabaseIdentity.id == 1)).scalar()
+
+
+def changed_unit_ids(session):
+    """
+    Ids of the units whose status history, occupancies or rents the current flush created,
+    changed or deleted (both the old and the new unit when a row was moved). For use from
+    after_flush listeners.
+    """
+    unit_ids = set()
+    occupancy_ids = set()
+    for obj in _changed_objects(session):
+        if isinstance(obj, Unit):
+            unit_ids.add(obj.id)
+        elif isinstance(obj, (UnitStatus, Occupancy)):
+            unit_ids.update(_current_and_previous(obj, 'unit_id'))
+        elif isinstance(obj, Rent):
+            occupancy_ids.update(_current_and_previous(obj, 'occupancy_id'))
+    occupancy_ids.discard(None)
+    if occupancy_ids:
+        unit_ids.update(session.connection().execute(
+            select(Occupancy.unit_id).where(Occupancy.id.in_(occupancy_ids))).scalars())
+    unit_ids.discard(None)
+    return unit_ids
+
+
+def bump_data_versions(connection, property_ids):
+    """Moves the given properties to their next data version."""
+    property_ids = set(property_ids)
+    if not property_ids:
+        return
+    table = PropertyDataVersion.__table__
+    existing = set(connection.execute(
+        select(table.c.property_id).where(table.c.property_id.in_(property_ids))).scalars())
+    if existing:
+        connection.execute(
+            update(table).where(table.c.property_id.in_(existing)).values(version=table.c.version + 1))
+    if property_ids - existing:
+        connection.execute(insert(table), [{'property_id': pid, 'version': 1} for pid in property_ids - existing])
+
+
+@event.listens_for(Session, 'after_flush')
+def _bump_touched_properties(session, flush_context):
+    unit_ids = changed_unit_ids(session)
+    resident_ids = set()
+    property_ids = set()
+    for obj in _changed_objects(session):
+        if isinstance(obj, Unit):
+            # A unit moved to another property changes the reports of both
+            property_ids.update(_current_and_previous(obj, 'property_id'))
+        elif isinstance(obj, Resident) and obj not in session.new:
+            resident_ids.add(obj.id)
+    connection = session.connection()
+    if unit_ids:
+        property_ids.update(connection.execute(
+            select(Unit.property_id).where(Unit.id.in_(unit_ids))).scalars())
+    if resident_ids:
+        # Rent rolls show resident names
+        property_ids.update(connection.execute(
+            select(Unit.property_id).join(Occupancy, Occupancy.unit_id == Unit.id)
+            .where(Occupancy.resident_id.in_(resident_ids))).scalars())
+    property_ids.discard(None)
+    bump_data_versions(connection, property_ids)
+
+
+def _changed_objects(session):
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        if obj in session.dirty and not session.is_modified(obj, include_collections=False):
+            continue
+        yield obj
+
+
+def _current_and_previous(obj, attr):
+    history = inspect(obj).attrs[attr].history
+    return {getattr(obj, attr), *history.deleted}
@@ -0,0 +1,160 @@
+# src/services/facts.py
+"""
+Incrementally maintained rent roll fact table.
+
+RentRollFact holds, for every unit, the spans of days over which its status, resident and
+rent stay the same (the same spans load_unit_spans computes, but over all time). The write
+routes call refresh_unit_facts() for the units they touch before committing, and
+rebuild_facts() (also available as `flask rebuild-facts`) recomputes everything. Core
+(bulk) writes call refresh_after_bulk_write(), which also does the data version and
+timeline upkeep the ORM flush hooks would have done.
+
+A unit's facts are only trusted while it has a RentRollFactState row. Any ORM flush that
+changes a unit, its status history, occupancies or rents without a following refresh
+deletes that row (see _invalidate_touched_units), and readers fall back to computing from
+the source tables until the unit is refreshed or rebuilt.
+"""
+from ..models import Unit, Resident, RentRollFact, RentRollFactState
+from .. import db
+from .rent_roll import compute_unit_spans
+from .data_versions import changed_unit_ids, bump_data_versions
+from .timelines import clear_timelines
+from sqlalchemy import select, insert, delete, func, event
+from sqlalchemy.orm import Session
+from datetime import date, datetime
+
+# Facts cover all of time: the first span of a unit starts on FACT_START and its last ends on FACT_END
+FACT_START = date.min
+FACT_END = date.max
+
+# Units recomputed per round trip by refresh_unit_facts()
+REBUILD_BATCH_SIZE = 500
+
+
+def refresh_unit_facts(unit_ids):
+    """
+    Recomputes the fact rows of the given units from the source tables and marks them
+    fresh, REBUILD_BATCH_SIZE units per round trip.
+    """
+    unit_ids = sorted({unit_id for unit_id in unit_ids if unit_id is not None})
+    if not unit_ids:
+        return
+    # Flush pending changes first so the spans see them (and the invalidation runs before we re-mark)
+    db.session.flush()
+    for i in range(0, len(unit_ids), REBUILD_BATCH_SIZE):
+        _refresh_batch(unit_ids[i:i + REBUILD_BATCH_SIZE])
+
+
+def refresh_after_bulk_write(property_ids, unit_ids, refresh_facts=True):
+    """
+    Brings the derived data up to date after Core inserts or updates, which bypass the ORM
+    flush hooks: moves the properties to their next data version, drops the request's
+    timelines and (unless refresh_facts is False) refreshes the units' facts.
+    """
+    bump_data_versions(db.session.connection(), property_ids)
+    clear_timelines()
+    if refresh_facts:
+        refresh_unit_facts(unit_ids)
+
+
+def _refresh_batch(unit_ids):
+    units = compute_unit_spans(Unit.id.in_(unit_ids), FACT_START, FACT_END)
+    db.session.execute(delete(RentRollFact).where(RentRollFact.unit_id.in_(unit_ids)))
+    db.session.execute(delete(RentRollFactState).where(RentRollFactState.unit_id.in_(unit_ids)))
+    facts = [
+        {'unit_id': unit_id, 'start_date': span[0], 'end_date': span[1], 'unit_status': span[2],
+         'resident_id': span[3], 'monthly_rent': span[5]}
+        for unit_id, _, spans in units
+        for span in spans
+    ]
+    if facts:
+        db.session.execute(insert(RentRollFact), facts)
+    if units:
+        built_at = datetime.now()
+        db.session.execute(insert(RentRollFactState), [{'unit_id': unit_id, 'built_at': built_at} for unit_id, _, _ in units])
+
+
+def rebuild_facts(property_id=None):
+    """Recomputes the fact rows of every unit (or every unit of one property). Returns the unit count."""
+    query = select(Unit.id).order_by(Unit.id)
+    if property_id is not None:
+        query = query.where(Unit.property_id == property_id)
+    unit_ids = db.session.execute(query).scalars().all()
+    refresh_unit_facts(unit_ids)
+    return len(unit_ids)
+
+
+def facts_are_fresh(property_id):
+    """True when every unit of the property has up-to-date fact rows."""
+    stale_units = db.session.execute(
+        select(func.count(Unit.id))
+        .outerjoin(RentRollFactState, RentRollFactState.unit_id == Unit.id)
+        .where(Unit.property_id == property_id, RentRollFactState.unit_id == None)
+    ).scalar()
+    return stale_units == 0
+
+
+def load_fact_spans(property_id, start_date, end_date):
+    """
+    Reads load_unit_spans() output for [start_date, end_date] from the fact table, or returns
+    None if the property's facts are not fresh.
+    """
+    if not facts_are_fresh(property_id):
+        return None
+    units = db.session.execute(
+        select(Unit.id, Unit.unit_number).where(Unit.property_id == property_id).order_by(Unit.id)
+    ).all()
+    spans_by_unit = {}
+    for unit_id, span_start, span_end, status, resident_id, first, last, rent in _fact_rows(property_id, start_date, end_date):
+        resident_name = f"{first} {last}" if first is not None else None
+        spans_by_unit.setdefault(unit_id, []).append(
+            (max(span_start, start_date), min(span_end, end_date), status, resident_id, resident_name, rent))
+    return [(unit_id, unit_number, spans_by_unit[unit_id]) for unit_id, unit_number in units]
+
+
+def fact_occupied_intervals(property_id, start_date, end_date):
+    """
+    kpis.occupied_intervals_by_unit() read from the fact table, or None if the property's
+    facts are not fresh.
+    """
+    if not facts_are_fresh(property_id):
+        return None
+    result = {}
+    for unit_id, span_start, span_end, status, resident_id, _, _, _ in _fact_rows(
+            property_id, start_date, end_date, occupied_only=True):
+        intervals = result.setdefault(unit_id, [])
+        first_day, last_day = max(span_start, start_date), min(span_end, end_date)
+        # Consecutive spans of one stay (e.g. split by a rent change) are merged
+        if intervals and (first_day - intervals[-1][1]).days == 1:
+            intervals[-1] = (intervals[-1][0], last_day)
+        else:
+            intervals.append((first_day, last_day))
+    return result
+
+
+def _fact_rows(property_id, start_date, end_date, occupied_only=False):
+    query = (
+        select(RentRollFact.unit_id, RentRollFact.start_date, RentRollFact.end_date, RentRollFact.unit_status,
+               RentRollFact.resident_id, Resident.first_name, Resident.last_name, RentRollFact.monthly_rent)
+        .join(Unit, Unit.id == RentRollFact.unit_id)
+        .outerjoin(Resident, Resident.id == RentRollFact.resident_id)
+        .where(
+            Unit.property_id == property_id,
+            RentRollFact.start_date <= end_date,
+            RentRollFact.end_date >= start_date,
+        )
+        .order_by(RentRollFact.unit_id, RentRollFact.start_date)
+    )
+    if occupied_only:
+        # Inactive spans never carry a resident
+        query = query.where(RentRollFact.resident_id != None)
+    return db.session.execute(query)
+
+
+@event.listens_for(Session, 'after_flush')
+def _invalidate_touched_units(session, flush_context):
+    """Marks the facts of every unit whose source rows this flush changed as stale."""
+    unit_ids = changed_unit_ids(session)
+    if unit_ids:
+        session.connection().execute(
+            delete(RentRollFactState.__table__).where(RentRollFactState.unit_id.in_(unit_ids)))
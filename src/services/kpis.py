@@ -1,9 +1,10 @@
 # src/services/kpis.py
-from ..models import Property, Unit, Occupancy
+from ..models import Property, Unit, Occupancy, UnitStatus
 from .. import db
-from .rent_roll import generate_rent_roll
-from datetime import date
-from collections import defaultdict
+from flask import current_app
+from sqlalchemy import select, or_, func, case
+from bisect import bisect_right
+from datetime import date, timedelta
 import calendar
 
 
@@ -11,10 +12,35 @@ def move_in_out_counts(property_id, start_date, end_date):
     """
     Returns the number of move-ins and move-outs for a property in the given date range.
     """
-    occs = Occupancy.query.join(Unit).filter(Unit.property_id == property_id).all()
-    move_ins = sum(1 for occ in occs if occ.move_in_date and start_date <= occ.move_in_date <= end_date)
-    move_outs = sum(1 for occ in occs if occ.move_out_date and start_date <= occ.move_out_date <= end_date)
-    return {'move_ins': move_ins, 'move_outs': move_outs}
+    counts = move_in_out_counts_by_property(start_date, end_date, property_ids=[property_id])
+    return counts.get(property_id, {'move_ins': 0, 'move_outs': 0})
+
+
+def move_in_out_counts_by_property(start_date, end_date, property_ids=None):
+    """
+    Returns {property_id: {'move_ins': n, 'move_outs': n}} for the given properties (or every
+    property when property_ids is None), counted in the database with one grouped query.
+    Only occupancies with a move date inside the range are read, so the cost follows the
+    window rather than the total turnover history. Properties without moves are omitted.
+    """
+    moved_in = Occupancy.move_in_date.between(start_date, end_date)
+    moved_out = Occupancy.move_out_date.between(start_date, end_date)
+    query = (
+        select(
+            Unit.property_id,
+            func.count(case((moved_in, 1))),
+            func.count(case((moved_out, 1))),
+        )
+        .join(Unit, Unit.id == Occupancy.unit_id)
+        .where(or_(moved_in, moved_out))
+        .group_by(Unit.property_id)
+    )
+    if property_ids is not None:
+        query = query.where(Unit.property_id.in_(property_ids))
+    return {
+        property_id: {'move_ins': move_ins, 'move_outs': move_outs}
+        for property_id, move_ins, move_outs in db.session.execute(query)
+    }
 
 def occupancy_rate_for_month(property_id, year, month):
     """
@@ -27,13 +53,10 @@ def occupancy_rate_for_month(property_id, year, month):
     days_in_month = calendar.monthrange(year, month)[1]
     month_start = date(year, month, 1)
     month_end = date(year, month, days_in_month)
-    rent_roll_month = generate_rent_roll(property_id, month_start, month_end)
-    # Count unique (unit_id, date) pairs with a resident
-    seen = set()
-    for r in rent_roll_month:
-        if r.get('resident_id') is not None:
-            seen.add((r['unit_id'], r['date']))
-    occupied_days = len(seen)
+    occupied_days = sum(
+        _interval_days(intervals)
+        for intervals in occupied_intervals_by_unit(property_id, month_start, month_end).values()
+    )
     total_unit_days = total_units * days_in_month if total_units > 0 else 0
     occupancy_rate = round(occupied_days / total_unit_days, 4) if total_unit_days > 0 else 0.0
     return {
@@ -42,3 +65,188 @@ def occupancy_rate_for_month(property_id, year, month):
         'occupied_days': occupied_days,
         'month': f"{year:04d}-{month:02d}"
     }
+
+
+KPI_SERIES_BUCKETS = ('day', 'week', 'month')
+
+
+def kpi_series(property_id, start_date, end_date, bucket='month'):
+    """
+    Returns occupancy rate, move-ins and move-outs for every day, week (Monday-based) or
+    calendar month bucket in [start_date, end_date]. The first and last buckets are clipped
+    to the range, so a full-month range gives the same numbers as occupancy_rate_for_month
+    and move_in_out_counts.
+
+    Occupied intervals and move dates are loaded once for the whole range and distributed
+    over the buckets in a single pass.
+    """
+    if bucket not in KPI_SERIES_BUCKETS:
+        raise ValueError(f"Unknown bucket '{bucket}'. Use one of: {', '.join(KPI_SERIES_BUCKETS)}")
+    buckets = _bucket_bounds(start_date, end_date, bucket)
+    prop = db.session.get(Property, property_id)
+    total_units = prop.units.count() if prop else 0
+    bucket_starts = [first_day for first_day, _ in buckets]
+    occupied = [0] * len(buckets)
+    move_ins = [0] * len(buckets)
+    move_outs = [0] * len(buckets)
+
+    if total_units:
+        for intervals in occupied_intervals_by_unit(property_id, start_date, end_date).values():
+            for first_day, last_day in intervals:
+                idx = bisect_right(bucket_starts, first_day) - 1
+                while idx < len(buckets) and buckets[idx][0] <= last_day:
+                    overlap_start = max(first_day, buckets[idx][0])
+                    overlap_end = min(last_day, buckets[idx][1])
+                    occupied[idx] += (overlap_end - overlap_start).days + 1
+                    idx += 1
+
+        for move_in, move_out in db.session.execute(
+            select(Occupancy.move_in_date, Occupancy.move_out_date)
+            .join(Unit, Unit.id == Occupancy.unit_id)
+            .where(
+                Unit.property_id == property_id,
+                or_(Occupancy.move_in_date.between(start_date, end_date),
+                    Occupancy.move_out_date.between(start_date, end_date)),
+            )
+        ):
+            if start_date <= move_in <= end_date:
+                move_ins[bisect_right(bucket_starts, move_in) - 1] += 1
+            if move_out and start_date <= move_out <= end_date:
+                move_outs[bisect_right(bucket_starts, move_out) - 1] += 1
+
+    series = []
+    for idx, (first_day, last_day) in enumerate(buckets):
+        total_unit_days = total_units * ((last_day - first_day).days + 1)
+        series.append({
+            'bucket_start': first_day.isoformat(),
+            'bucket_end': last_day.isoformat(),
+            'occupancy_rate': round(occupied[idx] / total_unit_days, 4) if total_unit_days > 0 else 0.0,
+            'total_units_days': total_unit_days,
+            'occupied_days': occupied[idx],
+            'move_ins': move_ins[idx],
+            'move_outs': move_outs[idx]
+        })
+    return series
+
+
+def _bucket_bounds(start_date, end_date, bucket):
+    """Inclusive (first_day, last_day) bounds of each bucket, clipped to [start_date, end_date]."""
+    bounds = []
+    first_day = start_date
+    while first_day <= end_date:
+        if bucket == 'day':
+            last_day = first_day
+        elif bucket == 'week':
+            last_day = first_day + timedelta(days=6 - first_day.weekday())
+        else:
+            last_day = date(first_day.year, first_day.month, calendar.monthrange(first_day.year, first_day.month)[1])
+        last_day = min(last_day, end_date)
+        bounds.append((first_day, last_day))
+        first_day = last_day + timedelta(days=1)
+    return bounds
+
+
+def occupied_intervals_by_unit(property_id, start_date, end_date):
+    """
+    Returns {unit_id: [(first_day, last_day), ...]} with the days in [start_date, end_date]
+    on which each unit both has an occupant and is not inactive, i.e. exactly the days the
+    rent roll reports a resident. Intervals are inclusive, sorted and non-overlapping; units
+    that are never occupied in the range are omitted.
+
+    Computed from the Occupancy and UnitStatus intervals directly (two queries), without
+    expanding the range into days, or read from the fact table when it is fresh.
+    """
+    if current_app.config.get('USE_FACT_TABLE', True):
+        from .facts import fact_occupied_intervals
+        intervals = fact_occupied_intervals(property_id, start_date, end_date)
+        if intervals is not None:
+            return intervals
+    statuses_by_unit = {}
+    for unit_id, start, status in db.session.execute(
+        select(UnitStatus.unit_id, UnitStatus.start_date, UnitStatus.status)
+        .join(Unit, Unit.id == UnitStatus.unit_id)
+        .where(Unit.property_id == property_id, UnitStatus.start_date <= end_date)
+        .order_by(UnitStatus.unit_id, UnitStatus.start_date, UnitStatus.id)
+    ):
+        statuses_by_unit.setdefault(unit_id, []).append((start, status))
+
+    stays_by_unit = {}
+    for unit_id, move_in, move_out in db.session.execute(
+        select(Occupancy.unit_id, Occupancy.move_in_date, Occupancy.move_out_date)
+        .join(Unit, Unit.id == Occupancy.unit_id)
+        .where(
+            Unit.property_id == property_id,
+            Occupancy.move_in_date <= end_date,
+            or_(Occupancy.move_out_date == None, Occupancy.move_out_date > start_date),
+        )
+    ):
+        # move_out_date is the first vacant day
+        last_day = min(move_out - timedelta(days=1), end_date) if move_out else end_date
+        first_day = max(move_in, start_date)
+        if first_day <= last_day:
+            stays_by_unit.setdefault(unit_id, []).append((first_day, last_day))
+
+    result = {}
+    for unit_id, stays in stays_by_unit.items():
+        active = _active_intervals(statuses_by_unit.get(unit_id, []), start_date, end_date)
+        occupied = _intersect_intervals(_merge_intervals(stays), active)
+        if occupied:
+            result[unit_id] = occupied
+    return result
+
+
+def _active_intervals(statuses, start_date, end_date):
+    """Inclusive sub-intervals of [start_date, end_date] on which a unit is not inactive."""
+    state = 'active'
+    for status_start, status in statuses:
+        if status_start > start_date:
+            break
+        state = status
+    intervals = []
+    active_from = start_date if state != 'inactive' else None
+    for status_start, status in statuses:
+        if status_start <= start_date:
+            continue
+        if status_start > end_date:
+            break
+        if status == 'inactive' and active_from is not None:
+            if active_from < status_start:
+                intervals.append((active_from, status_start - timedelta(days=1)))
+            active_from = None
+        elif status != 'inactive' and active_from is None:
+            active_from = status_start
+    if active_from is not None:
+        intervals.append((active_from, end_date))
+    return intervals
+
+
+def _merge_intervals(intervals):
+    """Unions inclusive day intervals, merging ones that overlap or touch."""
+    merged = []
+    for first_day, last_day in sorted(intervals):
+        if merged and first_day <= merged[-1][1] + timedelta(days=1):
+            if last_day > merged[-1][1]:
+                merged[-1] = (merged[-1][0], last_day)
+        else:
+            merged.append((first_day, last_day))
+    return merged
+
+
+def _intersect_intervals(left, right):
+    """Intersects two sorted, non-overlapping lists of inclusive day intervals."""
+    out = []
+    i = j = 0
+    while i < len(left) and j < len(right):
+        first_day = max(left[i][0], right[j][0])
+        last_day = min(left[i][1], right[j][1])
+        if first_day <= last_day:
+            out.append((first_day, last_day))
+        if left[i][1] < right[j][1]:
+            i += 1
+        else:
+            j += 1
+    return out
+
+
+def _interval_days(intervals):
+    return sum((last_day - first_day).days + 1 for first_day, last_day in intervals)
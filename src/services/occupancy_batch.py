@@ -0,0 +1,193 @@
+# src/services/occupancy_batch.py
+"""
+Batch versions of the move-in and rent-change endpoints.
+
+Each batch is validated with a fixed number of queries whatever its size (one for the
+referenced units/residents/occupancies, one for unit status timelines, one interval query for
+every existing stay that could overlap a stay in the batch), using the same rules as the
+single-item endpoints; overlaps between items of the batch are checked too. A batch is
+written only when every item is valid, so the caller can commit it atomically.
+"""
+from ..models import Unit, Resident, Occupancy, Rent
+from .. import db
+from .facts import refresh_unit_facts
+from .stays import overlapping_items
+from .timelines import status_timelines
+from sqlalchemy import select, or_, tuple_
+from datetime import date
+
+
+def batch_move_in(items):
+    """
+    Validates and (if every item is valid) adds the occupancies and initial rents of a
+    batch of move-ins, each shaped like the POST /occupancy/move-in body. Returns
+    (results, ok) with one result per item: {'index', 'status': 'created', 'occupancy'}
+    when ok, otherwise {'index', 'status': 'valid'} or {'index', 'status': 'error', 'error'}.
+    Does not commit.
+    """
+    errors = {}
+    parsed = {}
+    for index, item in enumerate(items):
+        error, value = _parse_move_in(item)
+        if error:
+            errors[index] = error
+        else:
+            parsed[index] = value
+
+    unit_ids = {unit_id for unit_id, _, _, _, _ in parsed.values()}
+    resident_ids = {resident_id for _, resident_id, _, _, _ in parsed.values()}
+    units = dict(db.session.execute(select(Unit.id, Unit.unit_number).where(Unit.id.in_(unit_ids))).all()) if unit_ids else {}
+    known_residents = set(db.session.execute(
+        select(Resident.id).where(Resident.id.in_(resident_ids))).scalars()) if resident_ids else set()
+    statuses = status_timelines(units)
+
+    stays_by_unit, stays_by_resident = {}, {}
+    if parsed:
+        # One interval query: every existing stay of the batch's units or residents that
+        # overlaps the span of dates the batch covers
+        first_move_in = min(move_in for _, _, move_in, _, _ in parsed.values())
+        last_move_out = max((move_out or date.max) for _, _, _, move_out, _ in parsed.values())
+        for unit_id, resident_id, move_in, move_out in db.session.execute(
+            select(Occupancy.unit_id, Occupancy.resident_id, Occupancy.move_in_date, Occupancy.move_out_date)
+            .where(
+                or_(Occupancy.unit_id.in_(unit_ids), Occupancy.resident_id.in_(resident_ids)),
+                Occupancy.move_in_date < last_move_out,
+                or_(Occupancy.move_out_date == None, Occupancy.move_out_date > first_move_in),
+            )
+        ):
+            stays_by_unit.setdefault(unit_id, []).append((move_in, move_out, None))
+            stays_by_resident.setdefault(resident_id, []).append((move_in, move_out, None))
+
+    for index, (unit_id, resident_id, move_in, move_out, _) in parsed.items():
+        if unit_id not in units:
+            errors[index] = 'Unit not found'
+        elif resident_id not in known_residents:
+            errors[index] = 'Resident not found'
+        elif statuses[unit_id].value_on(move_in) == 'inactive':
+            errors[index] = f'Unit {units[unit_id]} is inactive on {move_in.isoformat()}'
+        else:
+            stays_by_unit.setdefault(unit_id, []).append((move_in, move_out, index))
+            stays_by_resident.setdefault(resident_id, []).append((move_in, move_out, index))
+    for index in overlapping_items(stays_by_resident):
+        errors.setdefault(index, 'Resident has overlapping occupancy')
+    for index in overlapping_items(stays_by_unit):
+        unit_id, _, move_in, _, _ = parsed[index]
+        errors.setdefault(index, f'Unit {units[unit_id]} is already occupied on {move_in.isoformat()}')
+
+    if errors:
+        return _failed_results(len(items), errors), False
+    occupancies = []
+    for index in range(len(items)):
+        unit_id, resident_id, move_in, move_out, rent = parsed[index]
+        occ = Occupancy(unit_id=unit_id, resident_id=resident_id, move_in_date=move_in, move_out_date=move_out)
+        db.session.add(occ)
+        db.session.add(Rent(occupancy=occ, amount=rent, effective_date=move_in))
+        occupancies.append(occ)
+    refresh_unit_facts(unit_ids)
+    return [{'index': index, 'status': 'created', 'occupancy': occ.to_dict()}
+            for index, occ in enumerate(occupancies)], True
+
+
+def batch_rent_change(items):
+    """
+    Validates and (if every item is valid) adds a batch of rent changes, each shaped like
+    the POST /occupancy/<id>/rent-change body plus an occupancy_id. Results are shaped
+    like batch_move_in's, with 'rent' instead of 'occupancy'. Does not commit.
+    """
+    errors = {}
+    parsed = {}
+    for index, item in enumerate(items):
+        error, value = _parse_rent_change(item)
+        if error:
+            errors[index] = error
+        else:
+            parsed[index] = value
+
+    occupancy_ids = {occupancy_id for occupancy_id, _, _ in parsed.values()}
+    occupancies = {
+        occ_id: (unit_id, move_in, move_out)
+        for occ_id, unit_id, move_in, move_out in db.session.execute(
+            select(Occupancy.id, Occupancy.unit_id, Occupancy.move_in_date, Occupancy.move_out_date)
+            .where(Occupancy.id.in_(occupancy_ids))
+        )
+    } if occupancy_ids else {}
+    keys = {(occupancy_id, effective) for occupancy_id, effective, _ in parsed.values()}
+    existing = set(db.session.execute(
+        select(Rent.occupancy_id, Rent.effective_date, Rent.amount)
+        .where(tuple_(Rent.occupancy_id, Rent.effective_date).in_(keys))
+    ).all()) if keys else set()
+
+    seen = set()
+    for index, (occupancy_id, effective, amount) in parsed.items():
+        if occupancy_id not in occupancies:
+            errors[index] = 'Occupancy not found'
+            continue
+        _, move_in, move_out = occupancies[occupancy_id]
+        if (occupancy_id, effective, amount) in existing or (occupancy_id, effective, amount) in seen:
+            errors[index] = 'A rent record with this amount and date already exists.'
+        elif effective < move_in or (move_out and effective >= move_out):
+            errors[index] = 'effective_date must be within occupancy period'
+        seen.add((occupancy_id, effective, amount))
+
+    if errors:
+        return _failed_results(len(items), errors), False
+    rents = []
+    for index in range(len(items)):
+        occupancy_id, effective, amount = parsed[index]
+        rent = Rent(occupancy_id=occupancy_id, amount=amount, effective_date=effective)
+        db.session.add(rent)
+        rents.append(rent)
+    refresh_unit_facts({occupancies[occupancy_id][0] for occupancy_id, _, _ in parsed.values()})
+    return [{'index': index, 'status': 'created', 'rent': rent.to_dict()} for index, rent in enumerate(rents)], True
+
+
+def _parse_move_in(item):
+    if not isinstance(item, dict) or not all(
+            field in item for field in ('resident_id', 'unit_id', 'move_in_date', 'initial_rent')):
+        return 'Missing fields', None
+    try:
+        unit_id, resident_id = int(item['unit_id']), int(item['resident_id'])
+    except (ValueError, TypeError):
+        return 'unit_id and resident_id must be integers', None
+    try:
+        move_in = date.fromisoformat(item['move_in_date'])
+        move_out = date.fromisoformat(item['move_out_date']) if item.get('move_out_date') else None
+    except (ValueError, TypeError):
+        return 'Invalid date format. Use YYYY-MM-DD', None
+    if move_out and move_in >= move_out:
+        return 'Move-in date must be before move-out date', None
+    try:
+        rent = int(item['initial_rent'])
+    except (ValueError, TypeError):
+        return 'initial_rent must be an integer', None
+    if rent <= 0:
+        return 'initial_rent must be positive', None
+    return None, (unit_id, resident_id, move_in, move_out, rent)
+
+
+def _parse_rent_change(item):
+    if not isinstance(item, dict) or not all(field in item for field in ('occupancy_id', 'new_rent', 'effective_date')):
+        return 'occupancy_id, new_rent and effective_date are required', None
+    try:
+        occupancy_id = int(item['occupancy_id'])
+    except (ValueError, TypeError):
+        return 'occupancy_id must be an integer', None
+    try:
+        effective = date.fromisoformat(item['effective_date'])
+    except (ValueError, TypeError):
+        return 'Invalid date format. Use YYYY-MM-DD', None
+    try:
+        amount = int(item['new_rent'])
+    except (ValueError, TypeError):
+        return 'new_rent must be an integer', None
+    if amount <= 0:
+        return 'new_rent must be positive', None
+    return None, (occupancy_id, effective, amount)
+
+
+def _failed_results(count, errors):
+    return [
+        {'index': index, 'status': 'error', 'error': errors[index]} if index in errors
+        else {'index': index, 'status': 'valid'}
+        for index in range(count)
+    ]
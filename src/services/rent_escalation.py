@@ -0,0 +1,108 @@
+# src/services/rent_escalation.py
+"""
+Set-based rent escalation (e.g. annual increases).
+
+Every occupancy that is active on the effective date, has a rent before it and does not
+already have a rent record on it gets a new Rent row, computed from its latest rent
+before the effective date by the rule of its property. The new rows are written with one
+INSERT ... SELECT rather than one rent change per lease.
+
+The rules mirror POST /occupancy/<id>/rent-change: the effective date must lie within the
+occupancy period and the new rent must be a positive integer. A lease that already has a
+rent record on the effective date is left alone, which also makes re-running the same
+escalation a no-op.
+"""
+from ..models import Unit, Occupancy, Rent
+from .. import db
+from .facts import refresh_after_bulk_write
+from sqlalchemy import select, insert, func, or_, case, cast, literal, exists, Integer, Date
+
+
+def escalate_rents(effective_date, rules, dry_run=False):
+    """
+    rules is a list of {'percent': p} or {'amount': n} dicts, each optionally limited to a
+    'property_id'; a rule without property_id applies to every property without its own
+    rule. Percent increases are rounded to whole currency units, and leases whose rent
+    would not change are skipped.
+
+    Returns the changes as dicts (occupancy_id, property_id, unit_id, resident_id,
+    current_rent, new_rent) ordered by property, unit and occupancy. Unless dry_run, the
+    new rents are also inserted (without committing). Raises ValueError for bad rules.
+    """
+    changes_query = _changes_query(effective_date, _validate_rules(rules))
+    changes = [
+        {'occupancy_id': occ_id, 'property_id': property_id, 'unit_id': unit_id, 'resident_id': resident_id,
+         'current_rent': current_rent, 'new_rent': new_rent}
+        for occ_id, property_id, unit_id, resident_id, current_rent, new_rent in db.session.execute(
+            changes_query.order_by('property_id', 'unit_id', 'occupancy_id'))
+    ]
+    if dry_run or not changes:
+        return changes
+    source = changes_query.subquery()
+    db.session.execute(insert(Rent).from_select(
+        ['occupancy_id', 'amount', 'effective_date'],
+        select(source.c.occupancy_id, source.c.new_rent, literal(effective_date, Date)),
+    ))
+    refresh_after_bulk_write({change['property_id'] for change in changes}, {change['unit_id'] for change in changes})
+    return changes
+
+
+def _validate_rules(rules):
+    if not isinstance(rules, list) or not rules:
+        raise ValueError('rules must be a non-empty list')
+    by_property = {}
+    for rule in rules:
+        if not isinstance(rule, dict) or ('percent' in rule) == ('amount' in rule):
+            raise ValueError('Each rule needs exactly one of percent or amount')
+        kind = 'percent' if 'percent' in rule else 'amount'
+        value = rule[kind]
+        if isinstance(value, bool) or not isinstance(value, (int, float)):
+            raise ValueError(f'{kind} must be a number')
+        if kind == 'percent' and value <= -100:
+            raise ValueError('percent must be greater than -100')
+        if kind == 'amount' and not float(value).is_integer():
+            raise ValueError('amount must be an integer')
+        property_id = rule.get('property_id')
+        if property_id is not None and (isinstance(property_id, bool) or not isinstance(property_id, int)):
+            raise ValueError('property_id must be an integer')
+        if property_id in by_property:
+            raise ValueError('Only one rule per property (and one without property_id) is allowed')
+        by_property[property_id] = (kind, value)
+    return by_property
+
+
+def _changes_query(effective_date, rules):
+    current_rent = (
+        select(Rent.amount)
+        .where(Rent.occupancy_id == Occupancy.id, Rent.effective_date < effective_date)
+        .order_by(Rent.effective_date.desc(), Rent.id.desc())
+        .limit(1)
+        .scalar_subquery()
+    )
+    leases = (
+        select(Occupancy.id.label('occupancy_id'), Unit.property_id.label('property_id'), Unit.id.label('unit_id'),
+               Occupancy.resident_id.label('resident_id'), current_rent.label('current_rent'))
+        .join(Unit, Unit.id == Occupancy.unit_id)
+        .where(
+            Occupancy.move_in_date <= effective_date,
+            or_(Occupancy.move_out_date == None, Occupancy.move_out_date > effective_date),
+            ~exists().where(Rent.occupancy_id == Occupancy.id, Rent.effective_date == effective_date),
+        )
+    )
+    if None not in rules:
+        leases = leases.where(Unit.property_id.in_(list(rules)))
+    leases = leases.subquery()
+
+    def escalated(kind, value):
+        if kind == 'amount':
+            return leases.c.current_rent + int(value)
+        return cast(func.round(leases.c.current_rent * (100 + value) / 100.0), Integer)
+
+    per_property = [(leases.c.property_id == pid, escalated(*rule)) for pid, rule in rules.items() if pid is not None]
+    default = escalated(*rules[None]) if None in rules else None
+    new_rent = case(*per_property, else_=default) if per_property else default
+    return (
+        select(leases.c.occupancy_id, leases.c.property_id, leases.c.unit_id, leases.c.resident_id,
+               leases.c.current_rent, new_rent.label('new_rent'))
+        .where(leases.c.current_rent != None, new_rent > 0, new_rent != leases.c.current_rent)
+    )
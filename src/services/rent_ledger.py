@@ -0,0 +1,69 @@
+# src/services/rent_ledger.py
+from ..models import Unit, Occupancy, Resident, Rent
+from .. import db
+from sqlalchemy import select
+
+
+def unit_rent_ledger(unit_id):
+    """
+    Returns the rent history of every occupancy of a unit, ordered by move-in date then
+    effective date, loaded with a single joined query. Occupancies without any rent record
+    appear once with their move dates and monthly_rent None.
+    """
+    rows = db.session.execute(
+        select(Occupancy.id, Resident.id, Resident.first_name, Resident.last_name,
+               Occupancy.move_in_date, Occupancy.move_out_date, Rent.effective_date, Rent.amount)
+        .outerjoin(Resident, Resident.id == Occupancy.resident_id)
+        .outerjoin(Rent, Rent.occupancy_id == Occupancy.id)
+        .where(Occupancy.unit_id == unit_id)
+        .order_by(Occupancy.move_in_date, Occupancy.id, Rent.effective_date, Rent.id)
+    )
+    out = []
+    for occ_id, resident_id, first_name, last_name, move_in, move_out, effective, amount in rows:
+        resident_name = f"{first_name} {last_name}" if resident_id is not None else None
+        if effective is None:
+            out.append({
+                'occupancy_id': occ_id,
+                'resident_id': resident_id,
+                'resident_name': resident_name,
+                'move_in_date': move_in.isoformat() if move_in else None,
+                'move_out_date': move_out.isoformat() if move_out else None,
+                'monthly_rent': None
+            })
+        else:
+            out.append({
+                'occupancy_id': occ_id,
+                'resident_id': resident_id,
+                'resident_name': resident_name,
+                'effective_date': effective.isoformat(),
+                'monthly_rent': amount
+            })
+    return out
+
+
+def iter_property_rent_ledger(property_id, batch_size=1000):
+    """
+    Yields every rent record of every unit of a property, ordered by unit, occupancy and
+    effective date, from one query read in batches of batch_size rows.
+    """
+    rows = db.session.execute(
+        select(Unit.id, Unit.unit_number, Occupancy.id, Occupancy.resident_id,
+               Resident.first_name, Resident.last_name, Rent.id, Rent.effective_date, Rent.amount)
+        .join(Occupancy, Occupancy.unit_id == Unit.id)
+        .join(Rent, Rent.occupancy_id == Occupancy.id)
+        .outerjoin(Resident, Resident.id == Occupancy.resident_id)
+        .where(Unit.property_id == property_id)
+        .order_by(Unit.id, Occupancy.move_in_date, Occupancy.id, Rent.effective_date, Rent.id)
+        .execution_options(yield_per=batch_size)
+    )
+    for unit_id, unit_number, occ_id, resident_id, first_name, last_name, rent_id, effective, amount in rows:
+        yield {
+            'unit_id': unit_id,
+            'unit_number': unit_number,
+            'occupancy_id': occ_id,
+            'resident_id': resident_id,
+            'resident_name': f"{first_name} {last_name}" if first_name is not None else None,
+            'rent_id': rent_id,
+            'effective_date': effective.isoformat(),
+            'monthly_rent': amount
+        }
@@ -1,14 +1,540 @@
 # src/services/rent_roll.py
-from ..models import Property, Unit, Occupancy
+from ..models import Property, Unit, Occupancy, Resident, Rent, UnitStatus
 from .. import db
-from datetime import timedelta, date
+from .timelines import Timeline, status_timelines
+from sqlalchemy import select, or_
+from flask import current_app
+from array import array
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from datetime import timedelta
+from functools import partial
+from itertools import islice
+import calendar
+import os
+import pickle
 
+# 'sweep' bulk-loads the property once; 'legacy' is the original per-unit, per-day query path,
+# kept selectable so the two can be compared.
+RENT_ROLL_ENGINES = ('sweep', 'legacy')
 
-def generate_rent_roll(property_id, start_date, end_date):
+# Pool types iter_portfolio_rent_roll can fan per-property work out to
+PORTFOLIO_EXECUTORS = ('thread', 'process')
+
+
+def generate_rent_roll(property_id, start_date, end_date, engine='sweep', stream=False):
     """
     Generates the daily rent roll report for a given property and date range.
     Returns a list of dicts with keys: date, property_id, unit_id, unit_number,
     resident_id, resident_name, monthly_rent, unit_status
+
+    With stream=True a generator yielding the same dicts in the same order is returned
+    instead, so callers can write rows out as they are produced.
+    """
+    if engine == 'legacy':
+        rows = _generate_rent_roll_legacy(property_id, start_date, end_date)
+        return iter(rows) if stream else rows
+    if engine != 'sweep':
+        raise ValueError(f"Unknown rent roll engine '{engine}'. Use one of: {', '.join(RENT_ROLL_ENGINES)}")
+    rows = _iter_rent_roll_sweep(property_id, start_date, end_date)
+    return rows if stream else list(rows)
+
+
+def load_unit_spans(property_id, start_date, end_date, use_facts=None):
+    """
+    Bulk-loads units, status history, occupancies, residents and rents for a property
+    and collapses them into per-unit spans over [start_date, end_date].
+
+    Returns None if the property does not exist, otherwise a list of
+    (unit_id, unit_number, spans) ordered by unit id. Each unit's spans are contiguous,
+    cover the whole range and are tuples of
+    (span_start, span_end, unit_status, resident_id, resident_name, monthly_rent),
+    with both ends inclusive and adjacent spans always differing in value.
+
+    When the property's rows in the precomputed fact table are fresh (see services.facts)
+    the spans are read from there instead; use_facts=False forces the live computation.
+    """
+    if db.session.get(Property, property_id) is None:
+        return None
+    if use_facts is None:
+        use_facts = current_app.config.get('USE_FACT_TABLE', True)
+    if use_facts:
+        from .facts import load_fact_spans
+        spans = load_fact_spans(property_id, start_date, end_date)
+        if spans is not None:
+            return spans
+    return compute_unit_spans(Unit.property_id == property_id, start_date, end_date)
+
+
+def compute_unit_spans(unit_condition, start_date, end_date):
+    """
+    Computes load_unit_spans() output from the source tables for the units matching
+    unit_condition (e.g. Unit.property_id == 1 or Unit.id.in_([...])).
+    """
+    units = db.session.execute(
+        select(Unit.id, Unit.unit_number)
+        .where(unit_condition)
+        .order_by(Unit.id)
+    ).all()
+    if not units:
+        return []
+
+    statuses_by_unit = {}
+    for unit_id, start, status in db.session.execute(
+        select(UnitStatus.unit_id, UnitStatus.start_date, UnitStatus.status)
+        .join(Unit, Unit.id == UnitStatus.unit_id)
+        .where(unit_condition, UnitStatus.start_date <= end_date)
+        .order_by(UnitStatus.unit_id, UnitStatus.start_date, UnitStatus.id)
+    ):
+        statuses_by_unit.setdefault(unit_id, []).append((start, status))
+
+    occupancy_window = (
+        unit_condition,
+        Occupancy.move_in_date <= end_date,
+        or_(Occupancy.move_out_date == None, Occupancy.move_out_date > start_date),
+    )
+    occupancies_by_unit = {}
+    for occ_id, unit_id, resident_id, move_in, move_out, first, last in db.session.execute(
+        select(Occupancy.id, Occupancy.unit_id, Occupancy.resident_id,
+               Occupancy.move_in_date, Occupancy.move_out_date,
+               Resident.first_name, Resident.last_name)
+        .join(Unit, Unit.id == Occupancy.unit_id)
+        .outerjoin(Resident, Resident.id == Occupancy.resident_id)
+        .where(*occupancy_window)
+        .order_by(Occupancy.id)
+    ):
+        resident_name = f"{first} {last}" if first is not None else None
+        occupancies_by_unit.setdefault(unit_id, []).append(
+            (occ_id, resident_id, resident_name, move_in, move_out))
+
+    rents_by_occupancy = {}
+    for occ_id, effective, amount in db.session.execute(
+        select(Rent.occupancy_id, Rent.effective_date, Rent.amount)
+        .join(Occupancy, Occupancy.id == Rent.occupancy_id)
+        .join(Unit, Unit.id == Occupancy.unit_id)
+        .where(*occupancy_window, Rent.effective_date <= end_date)
+        .order_by(Rent.occupancy_id, Rent.effective_date, Rent.id)
+    ):
+        if occ_id not in rents_by_occupancy:
+            rents_by_occupancy[occ_id] = Timeline(default=0)
+        rents_by_occupancy[occ_id].append(effective, amount)
+
+    return [
+        (unit_id, unit_number, _build_unit_spans(
+            start_date, end_date,
+            statuses_by_unit.get(unit_id, []),
+            occupancies_by_unit.get(unit_id, []),
+            rents_by_occupancy,
+        ))
+        for unit_id, unit_number in units
+    ]
+
+
+# Rent timeline of an occupancy without rent records
+_NO_RENTS = Timeline(default=0)
+
+
+def _build_unit_spans(start_date, end_date, statuses, occupancies, rents_by_occupancy):
+    """Sweeps one unit's sorted change points and returns its spans (see load_unit_spans)."""
+    change_points = {start_date}
+    for status_start, _ in statuses:
+        if start_date < status_start <= end_date:
+            change_points.add(status_start)
+    for occ_id, _, _, move_in, move_out in occupancies:
+        for point in (move_in, move_out):
+            if point and start_date < point <= end_date:
+                change_points.add(point)
+        for effective in rents_by_occupancy.get(occ_id, _NO_RENTS).starts:
+            if start_date < effective <= end_date:
+                change_points.add(effective)
+    change_points = sorted(change_points)
+
+    status_timeline = Timeline(statuses, default='active')
+    spans = []
+    for i, point in enumerate(change_points):
+        span_end = change_points[i + 1] - timedelta(days=1) if i + 1 < len(change_points) else end_date
+        # Status takes precedence: inactive units never report an occupant or rent
+        if status_timeline.value_on(point) == 'inactive':
+            value = ('inactive', None, None, 0)
+        else:
+            value = ('active', None, None, 0)
+            for occ_id, resident_id, resident_name, move_in, move_out in occupancies:
+                if move_in <= point and (move_out is None or move_out > point):
+                    rent_amount = rents_by_occupancy.get(occ_id, _NO_RENTS).value_on(point)
+                    value = ('active', resident_id, resident_name, rent_amount)
+                    break
+        if spans and spans[-1][2:] == value:
+            spans[-1] = (spans[-1][0], span_end) + value
+        else:
+            spans.append((point, span_end) + value)
+    return spans
+
+
+def _iter_rent_roll_sweep(property_id, start_date, end_date):
+    units = load_unit_spans(property_id, start_date, end_date)
+    if units:
+        yield from expand_unit_spans(property_id, units, start_date, end_date)
+
+
+def expand_unit_spans(property_id, units, start_date, end_date):
+    """Expands load_unit_spans() output into daily rent roll rows, ordered by date then unit."""
+    composed = [(unit_id, f"P{property_id}-U{unit_number}", spans) for unit_id, unit_number, spans in units]
+    cursors = [0] * len(composed)
+    current_date = start_date
+    while current_date <= end_date:
+        day = current_date.isoformat()
+        for i, (unit_id, composed_unit_number, spans) in enumerate(composed):
+            span = spans[cursors[i]]
+            if span[1] < current_date:
+                cursors[i] += 1
+                span = spans[cursors[i]]
+            yield {
+                "date": day,
+                "property_id": property_id,
+                "unit_id": unit_id,
+                "unit_number": composed_unit_number,
+                "resident_id": span[3],
+                "resident_name": span[4],
+                "monthly_rent": span[5],
+                "unit_status": span[2]
+            }
+        current_date += timedelta(days=1)
+
+
+def iter_rent_roll_spans(property_id, start_date, end_date):
+    """
+    Yields the rent roll of a property run-length encoded: one dict per unit per stretch of
+    days with the same resident, rent and status, ordered by unit then start_date. Keys are
+    those of the daily rows with date replaced by start_date and end_date (both inclusive).
+    """
+    units = load_unit_spans(property_id, start_date, end_date)
+    if units:
+        yield from span_records(property_id, units)
+
+
+def iter_portfolio_rent_roll_spans(property_ids, start_date, end_date, workers=None, executor='thread'):
+    """iter_rent_roll_spans for several properties, loaded as by iter_portfolio_unit_spans."""
+    for property_id, units in iter_portfolio_unit_spans(property_ids, start_date, end_date, workers, executor):
+        yield from span_records(property_id, units)
+
+
+def span_records(property_id, units):
+    """Turns load_unit_spans() output into the records of iter_rent_roll_spans."""
+    for unit_id, unit_number, spans in units:
+        composed_unit_number = f"P{property_id}-U{unit_number}"
+        for span_start, span_end, status, resident_id, resident_name, rent in spans:
+            yield {
+                "start_date": span_start.isoformat(),
+                "end_date": span_end.isoformat(),
+                "property_id": property_id,
+                "unit_id": unit_id,
+                "unit_number": composed_unit_number,
+                "resident_id": resident_id,
+                "resident_name": resident_name,
+                "monthly_rent": rent,
+                "unit_status": status
+            }
+
+
+# Codes of the unit_status column of RentRollColumns
+UNIT_STATUSES = ('active', 'inactive')
+
+
+class RentRollColumns:
+    """
+    A rent roll held as parallel typed arrays with one entry per row, in the same order as
+    the row output (property, then date, then unit). Units and residents are
+    dictionary-encoded: the unit column indexes `units` ((property_id, unit_id,
+    unit_number) tuples, unit_number composed as in the rows) and the resident column
+    indexes `residents` ((resident_id, resident_name) tuples), -1 meaning no resident. The
+    day column holds the offset from start_date and unit_status indexes UNIT_STATUSES.
+
+    The columns are filled straight from the per-unit spans, so no row dicts are created
+    unless rows() is called.
+    """
+
+    def __init__(self, start_date, end_date):
+        self.start_date = start_date
+        self.end_date = end_date
+        self.units = []
+        self.residents = []
+        self._resident_index = {}
+        self.day = array('i')
+        self.unit = array('i')
+        self.resident = array('i')
+        self.monthly_rent = array('q')
+        self.unit_status = array('b')
+
+    def __len__(self):
+        return len(self.day)
+
+    def add_property(self, property_id, units):
+        """Appends the rows of one property, given its load_unit_spans() output."""
+        if not units:
+            return
+        days = (self.end_date - self.start_date).days + 1
+        width = len(units)
+        first_unit = len(self.units)
+        size = days * width
+        residents = array('i', [0]) * size
+        rents = array('q', [0]) * size
+        statuses = array('b', [0]) * size
+        for offset, (unit_id, unit_number, spans) in enumerate(units):
+            self.units.append((property_id, unit_id, f"P{property_id}-U{unit_number}"))
+            unit_residents, unit_rents, unit_statuses = array('i'), array('q'), array('b')
+            for span_start, span_end, status, resident_id, resident_name, rent in spans:
+                length = (span_end - span_start).days + 1
+                unit_residents.extend(array('i', [self._resident_code(resident_id, resident_name)]) * length)
+                unit_rents.extend(array('q', [rent]) * length)
+                unit_statuses.extend(array('b', [UNIT_STATUSES.index(status)]) * length)
+            # Rows are date-major, so each unit's values land in every width-th slot
+            residents[offset::width] = unit_residents
+            rents[offset::width] = unit_rents
+            statuses[offset::width] = unit_statuses
+        for day in range(days):
+            self.day.extend(array('i', [day]) * width)
+        self.unit.extend(array('i', range(first_unit, first_unit + width)) * days)
+        self.resident.extend(residents)
+        self.monthly_rent.extend(rents)
+        self.unit_status.extend(statuses)
+
+    def rows(self):
+        """Yields the rows in the legacy dict format of generate_rent_roll."""
+        dates = {}
+        for day, unit, resident, rent, status in zip(
+                self.day, self.unit, self.resident, self.monthly_rent, self.unit_status):
+            if day not in dates:
+                dates[day] = (self.start_date + timedelta(days=day)).isoformat()
+            property_id, unit_id, unit_number = self.units[unit]
+            resident_id, resident_name = self.residents[resident] if resident >= 0 else (None, None)
+            yield {
+                "date": dates[day],
+                "property_id": property_id,
+                "unit_id": unit_id,
+                "unit_number": unit_number,
+                "resident_id": resident_id,
+                "resident_name": resident_name,
+                "monthly_rent": rent,
+                "unit_status": UNIT_STATUSES[status]
+            }
+
+    def to_dict(self):
+        """The JSON-serialisable columnar form served by format=columnar."""
+        return {
+            "start_date": self.start_date.isoformat(),
+            "end_date": self.end_date.isoformat(),
+            "row_count": len(self),
+            "units": {
+                "property_id": [property_id for property_id, _, _ in self.units],
+                "unit_id": [unit_id for _, unit_id, _ in self.units],
+                "unit_number": [unit_number for _, _, unit_number in self.units],
+            },
+            "residents": {
+                "resident_id": [resident_id for resident_id, _ in self.residents],
+                "resident_name": [resident_name for _, resident_name in self.residents],
+            },
+            "unit_statuses": list(UNIT_STATUSES),
+            "columns": {
+                "day": self.day.tolist(),
+                "unit": self.unit.tolist(),
+                "resident": self.resident.tolist(),
+                "monthly_rent": self.monthly_rent.tolist(),
+                "unit_status": self.unit_status.tolist(),
+            },
+        }
+
+    def _resident_code(self, resident_id, resident_name):
+        if resident_id is None:
+            return -1
+        key = (resident_id, resident_name)
+        code = self._resident_index.get(key)
+        if code is None:
+            code = self._resident_index[key] = len(self.residents)
+            self.residents.append(key)
+        return code
+
+
+def rent_roll_columns(property_id, start_date, end_date):
+    """The rent roll of one property as RentRollColumns (empty if the property does not exist)."""
+    columns = RentRollColumns(start_date, end_date)
+    columns.add_property(property_id, load_unit_spans(property_id, start_date, end_date))
+    return columns
+
+
+def portfolio_rent_roll_columns(property_ids, start_date, end_date, workers=None, executor='thread'):
+    """The rent rolls of several properties as one RentRollColumns, loaded as by iter_portfolio_unit_spans."""
+    columns = RentRollColumns(start_date, end_date)
+    for property_id, units in iter_portfolio_unit_spans(property_ids, start_date, end_date, workers, executor):
+        columns.add_property(property_id, units)
+    return columns
+
+
+# Dimensions a rent roll summary can be grouped by, and the fields each contributes to a group
+RENT_ROLL_GROUPINGS = ('unit', 'month', 'resident', 'property')
+_GROUP_FIELDS = {
+    'unit': ('property_id', 'unit_id', 'unit_number'),
+    'month': ('month',),
+    'resident': ('resident_id', 'resident_name'),
+    'property': ('property_id',),
+}
+
+
+def rent_roll_summary(property_id, start_date, end_date, group_by):
+    """summarize_unit_spans() for one property (empty if it does not exist)."""
+    units = load_unit_spans(property_id, start_date, end_date)
+    return summarize_unit_spans([(property_id, units)] if units else [], group_by)
+
+
+def portfolio_rent_roll_summary(property_ids, start_date, end_date, group_by, workers=None, executor='thread'):
+    """summarize_unit_spans() over several properties, loaded as by iter_portfolio_unit_spans."""
+    return summarize_unit_spans(
+        iter_portfolio_unit_spans(property_ids, start_date, end_date, workers, executor), group_by)
+
+
+def summarize_unit_spans(units_by_property, group_by):
+    """
+    Aggregates (property_id, load_unit_spans() output) pairs into one dict per group of the
+    dimensions in group_by (a sequence of RENT_ROLL_GROUPINGS), in order of first appearance.
+    Each dict holds the group's fields (month as YYYY-MM; vacant and inactive days fall in the
+    resident_id None group) plus occupied_days, vacant_days, inactive_days, average_rent (the
+    monthly rent averaged over the occupied days, None without any) and prorated_rent (the
+    rent due for the occupied days, each day costing monthly_rent / days in its month).
+
+    Works on whole spans, split only at month boundaries, rather than on daily rows.
+    """
+    group_by = tuple(group_by)
+    if not group_by or len(set(group_by)) != len(group_by) or not set(group_by) <= set(RENT_ROLL_GROUPINGS):
+        raise ValueError(f"group_by must be distinct values out of: {', '.join(RENT_ROLL_GROUPINGS)}")
+    fields = tuple(dict.fromkeys(field for dimension in group_by for field in _GROUP_FIELDS[dimension]))
+    # Per group: occupied days, vacant days, inactive days, rent x occupied days, prorated rent
+    groups = {}
+    for property_id, units in units_by_property:
+        for unit_id, unit_number, spans in units:
+            values = {'property_id': property_id, 'unit_id': unit_id, 'unit_number': f"P{property_id}-U{unit_number}"}
+            for span_start, span_end, status, resident_id, resident_name, rent in spans:
+                values['resident_id'], values['resident_name'] = resident_id, resident_name
+                for piece_start, piece_end, days_in_month in _month_pieces(span_start, span_end):
+                    values['month'] = piece_start.strftime('%Y-%m')
+                    key = tuple(values[field] for field in fields)
+                    totals = groups.get(key)
+                    if totals is None:
+                        totals = groups[key] = [0, 0, 0, 0, 0.0]
+                    days = (piece_end - piece_start).days + 1
+                    if status == 'inactive':
+                        totals[2] += days
+                    elif resident_id is None:
+                        totals[1] += days
+                    else:
+                        totals[0] += days
+                        totals[3] += rent * days
+                        totals[4] += rent * days / days_in_month
+    return [
+        {
+            **dict(zip(fields, key)),
+            'occupied_days': occupied,
+            'vacant_days': vacant,
+            'inactive_days': inactive,
+            'average_rent': round(rent_days / occupied, 2) if occupied else None,
+            'prorated_rent': round(prorated, 2),
+        }
+        for key, (occupied, vacant, inactive, rent_days, prorated) in groups.items()
+    ]
+
+
+def _month_pieces(start, end):
+    """Splits [start, end] at month boundaries into (piece_start, piece_end, days_in_month) tuples."""
+    while start <= end:
+        days_in_month = calendar.monthrange(start.year, start.month)[1]
+        month_end = start.replace(day=days_in_month)
+        yield start, min(end, month_end), days_in_month
+        start = month_end + timedelta(days=1)
+
+
+def iter_portfolio_rent_roll(property_ids, start_date, end_date, workers=None, executor='thread'):
+    """
+    Yields the rent roll rows of several properties as one stream, ordered by the position
+    of each property in property_ids (then date, then unit, as for a single property).
+    The properties are loaded by iter_portfolio_unit_spans and expanded here.
+    """
+    for property_id, units in iter_portfolio_unit_spans(property_ids, start_date, end_date, workers, executor):
+        yield from expand_unit_spans(property_id, units, start_date, end_date)
+
+
+def iter_portfolio_unit_spans(property_ids, start_date, end_date, workers=None, executor='thread'):
+    """
+    Yields (property_id, load_unit_spans() output) for every property in property_ids that
+    exists and has units, in the order given.
+
+    The bulk loading of each property is fanned out over a thread or process pool; every
+    worker runs in its own app context and so uses its own database session and
+    connection. Workers return the compact per-unit spans, and only a bounded window of
+    properties is held in memory at a time. Must be called inside an app context.
+    """
+    if executor not in PORTFOLIO_EXECUTORS:
+        raise ValueError(f"Unknown executor '{executor}'. Use one of: {', '.join(PORTFOLIO_EXECUTORS)}")
+    app = current_app._get_current_object()
+    workers = workers or app.config.get('PORTFOLIO_WORKERS') or os.cpu_count() or 1
+    if executor == 'process':
+        pool = ProcessPoolExecutor(max_workers=workers, initializer=_init_process_worker,
+                                   initargs=(_worker_settings(app),))
+        task = _load_unit_spans_in_process
+    else:
+        pool = ThreadPoolExecutor(max_workers=workers)
+        task = partial(_load_unit_spans_in_app, app)
+
+    with pool:
+        remaining = iter(property_ids)
+        pending = deque()
+        # Keep every worker busy while never running more than two properties ahead of the consumer
+        for property_id in islice(remaining, workers * 2):
+            pending.append((property_id, pool.submit(task, property_id, start_date, end_date)))
+        while pending:
+            property_id, future = pending.popleft()
+            for next_id in islice(remaining, 1):
+                pending.append((next_id, pool.submit(task, next_id, start_date, end_date)))
+            units = future.result()
+            if units:
+                yield property_id, units
+
+
+def _load_unit_spans_in_app(app, property_id, start_date, end_date):
+    with app.app_context():
+        return load_unit_spans(property_id, start_date, end_date)
+
+
+# Per-process app used by process-pool workers, created once by _init_process_worker
+_worker_app = None
+
+
+def _worker_settings(app):
+    """
+    Every picklable app config item, so worker processes read the same database with the
+    same settings (USE_FACT_TABLE and the rest) as the parent and as thread-pool workers.
+    """
+    settings = {}
+    for key, value in app.config.items():
+        try:
+            pickle.dumps(value)
+        except Exception:
+            continue
+        settings[key] = value
+    return settings
+
+
+def _init_process_worker(settings):
+    global _worker_app
+    from .. import create_app
+    _worker_app = create_app(config_class=type('PortfolioWorkerConfig', (), settings))
+
+
+def _load_unit_spans_in_process(property_id, start_date, end_date):
+    return _load_unit_spans_in_app(_worker_app, property_id, start_date, end_date)
+
+
+def _generate_rent_roll_legacy(property_id, start_date, end_date):
+    """
+    Original implementation: queries the occupancy per unit per day. Status and rent come
+    from the model methods, which answer from the request's timelines (services.timelines).
     """
     rent_roll_report = []
     prop = db.session.get(Property, property_id)
@@ -16,6 +542,8 @@ def generate_rent_roll(property_id, start_date, end_date):
         return []
 
     all_units = prop.units.all()
+    # One status query for the whole property rather than one per unit
+    status_timelines([unit.id for unit in all_units])
 
     current_date = start_date
     while current_date <= end_date:
@@ -38,7 +566,7 @@ def generate_rent_roll(property_id, start_date, end_date):
             occ = unit.occupancies.filter(
                 Occupancy.move_in_date <= current_date,
                 (Occupancy.move_out_date == None) | (Occupancy.move_out_date > current_date)
-            ).first()
+            ).order_by(Occupancy.id).first()
             if occ:
                 resident = occ.resident
                 # Only emit one record per day per occupancy: latest rent as of that day
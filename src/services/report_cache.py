@@ -0,0 +1,219 @@
+# src/services/report_cache.py
+"""
+Cache of encoded report responses (rent rolls and KPIs).
+
+Entries are keyed on (database identity, report, property ids, parameters) and stored
+together with the data versions of those properties (see data_versions). A lookup only
+hits when the versions still match, so a write to any of the properties makes its cached
+reports unreachable without having to enumerate them; stale entries are dropped when next
+looked up or evicted as the least recently used. The identity keeps apps on different
+databases, or on a rebuilt one, from serving each other's entries.
+
+Two backends share the same interface: ReportCache keeps entries in the process, and
+SQLiteReportCache keeps them in a local SQLite file that every worker process on the host
+reads and writes, so a report computed by one worker is served by all of them.
+"""
+from collections import OrderedDict
+from threading import Lock
+import hashlib
+import json
+import sqlite3
+import time
+
+
+class ReportCache:
+    """
+    Thread-safe in-process LRU of report bodies, bounded both by entry count and by the
+    total size of the stored bodies. Bodies larger than max_entry_bytes are never stored.
+    """
+
+    def __init__(self, max_entries=256, max_bytes=64 * 1024 * 1024, max_entry_bytes=8 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.max_entry_bytes = min(max_entry_bytes, max_bytes)
+        self._entries = OrderedDict()
+        self._size = 0
+        self._lock = Lock()
+        self.hits = self.misses = self.evictions = 0
+
+    def get(self, key, version):
+        """Returns the (mimetype, body) stored for key at version, or None."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] != version:
+                if entry is not None:
+                    self._drop(key)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1], entry[2]
+
+    def set(self, key, version, mimetype, body):
+        if len(body) > self.max_entry_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._drop(key)
+            self._entries[key] = (version, mimetype, body)
+            self._size += len(body)
+            while len(self._entries) > self.max_entries or self._size > self.max_bytes:
+                self._drop(next(iter(self._entries)))
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+
+    def stats(self):
+        with self._lock:
+            return {'entries': len(self._entries), 'bytes': self._size,
+                    'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions}
+
+    def _drop(self, key):
+        _, _, body = self._entries.pop(key)
+        self._size -= len(body)
+
+
+class SQLiteReportCache:
+    """
+    Report cache shared by every process on the host through a SQLite file. Entries expire
+    ttl seconds after they were stored (0 keeps them until evicted) and the least recently
+    used ones are evicted once the file holds more than max_entries entries or max_bytes of
+    bodies. Errors from the store (e.g. a lock held too long by another worker) are treated
+    as misses so a report is recomputed rather than failed.
+    """
+
+    def __init__(self, path, max_entries=256, max_bytes=64 * 1024 * 1024, max_entry_bytes=8 * 1024 * 1024,
+                 ttl=3600, timeout=5.0):
+        self.path = path
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.max_entry_bytes = min(max_entry_bytes, max_bytes)
+        self.ttl = ttl
+        self.timeout = timeout
+        self.hits = self.misses = self.evictions = 0
+        with self._connect() as conn:
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS report_cache ('
+                ' key TEXT PRIMARY KEY, version TEXT NOT NULL, mimetype TEXT NOT NULL, body BLOB NOT NULL,'
+                ' size INTEGER NOT NULL, stored_at REAL NOT NULL, used_at REAL NOT NULL)'
+            )
+            conn.execute('CREATE INDEX IF NOT EXISTS ix_report_cache_used_at ON report_cache (used_at)')
+
+    def get(self, key, version):
+        key, version = _encode_key(key), json.dumps(version)
+        now = time.time()
+        try:
+            with self._connect() as conn:
+                row = conn.execute(
+                    'SELECT version, mimetype, body, stored_at FROM report_cache WHERE key = ?', (key,)).fetchone()
+                if row is None or row[0] != version or self._expired(row[3], now):
+                    if row is not None:
+                        conn.execute('DELETE FROM report_cache WHERE key = ?', (key,))
+                    self.misses += 1
+                    return None
+                conn.execute('UPDATE report_cache SET used_at = ? WHERE key = ?', (now, key))
+        except sqlite3.Error:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return row[1], bytes(row[2])
+
+    def set(self, key, version, mimetype, body):
+        if len(body) > self.max_entry_bytes:
+            return
+        now = time.time()
+        try:
+            with self._connect() as conn:
+                conn.execute(
+                    'INSERT OR REPLACE INTO report_cache (key, version, mimetype, body, size, stored_at, used_at)'
+                    ' VALUES (?, ?, ?, ?, ?, ?, ?)',
+                    (_encode_key(key), json.dumps(version), mimetype, body, len(body), now, now))
+                self._evict(conn, now)
+        except sqlite3.Error:
+            pass
+
+    def clear(self):
+        with self._connect() as conn:
+            conn.execute('DELETE FROM report_cache')
+
+    def stats(self):
+        with self._connect() as conn:
+            entries, size = conn.execute('SELECT COUNT(*), COALESCE(SUM(size), 0) FROM report_cache').fetchone()
+        return {'entries': entries, 'bytes': size,
+                'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions}
+
+    def _connect(self):
+        # One short-lived connection per call: safe across threads and forked workers
+        return _closing_connection(sqlite3.connect(self.path, timeout=self.timeout))
+
+    def _expired(self, stored_at, now):
+        return self.ttl > 0 and stored_at + self.ttl <= now
+
+    def _evict(self, conn, now):
+        if self.ttl > 0:
+            self.evictions += conn.execute('DELETE FROM report_cache WHERE stored_at <= ?', (now - self.ttl,)).rowcount
+        entries, size = conn.execute('SELECT COUNT(*), COALESCE(SUM(size), 0) FROM report_cache').fetchone()
+        if entries <= self.max_entries and size <= self.max_bytes:
+            return
+        doomed = []
+        for key, entry_size in conn.execute('SELECT key, size FROM report_cache ORDER BY used_at'):
+            if entries <= self.max_entries and size <= self.max_bytes:
+                break
+            doomed.append((key,))
+            entries -= 1
+            size -= entry_size
+        conn.executemany('DELETE FROM report_cache WHERE key = ?', doomed)
+        self.evictions += len(doomed)
+
+
+class _closing_connection:
+    """sqlite3 connection context that commits (or rolls back) and then closes."""
+
+    def __init__(self, conn):
+        self.conn = conn
+
+    def __enter__(self):
+        return self.conn
+
+    def __exit__(self, exc_type, exc, tb):
+        try:
+            if exc_type is None:
+                self.conn.commit()
+            else:
+                self.conn.rollback()
+        finally:
+            self.conn.close()
+
+
+def _encode_key(key):
+    return hashlib.sha256(repr(key).encode()).hexdigest()
+
+
+REPORT_CACHE_BACKENDS = ('memory', 'sqlite')
+
+
+def init_report_cache(app):
+    """
+    Creates the app's report cache from its config: REPORT_CACHE_BACKEND picks the
+    backend and REPORT_CACHE_MAX_ENTRIES=0 disables caching.
+    """
+    max_entries = app.config.get('REPORT_CACHE_MAX_ENTRIES', 0)
+    backend = app.config.get('REPORT_CACHE_BACKEND', 'memory')
+    if backend not in REPORT_CACHE_BACKENDS:
+        raise ValueError(f"Unknown REPORT_CACHE_BACKEND '{backend}'. Use one of: {', '.join(REPORT_CACHE_BACKENDS)}")
+    limits = {
+        'max_entries': max_entries,
+        'max_bytes': app.config.get('REPORT_CACHE_MAX_BYTES', 64 * 1024 * 1024),
+        'max_entry_bytes': app.config.get('REPORT_CACHE_MAX_ENTRY_BYTES', 8 * 1024 * 1024),
+    }
+    if max_entries <= 0:
+        cache = None
+    elif backend == 'sqlite':
+        cache = SQLiteReportCache(app.config['REPORT_CACHE_PATH'], ttl=app.config.get('REPORT_CACHE_TTL', 3600), **limits)
+    else:
+        cache = ReportCache(**limits)
+    app.extensions['report_cache'] = cache
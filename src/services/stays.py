@@ -0,0 +1,32 @@
+# src/services/stays.py
+"""Overlap checks between occupancy stays, shared by the bulk and batch write paths."""
+from datetime import date
+
+
+def stays_overlap(first, second):
+    """True if two [move_in, move_out) stays (move_out None = open-ended) share a day."""
+    return first[0] < (second[1] or date.max) and second[0] < (first[1] or date.max)
+
+
+def overlapping_items(stays_by_owner):
+    """
+    stays_by_owner maps an owner (a unit or a resident) to its (move_in, move_out, item)
+    stays, where item is None for stays that already exist and an identifier (e.g. a row
+    or batch index, 0 or more) for new ones. Sweeps each owner's stays in move-in order
+    and returns the new items that overlap another stay: the later one when two new stays
+    overlap, the new one when a new and an existing stay do.
+    """
+    blamed = set()
+    for stays in stays_by_owner.values():
+        if len(stays) < 2:
+            continue
+        stays = sorted(stays, key=lambda stay: (stay[0], -1 if stay[2] is None else stay[2]))
+        latest = stays[0]
+        for stay in stays[1:]:
+            if stays_overlap(latest, stay):
+                item = stay[2] if stay[2] is not None else latest[2]
+                if item is not None:
+                    blamed.add(item)
+            if (stay[1] or date.max) > (latest[1] or date.max):
+                latest = stay
+    return blamed
@@ -0,0 +1,172 @@
+# src/services/synthetic.py
+"""
+Deterministic synthetic portfolios for benchmarks and load tests.
+
+generate_portfolio() draws properties, units, residents, stays, rent changes and unit
+status toggles from a seeded random generator, so the same arguments always produce the
+same data, and writes them with bulk inserts. delete_properties() removes them (or any
+other properties) again. The data follows the rules the write
+endpoints enforce: stays of a unit never overlap, never start on an inactive day, and
+every stay has an initial rent on its move-in date.
+"""
+from ..models import (Property, Unit, Resident, Occupancy, Rent, UnitStatus, RentRollFact, RentRollFactState,
+                      PropertyDataVersion)
+from .. import db
+from .facts import refresh_after_bulk_write
+from sqlalchemy import select, insert, delete, func
+from datetime import date, timedelta
+import random
+
+FIRST_NAMES = ('Ada', 'Ben', 'Cleo', 'Dev', 'Eli', 'Fay', 'Gus', 'Hana', 'Ivo', 'Jun', 'Kai', 'Lea',
+               'Max', 'Nia', 'Oti', 'Pia', 'Quin', 'Rui', 'Sol', 'Tea', 'Uma', 'Vic', 'Wes', 'Zoe')
+
+
+def generate_portfolio(properties=10, units_per_property=50, years=3, start_date=date(2022, 1, 1),
+                       rent_changes_per_year=1, status_toggles_per_year=0.1, occupancy_rate=0.9,
+                       seed=0, name_prefix='Synthetic', build_facts=True):
+    """
+    Inserts `properties` new properties of `units_per_property` units each, with `years`
+    of history from start_date: stays separated by short turnover gaps, with a longer
+    vacancy instead of the next stay with probability 1 - occupancy_rate. Each stay has its
+    own resident, an initial rent and rent_changes_per_year increases per year of stay, and
+    units get status_toggles_per_year inactive stretches per year on average. Stays still
+    running at the end of the period are left open. Properties are named
+    "<name_prefix> <n>", numbered after any existing ones with that prefix.
+
+    Returns the number of rows inserted per table. Does not commit. Raises ValueError
+    unless properties, units_per_property and years are all at least 1.
+    """
+    for name, value in (('properties', properties), ('units_per_property', units_per_property), ('years', years)):
+        if value < 1:
+            raise ValueError(f'{name} must be at least 1')
+    rng = random.Random(seed)
+    end_date = start_date + timedelta(days=round(365.25 * years))
+    first_number = db.session.execute(
+        select(func.count()).select_from(Property).where(Property.name.like(f'{name_prefix} %'))).scalar()
+
+    property_ids = _insert_returning(Property, [
+        {'name': f'{name_prefix} {first_number + n + 1}'} for n in range(properties)])
+    unit_ids = _insert_returning(Unit, [
+        {'property_id': property_id, 'unit_number': str(number)}
+        for property_id in property_ids for number in range(1, units_per_property + 1)
+    ])
+
+    statuses, stays = [], []
+    for unit_id in unit_ids:
+        inactive = _inactive_windows(rng, start_date, end_date, status_toggles_per_year)
+        for window_start, window_end in inactive:
+            statuses.append({'unit_id': unit_id, 'status': 'inactive', 'start_date': window_start})
+            statuses.append({'unit_id': unit_id, 'status': 'active', 'start_date': window_end})
+        stays.extend((unit_id,) + stay for stay in _unit_stays(rng, start_date, end_date, inactive, occupancy_rate))
+
+    resident_ids = _insert_returning(Resident, [
+        {'first_name': FIRST_NAMES[n % len(FIRST_NAMES)], 'last_name': name_prefix + _letters(n)}
+        for n in range(len(stays))
+    ])
+    occupancy_ids = _insert_returning(Occupancy, [
+        {'unit_id': unit_id, 'resident_id': resident_id, 'move_in_date': move_in, 'move_out_date': move_out}
+        for (unit_id, move_in, move_out), resident_id in zip(stays, resident_ids)
+    ])
+    rents = []
+    for occupancy_id, (_, move_in, move_out) in zip(occupancy_ids, stays):
+        amount = rng.randrange(800, 2500, 25)
+        rents.append({'occupancy_id': occupancy_id, 'amount': amount, 'effective_date': move_in})
+        if rent_changes_per_year <= 0:
+            continue
+        step = timedelta(days=round(365.25 / rent_changes_per_year))
+        effective = move_in + step
+        while effective < (move_out or end_date):
+            amount = round(amount * rng.uniform(1.01, 1.05))
+            rents.append({'occupancy_id': occupancy_id, 'amount': amount, 'effective_date': effective})
+            effective += step
+    if statuses:
+        db.session.execute(insert(UnitStatus), statuses)
+    if rents:
+        db.session.execute(insert(Rent), rents)
+
+    refresh_after_bulk_write(property_ids, unit_ids, refresh_facts=build_facts)
+    return {'properties': len(property_ids), 'units': len(unit_ids), 'residents': len(resident_ids),
+            'occupancies': len(occupancy_ids), 'rents': len(rents), 'unit_statuses': len(statuses)}
+
+
+def delete_properties(property_ids):
+    """
+    Deletes the given properties with their units, unit statuses, stays, rents, facts and
+    data versions, and the residents who never stayed anywhere else. Does not commit.
+    """
+    property_ids = list(property_ids)
+    if not property_ids:
+        return
+    units = select(Unit.id).where(Unit.property_id.in_(property_ids))
+    occupancies = select(Occupancy.id).where(Occupancy.unit_id.in_(units))
+    elsewhere = select(Occupancy.resident_id).where(Occupancy.unit_id.not_in(units))
+    residents = (select(Occupancy.resident_id).where(Occupancy.unit_id.in_(units))
+                 .where(Occupancy.resident_id.not_in(elsewhere)))
+    resident_ids = db.session.execute(residents).scalars().all()
+    db.session.execute(delete(Rent).where(Rent.occupancy_id.in_(occupancies)))
+    db.session.execute(delete(Occupancy).where(Occupancy.unit_id.in_(units)))
+    for chunk in range(0, len(resident_ids), 500):
+        db.session.execute(delete(Resident).where(Resident.id.in_(resident_ids[chunk:chunk + 500])))
+    for model in (UnitStatus, RentRollFact, RentRollFactState):
+        db.session.execute(delete(model).where(model.unit_id.in_(units)))
+    db.session.execute(delete(Unit).where(Unit.property_id.in_(property_ids)))
+    db.session.execute(delete(PropertyDataVersion).where(PropertyDataVersion.property_id.in_(property_ids)))
+    db.session.execute(delete(Property).where(Property.id.in_(property_ids)))
+
+
+def _inactive_windows(rng, start_date, end_date, toggles_per_year):
+    """Sorted, non-overlapping (first inactive day, first active day again) pairs."""
+    days = (end_date - start_date).days
+    expected = days / 365.25 * toggles_per_year
+    count = int(expected) + (rng.random() < expected - int(expected))
+    windows = []
+    for offset in sorted(rng.sample(range(1, days), min(count, days - 1))):
+        window_start = start_date + timedelta(days=offset)
+        if windows and window_start <= windows[-1][1]:
+            continue
+        windows.append((window_start, window_start + timedelta(days=rng.randint(14, 90))))
+    return windows
+
+
+def _unit_stays(rng, start_date, end_date, inactive, occupancy_rate):
+    """(move_in, move_out or None) pairs that never overlap each other or an inactive window."""
+    stays = []
+    windows = iter(inactive)
+    window = next(windows, None)
+    cursor = start_date
+    while cursor < end_date:
+        while window and window[1] <= cursor:
+            window = next(windows, None)
+        if window and window[0] <= cursor:
+            cursor = window[1]
+            continue
+        if rng.random() >= occupancy_rate:
+            # Vacant gap before the next stay
+            cursor += timedelta(days=rng.randint(7, 120))
+            continue
+        move_out = cursor + timedelta(days=rng.randint(180, 1100))
+        if window and window[0] < move_out:
+            move_out = window[0]
+        stays.append((cursor, move_out if move_out < end_date else None))
+        if move_out >= end_date:
+            break
+        cursor = move_out + timedelta(days=rng.randint(0, 45))
+    return stays
+
+
+def _insert_returning(model, rows):
+    """executemany INSERT ... RETURNING id; returns the new ids in the order of rows."""
+    if not rows:
+        return []
+    return db.session.execute(
+        insert(model).returning(model.id, sort_by_parameter_order=True), rows).scalars().all()
+
+
+def _letters(n):
+    """n spelt in base 26 with letters (resident names may not contain digits)."""
+    letters = ''
+    while True:
+        n, digit = divmod(n, 26)
+        letters = chr(ord('a') + digit) + letters
+        if not n:
+            return letters
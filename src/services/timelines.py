@@ -0,0 +1,131 @@
+# src/services/timelines.py
+"""
+Point-in-time lookups over unit status and rent history.
+
+A Timeline keeps one unit's status changes (or one occupancy's rents) as sorted arrays of
+start dates and values, and answers "value as of date X" with a binary search.
+
+status_timelines() and rent_timelines() load the timelines of many units or occupancies
+with one query and keep them for the rest of the app context, which is one request in
+the web app. Repeated lookups such as Unit.get_status_on_date in a loop then query once
+per owner rather than once per call. A flush that writes status or rent rows drops the
+timelines of the owners it touches, and a rollback drops them all. Writes that bypass the
+ORM flush (Core inserts) clear them through facts.refresh_after_bulk_write().
+"""
+from ..models import Rent, UnitStatus
+from .. import db
+from .data_versions import _changed_objects, _current_and_previous
+from flask import g, has_app_context
+from sqlalchemy import select, event
+from sqlalchemy.orm import Session
+from bisect import bisect_right
+
+# Ids per IN (...) when loading timelines
+TIMELINE_CHUNK_SIZE = 500
+
+
+class Timeline:
+    """Values that each hold from their start date until the next one starts."""
+
+    __slots__ = ('starts', 'values', 'default')
+
+    def __init__(self, changes=(), default=None):
+        """changes are (start_date, value) pairs in order; of several on one date the last wins."""
+        self.starts = []
+        self.values = []
+        self.default = default
+        for start, value in changes:
+            self.append(start, value)
+
+    def append(self, start, value):
+        """Adds a change starting on or after every change already held."""
+        self.starts.append(start)
+        self.values.append(value)
+
+    def value_on(self, on_date):
+        """The value in effect on on_date, or the default before the first change."""
+        idx = bisect_right(self.starts, on_date)
+        return self.values[idx - 1] if idx else self.default
+
+    def __len__(self):
+        return len(self.starts)
+
+
+def status_timelines(unit_ids):
+    """{unit_id: Timeline of status} for the given units; units without history are 'active'."""
+    return _cached('status', unit_ids, _load_status_timelines)
+
+
+def rent_timelines(occupancy_ids):
+    """{occupancy_id: Timeline of monthly rent} for the given occupancies; 0 before the first rent."""
+    return _cached('rent', occupancy_ids, _load_rent_timelines)
+
+
+def clear_timelines():
+    if has_app_context():
+        g.pop('_timelines', None)
+
+
+def _load_status_timelines(unit_ids):
+    timelines = {unit_id: Timeline(default='active') for unit_id in unit_ids}
+    for chunk in _chunks(unit_ids):
+        for unit_id, start, status in db.session.execute(
+            select(UnitStatus.unit_id, UnitStatus.start_date, UnitStatus.status)
+            .where(UnitStatus.unit_id.in_(chunk))
+            .order_by(UnitStatus.unit_id, UnitStatus.start_date, UnitStatus.id)
+        ):
+            timelines[unit_id].append(start, status)
+    return timelines
+
+
+def _load_rent_timelines(occupancy_ids):
+    timelines = {occupancy_id: Timeline(default=0) for occupancy_id in occupancy_ids}
+    for chunk in _chunks(occupancy_ids):
+        for occupancy_id, effective, amount in db.session.execute(
+            select(Rent.occupancy_id, Rent.effective_date, Rent.amount)
+            .where(Rent.occupancy_id.in_(chunk))
+            .order_by(Rent.occupancy_id, Rent.effective_date, Rent.id)
+        ):
+            timelines[occupancy_id].append(effective, amount)
+    return timelines
+
+
+def _cached(kind, ids, load):
+    session = db.session()
+    if session.autoflush:
+        # Pending rows must be visible, as they were to the per-call queries
+        session.flush()
+    ids = set(ids)
+    if not has_app_context():
+        return load(ids)
+    cache = g.setdefault('_timelines', {})
+    missing = [owner_id for owner_id in ids if (kind, owner_id) not in cache]
+    if missing:
+        for owner_id, timeline in load(missing).items():
+            cache[(kind, owner_id)] = timeline
+    return {owner_id: cache[(kind, owner_id)] for owner_id in ids}
+
+
+def _chunks(ids):
+    ids = list(ids)
+    for i in range(0, len(ids), TIMELINE_CHUNK_SIZE):
+        yield ids[i:i + TIMELINE_CHUNK_SIZE]
+
+
+@event.listens_for(Session, 'after_flush')
+def _drop_touched_timelines(session, flush_context):
+    if not has_app_context() or '_timelines' not in g:
+        return
+    cache = g._timelines
+    for obj in _changed_objects(session):
+        if isinstance(obj, UnitStatus):
+            for unit_id in _current_and_previous(obj, 'unit_id'):
+                cache.pop(('status', unit_id), None)
+        elif isinstance(obj, Rent):
+            for occupancy_id in _current_and_previous(obj, 'occupancy_id'):
+                cache.pop(('rent', occupancy_id), None)
+
+
+@event.listens_for(Session, 'after_soft_rollback')
+def _drop_timelines_on_rollback(session, previous_transaction):
+    clear_timelines()
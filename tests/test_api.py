@@ -1,6 +1,6 @@
 # tests/test_api.py (Comprehensive Testing)
 import json
-from datetime import date
+from datetime import date, timedelta
 import pytest
 from src.models import Property, Unit, Resident, Occupancy, Rent, UnitStatus
 
@@ -353,4 +353,889 @@ def test_empty_and_whitespace_input_returns_400(client, db_session, endpoint, pa
         payload["property_id"] = 1
     resp = client.post(endpoint, json=payload)
     assert resp.status_code == 400
-    assert error_field.lower() in resp.json.get('error', '').lower()
\ No newline at end of file
+    assert error_field.lower() in resp.json.get('error', '').lower()
+
+def test_rent_roll_streaming_formats_match_json(client, db_session, monkeypatch):
+    """JSON, NDJSON and CSV rent rolls are streamed in chunks and carry the same rows."""
+    from src.routes import streaming
+    monkeypatch.setattr(streaming, 'STREAM_CHUNK_ROWS', 3)
+    p, u, r = _create_prop_unit_res(client, prop_name="StreamProp", unit_number="1", first="S", last="T")
+    client.post('/units', json={"property_id": p['id'], "unit_number": "2"})
+    client.post('/occupancy/move-in', json={
+        "resident_id": r['id'], "unit_id": u['id'], "move_in_date": "2024-03-02", "initial_rent": 700
+    })
+    base = f"/reports/rent-roll?property_id={p['id']}&start_date=2024-03-01&end_date=2024-03-04"
+
+    rows = client.get(base).json
+    assert len(rows) == 8
+
+    nd = client.get(base + "&format=ndjson")
+    assert nd.status_code == 200
+    assert nd.mimetype == 'application/x-ndjson'
+    assert [json.loads(line) for line in nd.get_data(as_text=True).splitlines()] == rows
+
+    csv_resp = client.get(base + "&format=csv")
+    assert csv_resp.status_code == 200
+    lines = csv_resp.get_data(as_text=True).splitlines()
+    assert lines[0] == "date,property_id,unit_id,unit_number,resident_id,resident_name,monthly_rent,unit_status"
+    assert len(lines) == 9
+    assert lines[3].endswith(",S T,700,active")
+
+    assert client.get(base + "&format=xml").status_code == 400
+
+
+def _decode_columnar(body):
+    """Expands a format=columnar rent roll back into rows."""
+    units, residents, cols = body['units'], body['residents'], body['columns']
+    start = date.fromisoformat(body['start_date'])
+    return [
+        {
+            "date": (start + timedelta(days=day)).isoformat(),
+            "property_id": units['property_id'][unit],
+            "unit_id": units['unit_id'][unit],
+            "unit_number": units['unit_number'][unit],
+            "resident_id": residents['resident_id'][resident] if resident >= 0 else None,
+            "resident_name": residents['resident_name'][resident] if resident >= 0 else None,
+            "monthly_rent": rent,
+            "unit_status": body['unit_statuses'][status],
+        }
+        for day, unit, resident, rent, status in zip(
+            cols['day'], cols['unit'], cols['resident'], cols['monthly_rent'], cols['unit_status'])
+    ]
+
+
+def test_rent_roll_columnar_format_matches_rows(app, client, db_session, monkeypatch):
+    monkeypatch.setitem(app.config, 'PORTFOLIO_WORKERS', 1)
+    p, u1, r1 = _create_prop_unit_res(client, prop_name="ColumnarProp", unit_number="1", first="Co", last="Lumn")
+    u2 = client.post('/units', json={"property_id": p['id'], "unit_number": "2"}).json
+    occ = client.post('/occupancy/move-in', json={
+        "resident_id": r1['id'], "unit_id": u1['id'], "move_in_date": "2024-03-02", "initial_rent": 700}).json
+    client.post(f"/occupancy/{occ['id']}/rent-change", json={"new_rent": 750, "effective_date": "2024-03-04"})
+    client.post(f"/units/{u2['id']}/status", json={"status": "inactive", "start_date": "2024-03-03"})
+    p2, _, _ = _create_prop_unit_res(client, prop_name="ColumnarProp2", unit_number="9", first="Co", last="Two")
+    base = "start_date=2024-03-01&end_date=2024-03-05"
+
+    res = client.get(f"/reports/rent-roll?property_id={p['id']}&{base}&format=columnar")
+    assert res.status_code == 200
+    body = res.json
+    assert body['row_count'] == 10
+    # Each unit and resident is stored once, whatever the number of days
+    assert body['units']['unit_number'] == [f"P{p['id']}-U1", f"P{p['id']}-U2"]
+    assert body['residents']['resident_name'] == ["Co Lumn"]
+    assert _decode_columnar(body) == client.get(f"/reports/rent-roll?property_id={p['id']}&{base}").json
+
+    ids = f"{p2['id']},{p['id']}"
+    portfolio = client.get(f"/reports/rent-roll?property_ids={ids}&{base}&format=columnar").json
+    assert _decode_columnar(portfolio) == client.get(f"/reports/rent-roll?property_ids={ids}&{base}").json
+
+    assert client.get(f"/reports/rent-roll?property_id=987654&{base}&format=columnar").json['row_count'] == 0
+    assert client.get(f"/reports/rent-roll?property_id={p['id']}&{base}&format=columnar&engine=legacy").status_code == 400
+
+
+def test_rent_roll_spans_format_expands_to_rows(client, db_session):
+    p, u1, r1 = _create_prop_unit_res(client, prop_name="SpansProp", unit_number="1", first="Sp", last="Ans")
+    u2 = client.post('/units', json={"property_id": p['id'], "unit_number": "2"}).json
+    occ = client.post('/occupancy/move-in', json={
+        "resident_id": r1['id'], "unit_id": u1['id'], "move_in_date": "2024-03-05", "initial_rent": 700}).json
+    client.post(f"/occupancy/{occ['id']}/rent-change", json={"new_rent": 750, "effective_date": "2024-03-20"})
+    client.post(f"/units/{u2['id']}/status", json={"status": "inactive", "start_date": "2024-03-10"})
+    base = f"/reports/rent-roll?property_id={p['id']}&start_date=2024-03-01&end_date=2024-03-31"
+
+    res = client.get(base + "&format=spans")
+    assert res.status_code == 200
+    spans = res.json
+    assert [(s['unit_id'], s['start_date'], s['end_date'], s['monthly_rent'], s['unit_status']) for s in spans] == [
+        (u1['id'], "2024-03-01", "2024-03-04", 0, "active"),
+        (u1['id'], "2024-03-05", "2024-03-19", 700, "active"),
+        (u1['id'], "2024-03-20", "2024-03-31", 750, "active"),
+        (u2['id'], "2024-03-01", "2024-03-09", 0, "active"),
+        (u2['id'], "2024-03-10", "2024-03-31", 0, "inactive"),
+    ]
+    expanded = []
+    for span in spans:
+        day = date.fromisoformat(span['start_date'])
+        while day <= date.fromisoformat(span['end_date']):
+            row = {k: v for k, v in span.items() if k not in ('start_date', 'end_date')}
+            expanded.append({"date": day.isoformat(), **row})
+            day += timedelta(days=1)
+    rows = client.get(base).json
+    assert sorted(expanded, key=lambda r: (r['date'], r['unit_id'])) == rows
+
+    assert client.get(base + "&format=spans&engine=legacy").status_code == 400
+
+
+def test_rent_roll_group_by_matches_daily_rows(client, db_session):
+    """group_by summaries agree with the totals of the daily rows."""
+    import calendar
+    p, u1, r1 = _create_prop_unit_res(client, prop_name="GroupProp", unit_number="1", first="Gr", last="Oup")
+    u2 = client.post('/units', json={"property_id": p['id'], "unit_number": "2"}).json
+    r2 = client.post('/residents', json={"first_name": "Gr", "last_name": "Two"}).json
+    occ = client.post('/occupancy/move-in', json={
+        "resident_id": r1['id'], "unit_id": u1['id'], "move_in_date": "2024-01-20", "initial_rent": 900}).json
+    client.post(f"/occupancy/{occ['id']}/rent-change", json={"new_rent": 1000, "effective_date": "2024-02-15"})
+    client.post('/occupancy/move-in', json={
+        "resident_id": r2['id'], "unit_id": u2['id'], "move_in_date": "2024-01-01", "initial_rent": 600})
+    client.put(f"/occupancy/{occ['id']}/move-out", json={"move_out_date": "2024-03-10"})
+    client.post(f"/units/{u1['id']}/status", json={"status": "inactive", "start_date": "2024-03-20"})
+    base = f"/reports/rent-roll?property_id={p['id']}&start_date=2024-01-10&end_date=2024-03-31"
+    rows = client.get(base).json
+
+    def expected(fields):
+        groups = {}
+        for row in rows:
+            key = tuple(row['date'][:7] if field == 'month' else row[field] for field in fields)
+            totals = groups.setdefault(key, [0, 0, 0, 0, 0.0])
+            if row['unit_status'] == 'inactive':
+                totals[2] += 1
+            elif row['resident_id'] is None:
+                totals[1] += 1
+            else:
+                day = date.fromisoformat(row['date'])
+                totals[0] += 1
+                totals[3] += row['monthly_rent']
+                totals[4] += row['monthly_rent'] / calendar.monthrange(day.year, day.month)[1]
+        return {key: (t[0], t[1], t[2], round(t[3] / t[0], 2) if t[0] else None, round(t[4], 2))
+                for key, t in groups.items()}
+
+    for group_by, fields in [('unit', ('unit_id',)), ('month', ('month',)), ('resident', ('resident_id',)),
+                             ('property', ('property_id',)), ('unit,month', ('unit_id', 'month'))]:
+        res = client.get(base + f"&group_by={group_by}")
+        assert res.status_code == 200
+        got = {tuple(g[field] for field in fields):
+               (g['occupied_days'], g['vacant_days'], g['inactive_days'], g['average_rent'], g['prorated_rent'])
+               for g in res.json}
+        assert got == expected(fields), group_by
+
+    by_resident = {g['resident_id']: g for g in client.get(base + "&group_by=resident").json}
+    assert by_resident[r1['id']]['occupied_days'] == 50
+    assert by_resident[r1['id']]['resident_name'] == "Gr Oup"
+    csv_resp = client.get(base + "&group_by=property&format=csv")
+    assert csv_resp.get_data(as_text=True).splitlines()[0] == (
+        "property_id,occupied_days,vacant_days,inactive_days,average_rent,prorated_rent")
+    assert client.get(base + "&group_by=building").status_code == 400
+    assert client.get(base + "&group_by=unit&format=spans").status_code == 400
+
+
+def test_rent_roll_stream_unknown_property_is_empty(client, db_session):
+    res = client.get('/reports/rent-roll?property_id=987654&start_date=2024-01-01&end_date=2024-01-02')
+    assert res.status_code == 200
+    assert res.json == []
+    csv_resp = client.get('/reports/rent-roll?property_id=987654&start_date=2024-01-01&end_date=2024-01-02&format=csv')
+    assert csv_resp.get_data(as_text=True) == ""
+
+
+def test_kpi_series_matches_monthly_endpoints(client, db_session):
+    """Monthly buckets from /reports/kpi-series agree with the per-month KPI endpoints."""
+    p, u1, r1 = _create_prop_unit_res(client, prop_name="SeriesProp", unit_number="1", first="Se", last="Ries")
+    u2 = client.post('/units', json={"property_id": p['id'], "unit_number": "2"}).json
+    r2 = client.post('/residents', json={"first_name": "Se", "last_name": "Two"}).json
+    occ = client.post('/occupancy/move-in', json={
+        "resident_id": r1['id'], "unit_id": u1['id'], "move_in_date": "2024-01-10", "initial_rent": 500
+    }).json
+    client.put(f"/occupancy/{occ['id']}/move-out", json={"move_out_date": "2024-03-05"})
+    client.post('/occupancy/move-in', json={
+        "resident_id": r2['id'], "unit_id": u2['id'], "move_in_date": "2024-02-29", "initial_rent": 500
+    })
+
+    res = client.get(f"/reports/kpi-series?property_id={p['id']}&start_date=2024-01-01&end_date=2024-03-31&bucket=month")
+    assert res.status_code == 200
+    series = res.json['series']
+    assert [b['bucket_start'] for b in series] == ["2024-01-01", "2024-02-01", "2024-03-01"]
+    for bucket, month, last_day in zip(series, (1, 2, 3), (31, 29, 31)):
+        occ_kpi = client.get(f"/reports/kpi-occupancy?property_id={p['id']}&year=2024&month={month}").json
+        move_kpi = client.get(
+            f"/reports/kpi-move?property_id={p['id']}&start_date=2024-{month:02d}-01&end_date=2024-{month:02d}-{last_day}").json
+        assert bucket['occupied_days'] == occ_kpi['occupied_days']
+        assert bucket['total_units_days'] == occ_kpi['total_units_days']
+        assert bucket['occupancy_rate'] == occ_kpi['occupancy_rate']
+        assert bucket['move_ins'] == move_kpi['move_ins']
+        assert bucket['move_outs'] == move_kpi['move_outs']
+
+    weekly = client.get(f"/reports/kpi-series?property_id={p['id']}&start_date=2024-02-28&end_date=2024-03-05&bucket=week").json['series']
+    # 2024-02-28 is a Wednesday: first bucket is clipped to Wed-Sun, second is Mon-Tue
+    assert [(b['bucket_start'], b['bucket_end']) for b in weekly] == [("2024-02-28", "2024-03-03"), ("2024-03-04", "2024-03-05")]
+    assert weekly[0]['move_ins'] == 1 and weekly[1]['move_outs'] == 1
+    assert weekly[0]['occupied_days'] == 5 + 4
+
+    bad = client.get(f"/reports/kpi-series?property_id={p['id']}&start_date=2024-01-01&end_date=2024-03-31&bucket=year")
+    assert bad.status_code == 400
+
+
+def test_kpi_move_for_many_properties(client, db_session):
+    p1, u1, r1 = _create_prop_unit_res(client, prop_name="MultiMoveA", unit_number="1", first="Mm", last="Aa")
+    p2 = client.post('/properties', json={"name": "MultiMoveB"}).json
+    client.post('/occupancy/move-in', json={
+        "resident_id": r1['id'], "unit_id": u1['id'], "move_in_date": "2024-05-03", "initial_rent": 500
+    })
+    res = client.get(f"/reports/kpi-move?property_ids={p1['id']},{p2['id']}&start_date=2024-05-01&end_date=2024-05-31")
+    assert res.status_code == 200
+    assert res.json['properties'] == [
+        {'property_id': p1['id'], 'move_ins': 1, 'move_outs': 0},
+        {'property_id': p2['id'], 'move_ins': 0, 'move_outs': 0},
+    ]
+    everything = client.get("/reports/kpi-move?property_ids=all&start_date=2024-05-01&end_date=2024-05-31")
+    assert {'property_id': p1['id'], 'move_ins': 1, 'move_outs': 0} in everything.json['properties']
+    assert client.get("/reports/kpi-move?property_ids=1,x&start_date=2024-05-01&end_date=2024-05-31").status_code == 400
+
+
+def test_list_properties_unit_counts_single_query(client, db_session):
+    """GET /properties reports unit counts (including zero) without a COUNT query per property."""
+    from sqlalchemy import event
+    from src import db
+    p1 = client.post('/properties', json={"name": "CountPropA"}).json
+    p2 = client.post('/properties', json={"name": "CountPropB"}).json
+    for n in ("1", "2", "3"):
+        client.post('/units', json={"property_id": p1['id'], "unit_number": n})
+
+    statements = []
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+    event.listen(db.engine, 'before_cursor_execute', before_cursor_execute)
+    try:
+        res = client.get('/properties')
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', before_cursor_execute)
+
+    assert res.status_code == 200
+    by_id = {item['id']: item for item in res.json}
+    assert by_id[p1['id']] == {'id': p1['id'], 'name': "CountPropA", 'unit_count': 3}
+    assert by_id[p2['id']] == {'id': p2['id'], 'name': "CountPropB", 'unit_count': 0}
+    assert len(statements) == 1
+
+
+def _walk_pages(client, url):
+    """Follows X-Next-Cursor until the last page; returns (all items, number of pages)."""
+    items, pages, cursor = [], 0, None
+    while True:
+        sep = '&' if '?' in url else '?'
+        res = client.get(url + (f"{sep}after={cursor}" if cursor else ""))
+        assert res.status_code == 200
+        items.extend(res.json)
+        pages += 1
+        cursor = res.headers.get('X-Next-Cursor')
+        if not cursor:
+            return items, pages
+
+
+def test_list_endpoints_keyset_pagination(client, db_session):
+    """Paging with limit/after returns every row exactly once, in the same order as the full list."""
+    p, u, r = _create_prop_unit_res(client, prop_name="PageProp", unit_number="1", first="Pa", last="Ge")
+    units = [u] + [client.post('/units', json={"property_id": p['id'], "unit_number": str(n)}).json for n in range(2, 6)]
+    residents = [r] + [client.post('/residents', json={"first_name": "Pa", "last_name": f"Ge{chr(65 + n)}"}).json for n in range(4)]
+    # Two occupancies share a move-in date so the (move_in_date, id) cursor has to break ties
+    for unit, resident, move_in in zip(units, residents, ["2024-01-05", "2024-01-01", "2024-01-05", "2024-02-01", "2023-12-01"]):
+        client.post('/occupancy/move-in', json={
+            "resident_id": resident['id'], "unit_id": unit['id'], "move_in_date": move_in, "initial_rent": 500
+        })
+
+    for url in ['/properties?limit=1', f"/units?property_id={p['id']}&limit=2", '/residents?limit=2', '/occupancies?limit=2']:
+        full = client.get(url.split('limit=')[0].rstrip('?&')).json
+        paged, pages = _walk_pages(client, url)
+        assert paged == full
+        limit = int(url.split('limit=')[1])
+        assert pages == max(1, -(-len(full) // limit))
+
+    first_page = client.get('/occupancies?limit=2')
+    assert 'rel="next"' in first_page.headers['Link']
+    assert client.get('/occupancies?limit=0').status_code == 400
+    assert client.get('/occupancies?after=not-a-cursor').status_code == 400
+
+
+def test_list_endpoints_filters(client, db_session):
+    p1, u1, r1 = _create_prop_unit_res(client, prop_name="FilterPropA", unit_number="1", first="Fi", last="Lter")
+    p2, u2, r2 = _create_prop_unit_res(client, prop_name="FilterPropB", unit_number="1", first="Fi", last="Lterb")
+    client.post(f"/units/{u2['id']}/status", json={"status": "inactive", "start_date": "2024-01-01"})
+    occ = client.post('/occupancy/move-in', json={
+        "resident_id": r1['id'], "unit_id": u1['id'], "move_in_date": "2024-03-01", "initial_rent": 500
+    }).json
+    client.put(f"/occupancy/{occ['id']}/move-out", json={"move_out_date": "2024-04-01"})
+
+    inactive = client.get('/units?status=inactive&date=2024-06-01').json
+    assert [x['id'] for x in inactive if x['id'] in (u1['id'], u2['id'])] == [u2['id']]
+    assert u2['id'] not in [x['id'] for x in client.get('/units?status=active&date=2024-06-01').json]
+    assert u2['id'] in [x['id'] for x in client.get('/units?status=active&date=2023-06-01').json]
+    assert client.get('/units?status=vacant').status_code == 400
+
+    assert [x['id'] for x in client.get(f"/residents?property_id={p1['id']}").json] == [r1['id']]
+    assert client.get(f"/residents?property_id={p2['id']}").json == []
+    assert [x['id'] for x in client.get('/residents?start_date=2024-03-15&end_date=2024-03-20').json] == [r1['id']]
+    assert client.get('/residents?start_date=2024-04-01').json == []
+
+    assert [x['id'] for x in client.get(f"/occupancies?property_id={p1['id']}").json] == [occ['id']]
+    assert client.get(f"/occupancies?property_id={p2['id']}").json == []
+    assert client.get('/occupancies?start_date=2024-04-01').json == []
+    assert [x['id'] for x in client.get('/occupancies?end_date=2024-03-01').json] == [occ['id']]
+    assert client.get('/occupancies?end_date=03-01-2024').status_code == 400
+
+
+def test_list_occupancies_single_joined_query_and_active_filter(client, db_session):
+    """The occupancy listing joins unit and resident in one query and can be limited to active stays."""
+    from sqlalchemy import event
+    from src import db
+    p, u1, r1 = _create_prop_unit_res(client, prop_name="OccListProp", unit_number="1", first="Oc", last="One")
+    u2 = client.post('/units', json={"property_id": p['id'], "unit_number": "2"}).json
+    r2 = client.post('/residents', json={"first_name": "Oc", "last_name": "Two"}).json
+    past = client.post('/occupancy/move-in', json={
+        "resident_id": r1['id'], "unit_id": u1['id'], "move_in_date": "2020-01-01", "initial_rent": 500
+    }).json
+    client.put(f"/occupancy/{past['id']}/move-out", json={"move_out_date": "2020-06-01"})
+    current = client.post('/occupancy/move-in', json={
+        "resident_id": r2['id'], "unit_id": u2['id'], "move_in_date": "2021-01-01", "initial_rent": 500
+    }).json
+
+    db_session.expunge_all()
+    statements = []
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+    event.listen(db.engine, 'before_cursor_execute', before_cursor_execute)
+    try:
+        res = client.get(f"/occupancies?property_id={p['id']}")
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', before_cursor_execute)
+    assert res.status_code == 200
+    assert len(statements) == 1
+    assert res.json == [
+        {'id': past['id'], 'unit_id': u1['id'], 'unit_number': "1", 'resident_id': r1['id'],
+         'resident_name': "Oc One", 'move_in_date': "2020-01-01", 'move_out_date': "2020-06-01"},
+        {'id': current['id'], 'unit_id': u2['id'], 'unit_number': "2", 'resident_id': r2['id'],
+         'resident_name': "Oc Two", 'move_in_date': "2021-01-01", 'move_out_date': None},
+    ]
+    active = client.get(f"/occupancies?property_id={p['id']}&active=1").json
+    assert [o['id'] for o in active] == [current['id']]
+
+
+def test_unit_and_property_rent_ledgers(client, db_session):
+    """Unit ledger keeps its shape; the property ledger lists every rent change of every unit in order."""
+    p, u1, r1 = _create_prop_unit_res(client, prop_name="LedgerProp", unit_number="1", first="Le", last="Dger")
+    u2 = client.post('/units', json={"property_id": p['id'], "unit_number": "2"}).json
+    r2 = client.post('/residents', json={"first_name": "Le", "last_name": "Two"}).json
+    occ1 = client.post('/occupancy/move-in', json={
+        "resident_id": r1['id'], "unit_id": u1['id'], "move_in_date": "2024-01-01", "initial_rent": 900
+    }).json
+    client.post(f"/occupancy/{occ1['id']}/rent-change", json={"new_rent": 950, "effective_date": "2024-07-01"})
+    occ2 = client.post('/occupancy/move-in', json={
+        "resident_id": r2['id'], "unit_id": u2['id'], "move_in_date": "2024-02-01", "initial_rent": 1200
+    }).json
+
+    unit_ledger = client.get(f"/units/{u1['id']}/rents")
+    assert unit_ledger.status_code == 200
+    assert unit_ledger.json == [
+        {'occupancy_id': occ1['id'], 'resident_id': r1['id'], 'resident_name': "Le Dger",
+         'effective_date': "2024-01-01", 'monthly_rent': 900},
+        {'occupancy_id': occ1['id'], 'resident_id': r1['id'], 'resident_name': "Le Dger",
+         'effective_date': "2024-07-01", 'monthly_rent': 950},
+    ]
+
+    ledger = client.get(f"/properties/{p['id']}/rents")
+    assert ledger.status_code == 200
+    assert [(row['unit_id'], row['occupancy_id'], row['effective_date'], row['monthly_rent']) for row in ledger.json] == [
+        (u1['id'], occ1['id'], "2024-01-01", 900),
+        (u1['id'], occ1['id'], "2024-07-01", 950),
+        (u2['id'], occ2['id'], "2024-02-01", 1200),
+    ]
+    nd = client.get(f"/properties/{p['id']}/rents?format=ndjson").get_data(as_text=True).splitlines()
+    assert [json.loads(line) for line in nd] == ledger.json
+    assert client.get('/properties/987654/rents').status_code == 404
+
+
+def test_portfolio_rent_roll_endpoint(app, client, db_session, monkeypatch):
+    monkeypatch.setitem(app.config, 'PORTFOLIO_WORKERS', 1)
+    p1, u1, r1 = _create_prop_unit_res(client, prop_name="PortfolioApiA", unit_number="1", first="Pf", last="Aa")
+    p2 = client.post('/properties', json={"name": "PortfolioApiB"}).json
+    client.post('/units', json={"property_id": p2['id'], "unit_number": "7"})
+    base = "start_date=2024-01-01&end_date=2024-01-02"
+
+    res = client.get(f"/reports/rent-roll?property_ids={p2['id']},{p1['id']}&{base}")
+    assert res.status_code == 200
+    single = [client.get(f"/reports/rent-roll?property_id={pid}&{base}").json for pid in (p2['id'], p1['id'])]
+    assert res.json == single[0] + single[1]
+
+    everything = client.get(f"/reports/rent-roll?property_ids=all&{base}&format=ndjson").get_data(as_text=True)
+    assert {json.loads(line)['property_id'] for line in everything.splitlines()} >= {p1['id'], p2['id']}
+    assert client.get(f"/reports/rent-roll?property_ids={p1['id']}&{base}&engine=legacy").status_code == 400
+
+
+def test_write_endpoints_keep_fact_table_fresh(client, db_session):
+    """Every write endpoint refreshes the facts it touches, so reports keep reading the fact table."""
+    from src.services.facts import facts_are_fresh, load_fact_spans
+    p, u1, r1 = _create_prop_unit_res(client, prop_name="FactApi", unit_number="1", first="Fact", last="One")
+    u2 = client.post('/units', json={"property_id": p['id'], "unit_number": "2"}).json
+    r2 = client.post('/residents', json={"first_name": "Fact", "last_name": "Two"}).json
+    occ1 = client.post('/occupancy/move-in', json={
+        "resident_id": r1['id'], "unit_id": u1['id'], "move_in_date": "2024-01-05", "initial_rent": 1000}).json
+    occ2 = client.post('/occupancy/move-in', json={
+        "resident_id": r2['id'], "unit_id": u2['id'], "move_in_date": "2024-01-02", "initial_rent": 800}).json
+    assert client.post(f"/occupancy/{occ1['id']}/rent-change",
+                       json={"new_rent": 1100, "effective_date": "2024-01-20"}).status_code == 201
+    assert client.put(f"/occupancy/{occ2['id']}/move-out", json={"move_out_date": "2024-01-10"}).status_code == 200
+    assert client.post(f"/units/{u2['id']}/status", json={"status": "inactive", "start_date": "2024-01-15"}).status_code == 201
+    assert client.patch(f"/occupancy/{occ2['id']}", json={"move_in_date": "2024-01-03"}).status_code == 200
+    u3 = client.post('/units', json={"property_id": p['id'], "unit_number": "3"}).json
+    # A string unit id is accepted, as it was before the fact table existed
+    assert client.patch(f"/occupancy/{occ2['id']}", json={"unit_id": str(u3['id'])}).status_code == 200
+
+    assert facts_are_fresh(p['id'])
+    assert load_fact_spans(p['id'], date(2024, 1, 1), date(2024, 1, 31)) is not None
+    base = f"/reports/rent-roll?property_id={p['id']}&start_date=2024-01-01&end_date=2024-01-31"
+    assert client.get(base).json == client.get(base + "&engine=legacy").json
+    occupancy = client.get(f"/reports/kpi-occupancy?property_id={p['id']}&year=2024&month=1").json
+    # Unit 1 from Jan 5 (27 days) plus the amended stay on unit 3 from Jan 3 to Jan 9 (7 days)
+    assert occupancy['occupied_days'] == 34
+
+
+def test_report_cache_serves_repeats_until_property_data_changes(app, client, db_session, monkeypatch):
+    from src.services.report_cache import ReportCache
+    cache = ReportCache(max_entries=16)
+    monkeypatch.setitem(app.extensions, 'report_cache', cache)
+    p, u, r = _create_prop_unit_res(client, prop_name="CacheProp", unit_number="1", first="Cache", last="One")
+    other, _, other_res = _create_prop_unit_res(client, prop_name="CacheOther", unit_number="1", first="Cache", last="Two")
+    occ = client.post('/occupancy/move-in', json={
+        "resident_id": r['id'], "unit_id": u['id'], "move_in_date": "2024-01-01", "initial_rent": 1000}).json
+    roll = f"/reports/rent-roll?property_id={p['id']}&start_date=2024-01-01&end_date=2024-01-31"
+    kpi = f"/reports/kpi-occupancy?property_id={p['id']}&year=2024&month=1"
+
+    first = client.get(roll)
+    assert first.headers['X-Report-Cache'] == 'miss'
+    assert first.json[0]['monthly_rent'] == 1000
+    second = client.get(roll)
+    assert second.headers['X-Report-Cache'] == 'hit'
+    assert second.get_data() == first.get_data()
+    assert client.get(roll + "&format=csv").headers['X-Report-Cache'] == 'miss'
+    assert client.get(kpi).headers['X-Report-Cache'] == 'miss'
+    assert client.get(kpi).json['occupied_days'] == 31
+
+    # A write to another property leaves this property's reports cached
+    client.post(f"/units/{other['id']}/status", json={"status": "inactive", "start_date": "2024-01-01"})
+    assert client.get(roll).headers['X-Report-Cache'] == 'hit'
+
+    client.post(f"/occupancy/{occ['id']}/rent-change", json={"new_rent": 1200, "effective_date": "2024-01-15"})
+    changed = client.get(roll)
+    assert changed.headers['X-Report-Cache'] == 'miss'
+    assert changed.json[14]['monthly_rent'] == 1200
+    assert client.get(kpi).headers['X-Report-Cache'] == 'miss'
+
+    # Writes outside the routes (and resident renames) move the version forward too
+    db_session.get(Resident, r['id']).first_name = "Renamed"
+    db_session.commit()
+    renamed = client.get(roll)
+    assert renamed.headers['X-Report-Cache'] == 'miss'
+    assert renamed.json[0]['resident_name'] == "Renamed One"
+    assert cache.stats()['hits'] >= 2
+
+
+def test_sqlite_report_cache_is_shared_between_workers(tmp_path):
+    """Two apps standing in for two worker processes share the file cache and its invalidation."""
+    from src import create_app, db
+    from src.config import TestingConfig
+
+    class WorkerConfig(TestingConfig):
+        SQLALCHEMY_DATABASE_URI = 'sqlite:///' + str(tmp_path / 'workers.db')
+        REPORT_CACHE_BACKEND = 'sqlite'
+        REPORT_CACHE_PATH = str(tmp_path / 'report_cache.db')
+        REPORT_CACHE_MAX_ENTRIES = 8
+
+    worker_a, worker_b = create_app(config_class=WorkerConfig), create_app(config_class=WorkerConfig)
+    client_a, client_b = worker_a.test_client(), worker_b.test_client()
+    p, u, r = _create_prop_unit_res(client_a, prop_name="SharedCache", unit_number="1", first="Shared", last="Cache")
+    occ = client_a.post('/occupancy/move-in', json={
+        "resident_id": r['id'], "unit_id": u['id'], "move_in_date": "2024-01-01", "initial_rent": 700}).json
+    roll = f"/reports/rent-roll?property_id={p['id']}&start_date=2024-01-01&end_date=2024-01-05&format=ndjson"
+
+    computed = client_a.get(roll)
+    assert computed.headers['X-Report-Cache'] == 'miss'
+    # Streamed bodies are stored once they have been sent in full
+    computed.get_data()
+    served = client_b.get(roll)
+    assert served.headers['X-Report-Cache'] == 'hit'
+    assert served.get_data() == computed.get_data()
+
+    client_b.post(f"/occupancy/{occ['id']}/rent-change", json={"new_rent": 750, "effective_date": "2024-01-03"})
+    recomputed = client_a.get(roll)
+    assert recomputed.headers['X-Report-Cache'] == 'miss'
+    assert [json.loads(line)['monthly_rent'] for line in recomputed.get_data(as_text=True).splitlines()] == [700, 700, 750, 750, 750]
+    assert client_b.get(roll).headers['X-Report-Cache'] == 'hit'
+    for app in (worker_a, worker_b):
+        with app.app_context():
+            db.engine.dispose()
+
+
+def test_sqlite_report_cache_keeps_databases_apart(tmp_path):
+    """Apps on different (or rebuilt) databases sharing one cache file never serve each other's reports."""
+    from src import create_app, db
+    from src.config import TestingConfig
+
+    def app_for(name):
+        class DatabaseConfig(TestingConfig):
+            SQLALCHEMY_DATABASE_URI = 'sqlite:///' + str(tmp_path / name)
+            REPORT_CACHE_BACKEND = 'sqlite'
+            REPORT_CACHE_PATH = str(tmp_path / 'report_cache.db')
+            REPORT_CACHE_MAX_ENTRIES = 8
+        return create_app(config_class=DatabaseConfig)
+
+    def rent_roll(app, rent):
+        client = app.test_client()
+        p, u, r = _create_prop_unit_res(client, prop_name="KeyedCache", unit_number="1", first="Keyed", last="Cache")
+        client.post('/occupancy/move-in', json={
+            "resident_id": r['id'], "unit_id": u['id'], "move_in_date": "2024-01-01", "initial_rent": rent})
+        return client.get(f"/reports/rent-roll?property_id={p['id']}&start_date=2024-01-01&end_date=2024-01-02")
+
+    first, second = app_for('first.db'), app_for('second.db')
+    assert rent_roll(first, 500).json[0]['monthly_rent'] == 500
+    # Same property id and data version in another database
+    other = rent_roll(second, 600)
+    assert other.headers['X-Report-Cache'] == 'miss'
+    assert other.json[0]['monthly_rent'] == 600
+
+    with first.app_context():
+        db.drop_all()
+        db.engine.dispose()
+    rebuilt = app_for('first.db')
+    again = rent_roll(rebuilt, 700)
+    assert again.headers['X-Report-Cache'] == 'miss'
+    assert again.json[0]['monthly_rent'] == 700
+    for app in (second, rebuilt):
+        with app.app_context():
+            db.engine.dispose()
+
+
+def test_bulk_import_csv_creates_linked_records(client, db_session):
+    from src.services.facts import facts_are_fresh
+    existing, existing_unit, existing_res = _create_prop_unit_res(client, prop_name="Import Existing", unit_number="5",
+                                                                  first="Already", last="Here")
+    body = "\n".join([
+        "type,name,property_name,property_id,unit_number,first_name,last_name,move_in_date,move_out_date,initial_rent",
+        "property,Imported Towers,,,,,,,,",
+        "unit,,Imported Towers,,101,,,,,",
+        "unit,,imported towers,,102,,,,,",
+        f"unit,,,{existing['id']},6,,,,,",
+        "resident,,,,,Imported,One,,,",
+        "resident,,,,,Imported,Two,,,",
+        "occupancy,,Imported Towers,,101,Imported,One,2024-01-01,2024-03-01,1500",
+        "occupancy,,Imported Towers,,101,Imported,Two,2024-03-01,,1600",
+        f"occupancy,,,{existing['id']},6,Already,Here,2024-02-01,,900",
+    ])
+    res = client.post('/import?dry_run=1', data=body, content_type='text/csv')
+    assert res.status_code == 200
+    assert res.json['created'] == {'properties': 1, 'units': 3, 'residents': 2, 'occupancies': 3}
+    assert db_session.query(Property).filter_by(name="Imported Towers").first() is None
+
+    res = client.post('/import', data=body, content_type='text/csv')
+    assert res.status_code == 201, res.json
+    assert res.json['created'] == {'properties': 1, 'units': 3, 'residents': 2, 'occupancies': 3}
+    prop = db_session.query(Property).filter_by(name="Imported Towers").one()
+    roll = client.get(f"/reports/rent-roll?property_id={prop.id}&start_date=2024-02-29&end_date=2024-03-01").json
+    assert [(r['unit_number'].split('-U')[-1], r['date'], r['resident_name'], r['monthly_rent']) for r in roll] == [
+        ('101', '2024-02-29', 'Imported One', 1500), ('102', '2024-02-29', None, 0),
+        ('101', '2024-03-01', 'Imported Two', 1600), ('102', '2024-03-01', None, 0),
+    ]
+    assert facts_are_fresh(prop.id) and facts_are_fresh(existing['id'])
+    assert client.get(f"/units?property_id={existing['id']}").json[-1]['unit_number'] == '6'
+
+
+def test_bulk_import_rejects_whole_batch_with_per_row_errors(client, db_session):
+    p, u, r = _create_prop_unit_res(client, prop_name="Import Checks", unit_number="1", first="Check", last="One")
+    client.post('/occupancy/move-in', json={"resident_id": r['id'], "unit_id": u['id'], "move_in_date": "2024-01-01",
+                                            "initial_rent": 1000})
+    u2 = client.post('/units', json={"property_id": p['id'], "unit_number": "2"}).json
+    client.post(f"/units/{u2['id']}/status", json={"status": "inactive", "start_date": "2024-01-01"})
+    lines = [
+        {"type": "property", "name": "Import Checks"},                                       # 1 duplicate name
+        {"type": "property", "name": "Bad_Name!"},                                           # 2 pattern
+        {"type": "unit", "property_name": "Nowhere", "unit_number": "3"},                    # 3 unknown property
+        {"type": "unit", "property_id": p['id'], "unit_number": "1"},                        # 4 duplicate unit
+        {"type": "resident", "first_name": "New", "last_name": "Person"},                    # 5 ok
+        {"type": "occupancy", "unit_id": u['id'], "first_name": "New", "last_name": "Person",
+         "move_in_date": "2024-06-01", "initial_rent": 800},                                 # 6 overlaps existing stay
+        {"type": "occupancy", "unit_id": u2['id'], "resident_id": r['id'],
+         "move_in_date": "2024-02-01", "initial_rent": 800},                                 # 7 inactive unit
+        {"type": "unit", "property_id": p['id'], "unit_number": "9"},                        # 8 ok
+        {"type": "occupancy", "property_id": p['id'], "unit_number": "9", "first_name": "New", "last_name": "Person",
+         "move_in_date": "2023-01-01", "move_out_date": "2023-06-01", "initial_rent": 700},   # 9 ok
+        {"type": "occupancy", "property_id": p['id'], "unit_number": "9", "resident_id": r['id'],
+         "move_in_date": "2023-05-01", "move_out_date": "2023-07-01", "initial_rent": 700},   # 10 overlaps row 9
+        {"type": "occupancy", "unit_id": u['id'], "resident_id": r['id'],
+         "move_in_date": "2023-01-01", "initial_rent": 0},                                   # 11 rent
+        {"type": "tenant"},                                                                  # 12 type
+    ]
+    body = "\n".join(json.dumps(line) for line in lines) + "\nnot json\n"
+    res = client.post('/import', data=body, content_type='application/x-ndjson')
+    assert res.status_code == 400
+    errors = {e['row']: e['error'] for e in res.json['errors']}
+    assert sorted(errors) == [1, 2, 3, 4, 6, 7, 10, 11, 12, 13]
+    assert errors[1] == 'Property name must be unique'
+    assert errors[3] == "Property 'Nowhere' not found"
+    assert errors[6] == 'Unit is already occupied during the specified period'
+    assert errors[7].startswith('Unit is inactive')
+    assert errors[10] == 'Unit is already occupied during the specified period'
+    assert errors[11] == 'initial_rent must be positive'
+    assert db_session.query(Resident).filter_by(first_name="New").first() is None
+    assert client.post('/import?format=xml', data=body).status_code == 400
+    latin1 = client.post('/import', data='type,name\nproperty,Caf\xe9 Tower\n'.encode('latin-1'), content_type='text/csv')
+    assert latin1.status_code == 400
+    assert latin1.json['error'] == 'Body must be UTF-8 text'
+
+
+def test_batch_move_in_is_atomic_and_checks_overlaps_within_the_batch(client, db_session):
+    p, u1, r1 = _create_prop_unit_res(client, prop_name="BatchProp", unit_number="1", first="Batch", last="One")
+    u2 = client.post('/units', json={"property_id": p['id'], "unit_number": "2"}).json
+    u3 = client.post('/units', json={"property_id": p['id'], "unit_number": "3"}).json
+    r2 = client.post('/residents', json={"first_name": "Batch", "last_name": "Two"}).json
+    r3 = client.post('/residents', json={"first_name": "Batch", "last_name": "Three"}).json
+    client.post('/occupancy/move-in', json={"resident_id": r3['id'], "unit_id": u3['id'],
+                                            "move_in_date": "2024-01-01", "initial_rent": 500})
+    client.post(f"/units/{u2['id']}/status", json={"status": "inactive", "start_date": "2023-01-01"})
+    client.post(f"/units/{u2['id']}/status", json={"status": "active", "start_date": "2024-01-01"})
+
+    rejected = client.post('/occupancy/move-in/batch', json={"items": [
+        {"resident_id": r1['id'], "unit_id": u1['id'], "move_in_date": "2024-01-01", "move_out_date": "2024-06-01", "initial_rent": 1000},
+        {"resident_id": r2['id'], "unit_id": u1['id'], "move_in_date": "2024-05-01", "initial_rent": 1000},   # overlaps item 0
+        {"resident_id": r1['id'], "unit_id": u3['id'], "move_in_date": "2025-01-01", "initial_rent": 1000},   # unit 3 still occupied
+        {"resident_id": r2['id'], "unit_id": u2['id'], "move_in_date": "2023-06-01", "initial_rent": 1000},   # inactive then
+        {"resident_id": r2['id'], "unit_id": 999999, "move_in_date": "2024-01-01", "initial_rent": 1000},
+        {"resident_id": r2['id'], "unit_id": u2['id'], "move_in_date": "2024-13-01", "initial_rent": 1000},
+    ]})
+    assert rejected.status_code == 400
+    assert [(r['index'], r['status']) for r in rejected.json['results']] == [
+        (0, 'valid'), (1, 'error'), (2, 'error'), (3, 'error'), (4, 'error'), (5, 'error')]
+    assert rejected.json['results'][1]['error'] == 'Unit 1 is already occupied on 2024-05-01'
+    assert rejected.json['results'][2]['error'] == 'Unit 3 is already occupied on 2025-01-01'
+    assert 'inactive' in rejected.json['results'][3]['error']
+    assert rejected.json['results'][4]['error'] == 'Unit not found'
+    assert db_session.query(Occupancy).filter_by(unit_id=u1['id']).count() == 0
+
+    accepted = client.post('/occupancy/move-in/batch', json={"items": [
+        {"resident_id": r1['id'], "unit_id": u1['id'], "move_in_date": "2024-01-01", "move_out_date": "2024-06-01", "initial_rent": 1000},
+        {"resident_id": r2['id'], "unit_id": u1['id'], "move_in_date": "2024-06-01", "initial_rent": 1100},
+        {"resident_id": r1['id'], "unit_id": u2['id'], "move_in_date": "2024-06-01", "initial_rent": 900},
+    ]})
+    assert accepted.status_code == 201
+    occs = [r['occupancy'] for r in accepted.json['results']]
+    assert [(o['unit_id'], o['resident_id'], o['move_in_date']) for o in occs] == [
+        (u1['id'], r1['id'], "2024-01-01"), (u1['id'], r2['id'], "2024-06-01"), (u2['id'], r1['id'], "2024-06-01")]
+    assert client.get(f"/occupancy/{occs[1]['id']}/rents").json[0]['amount'] == 1100
+
+    changes = client.post('/occupancy/rent-change/batch', json={"items": [
+        {"occupancy_id": occs[0]['id'], "new_rent": 1050, "effective_date": "2024-03-01"},
+        {"occupancy_id": occs[0]['id'], "new_rent": 1050, "effective_date": "2024-03-01"},  # duplicate in batch
+        {"occupancy_id": occs[1]['id'], "new_rent": 1100, "effective_date": "2024-06-01"},  # duplicate of stored rent
+        {"occupancy_id": occs[0]['id'], "new_rent": 1200, "effective_date": "2024-06-01"},  # after move-out
+        {"occupancy_id": occs[2]['id'], "new_rent": -5, "effective_date": "2024-07-01"},
+    ]})
+    assert changes.status_code == 400
+    assert [r.get('error') for r in changes.json['results']] == [
+        None, 'A rent record with this amount and date already exists.',
+        'A rent record with this amount and date already exists.',
+        'effective_date must be within occupancy period', 'new_rent must be positive']
+
+    changes = client.post('/occupancy/rent-change/batch', json={"items": [
+        {"occupancy_id": occs[0]['id'], "new_rent": 1050, "effective_date": "2024-03-01"},
+        {"occupancy_id": occs[2]['id'], "new_rent": 950, "effective_date": "2024-09-01"},
+    ]})
+    assert changes.status_code == 201
+    assert [r['rent']['amount'] for r in changes.json['results']] == [1050, 950]
+    roll = client.get(f"/reports/rent-roll?property_id={p['id']}&start_date=2024-03-01&end_date=2024-03-01").json
+    assert {r['unit_id']: r['monthly_rent'] for r in roll}[u1['id']] == 1050
+    assert client.post('/occupancy/move-in/batch', json={"items": []}).status_code == 400
+
+
+def test_rent_escalation_dry_run_and_apply(client, db_session):
+    p1, u1, r1 = _create_prop_unit_res(client, prop_name="EscalateA", unit_number="1", first="Esc", last="One")
+    p2, u2, r2 = _create_prop_unit_res(client, prop_name="EscalateB", unit_number="1", first="Esc", last="Two")
+    u3 = client.post('/units', json={"property_id": p1['id'], "unit_number": "2"}).json
+    u4 = client.post('/units', json={"property_id": p1['id'], "unit_number": "3"}).json
+    r3 = client.post('/residents', json={"first_name": "Esc", "last_name": "Three"}).json
+    r4 = client.post('/residents', json={"first_name": "Esc", "last_name": "Four"}).json
+    occ1 = client.post('/occupancy/move-in', json={"resident_id": r1['id'], "unit_id": u1['id'],
+                                                   "move_in_date": "2024-01-01", "initial_rent": 1000}).json
+    client.post(f"/occupancy/{occ1['id']}/rent-change", json={"new_rent": 1010, "effective_date": "2024-06-01"})
+    occ2 = client.post('/occupancy/move-in', json={"resident_id": r2['id'], "unit_id": u2['id'],
+                                                   "move_in_date": "2024-03-01", "initial_rent": 2000}).json
+    # Moved out before the effective date, and already escalated on it: both left alone
+    occ3 = client.post('/occupancy/move-in', json={"resident_id": r3['id'], "unit_id": u3['id'],
+                                                   "move_in_date": "2024-01-01", "initial_rent": 900}).json
+    client.put(f"/occupancy/{occ3['id']}/move-out", json={"move_out_date": "2024-12-01"})
+    occ4 = client.post('/occupancy/move-in', json={"resident_id": r4['id'], "unit_id": u4['id'],
+                                                   "move_in_date": "2024-01-01", "initial_rent": 800}).json
+    client.post(f"/occupancy/{occ4['id']}/rent-change", json={"new_rent": 850, "effective_date": "2025-01-01"})
+
+    body = {"effective_date": "2025-01-01",
+            "rules": [{"percent": 3.5}, {"property_id": p2['id'], "amount": 75}], "dry_run": True}
+    preview = client.post('/occupancy/rent-escalation', json=body)
+    assert preview.status_code == 200
+    assert [(c['occupancy_id'], c['current_rent'], c['new_rent']) for c in preview.json['changes']] == [
+        (occ1['id'], 1010, 1045), (occ2['id'], 2000, 2075)]
+    assert len(client.get(f"/occupancy/{occ1['id']}/rents").json) == 2
+
+    body['dry_run'] = False
+    applied = client.post('/occupancy/rent-escalation', json=body)
+    assert applied.status_code == 201
+    assert applied.json['changes'] == preview.json['changes']
+    latest = client.get(f"/occupancy/{occ1['id']}/rents").json[-1]
+    assert (latest['amount'], latest['effective_date']) == (1045, "2025-01-01")
+    roll = client.get(f"/reports/rent-roll?property_id={p2['id']}&start_date=2025-01-01&end_date=2025-01-01").json
+    assert roll[0]['monthly_rent'] == 2075
+    # Re-running is a no-op
+    assert client.post('/occupancy/rent-escalation', json=body).json['count'] == 0
+    assert client.post('/occupancy/rent-escalation', json={"effective_date": "2025-01-01", "percent": -100}).status_code == 400
+    assert client.post('/occupancy/rent-escalation', json={"effective_date": "2025-01-01"}).status_code == 400
+
+
+def test_load_test_runner_in_process(tmp_path, monkeypatch):
+    """The load test replays reads and turnovers concurrently and reports percentiles per endpoint."""
+    from src import create_app, db
+    from src.config import TestingConfig
+    from src.loadtest import run_load_test, summarize_latencies
+    from src.models import RentRollFact, PropertyDataVersion
+
+    class FileConfig(TestingConfig):
+        SQLALCHEMY_DATABASE_URI = 'sqlite:///' + str(tmp_path / 'load.db')
+
+    app = create_app(config_class=FileConfig)
+    with pytest.raises(ValueError, match='No properties'):
+        run_load_test(app=app, clients=1, requests_per_client=1)
+    report = run_load_test(app=app, clients=2, requests_per_client=12,
+                           mix={'rent_roll': 1, 'kpi': 1, 'list': 1, 'turnover': 2}, seed=3,
+                           synthetic_properties=2, synthetic_units=4, synthetic_years=1)
+    assert report['overall']['requests'] >= 24
+    assert report['overall']['error_rate'] == 0
+    assert report['overall']['rejection_rate'] == 0
+    assert 'POST /occupancy/move-in' in report['endpoints']
+    assert report['settings']['read_properties'] == 2
+    latency = report['overall']['latency_ms']
+    assert 0 < latency['p50'] <= latency['p95'] <= latency['p99'] <= latency['max']
+    # Everything the run generated or wrote is gone again
+    with app.app_context():
+        for model in (Property, Unit, Resident, Occupancy, Rent, UnitStatus, RentRollFact, PropertyDataVersion):
+            assert db.session.query(model).count() == 0
+        db.session.remove()
+        db.engine.dispose()
+
+    # Residents whose move-in is rejected are removed as well
+    from src import loadtest
+    wsgi_request = loadtest._WSGITransport.request
+
+    def reject_move_ins(self, method, path, body=None):
+        if path == '/occupancy/move-in':
+            return 400, b'{"error": "rejected"}'
+        return wsgi_request(self, method, path, body)
+
+    monkeypatch.setattr(loadtest._WSGITransport, 'request', reject_move_ins)
+    rejected = run_load_test(app=app, clients=2, requests_per_client=4, mix={'turnover': 1}, seed=4)
+    assert rejected['endpoints']['POST /residents']['requests'] >= 2
+    assert rejected['endpoints']['POST /occupancy/move-in']['rejection_rate'] == 1
+    with app.app_context():
+        assert db.session.query(Resident).count() == 0
+        assert db.session.query(Property).count() == 0
+        db.session.remove()
+        db.engine.dispose()
+
+    # Against a URL, turnovers need an explicit opt-in and synthetic data cannot be generated
+    with pytest.raises(ValueError, match='--allow-writes'):
+        run_load_test(url='http://127.0.0.1:9', mix={'turnover': 1})
+    with pytest.raises(ValueError, match='in-process'):
+        run_load_test(url='http://127.0.0.1:9', synthetic_properties=1)
+
+    summary = summarize_latencies([('GET /x', 200, n / 1000) for n in range(1, 101)] + [('GET /x', 500, 0.5)], 2.0)
+    assert summary['endpoints']['GET /x']['latency_ms']['p50'] == 51.0
+    assert summary['endpoints']['GET /x']['error_rate'] == round(1 / 101, 4)
+    with pytest.raises(ValueError):
+        run_load_test(app=app, mix={'unknown': 1})
+
+
+def test_request_metrics_server_timing_and_endpoint(client, db_session):
+    client.get('/metrics?reset=1')
+    p = client.post('/properties', json={"name": "MetricsProp"}).json
+    res = client.get(f"/properties/{p['id']}")
+    timing = res.headers['Server-Timing']
+    assert timing.startswith('db;dur=') and 'queries"' in timing and 'app;dur=' in timing
+    with client.get(f"/reports/rent-roll?property_id={p['id']}&start_date=2024-01-01&end_date=2024-01-02") as streamed:
+        streamed.get_data()
+
+    endpoints = client.get('/metrics').json['endpoints']
+    assert endpoints['POST /properties']['requests'] == 1
+    assert endpoints['GET /properties/<int:id>']['max_queries'] >= 1
+    # Statements run while the body was streamed are included
+    assert endpoints['GET /reports/rent-roll']['max_queries'] >= 1
+    assert client.get('/metrics?reset=1').status_code == 200
+    assert set(client.get('/metrics').json['endpoints']) <= {'GET /metrics'}
+
+
+def test_request_metrics_record_every_request_in_a_shared_app_context(app, client, db_session):
+    """Requests made while an outer app context is pushed share g; a streamed one must not hide the next."""
+    client.get('/metrics?reset=1')
+    p = client.post('/properties', json={"name": "SharedContextProp"}).json
+    with app.app_context():
+        with client.get(f"/reports/rent-roll?property_id={p['id']}&start_date=2024-01-01&end_date=2024-01-02") as streamed:
+            streamed.get_data()
+        assert client.get('/properties/999999').status_code == 404
+        assert client.get(f"/properties/{p['id']}").status_code == 200
+    endpoints = client.get('/metrics').json['endpoints']
+    assert endpoints['GET /reports/rent-roll']['requests'] == 1
+    assert endpoints['GET /properties/<int:id>']['requests'] == 2
+
+
+def test_profiling_stores_lists_and_serves_profiles(client, tmp_path):
+    """Only requests that ask for it are profiled; the profile directory keeps the newest PROFILE_MAX_FILES."""
+    import pstats
+    from src import create_app, db
+    from src.config import TestingConfig
+
+    class ProfilingConfig(TestingConfig):
+        SQLALCHEMY_DATABASE_URI = 'sqlite:///' + str(tmp_path / 'profiled.db')
+        PROFILING_ENABLED = True
+        PROFILER = 'cprofile'
+        PROFILE_DIR = str(tmp_path / 'profiles')
+        PROFILE_MAX_FILES = 2
+
+    app = create_app(config_class=ProfilingConfig)
+    profiled = app.test_client()
+    p = profiled.post('/properties', json={"name": "ProfiledProp"}).json
+    assert 'X-Profile-Id' not in profiled.get('/properties').headers
+    assert profiled.get('/admin/profiles').json['profiles'] == []
+
+    first = profiled.get(f"/properties/{p['id']}?profile=1").headers['X-Profile-Id']
+    with profiled.get(f"/reports/rent-roll?property_id={p['id']}&start_date=2024-01-01&end_date=2024-01-02",
+                      headers={'X-Profile': '1'}) as streamed:
+        streamed.get_data()
+        streamed_id = streamed.headers['X-Profile-Id']
+    profiles = profiled.get('/admin/profiles').json['profiles']
+    assert [profile['id'] for profile in profiles] == [streamed_id, first]
+    assert profiles[0]['endpoint'] == '/reports/rent-roll' and profiles[0]['format'] == 'pstats'
+
+    download = profiled.get(f'/admin/profiles/{streamed_id}')
+    assert download.status_code == 200
+    (tmp_path / 'download.prof').write_bytes(download.data)
+    # The streamed body's report code ran while profiling
+    functions = {name for _, _, name in pstats.Stats(str(tmp_path / 'download.prof')).stats}
+    assert 'json_array_chunks' in functions
+
+    profiled.get('/properties', headers={'X-Profile': '1'})
+    ids = [profile['id'] for profile in profiled.get('/admin/profiles').json['profiles']]
+    assert len(ids) == 2 and first not in ids
+    assert profiled.get(f'/admin/profiles/{first}').status_code == 404
+    assert profiled.get('/admin/profiles/..%2Fprofiled.db').status_code == 404
+    with app.app_context():
+        db.session.remove()
+        db.engine.dispose()
+
+    # Disabled by default: the header is ignored and the admin endpoints are hidden
+    assert 'X-Profile-Id' not in client.get('/properties', headers={'X-Profile': '1'}).headers
+    assert client.get('/admin/profiles').status_code == 404
+
+
+def test_sampling_profiler_writes_collapsed_stacks():
+    import time
+    from src.profiling import SamplingProfiler
+
+    def busy_wait():
+        deadline = time.perf_counter() + 0.05
+        while time.perf_counter() < deadline:
+            pass
+
+    profiler = SamplingProfiler(interval=0.001)
+    profiler.start()
+    busy_wait()
+    lines = profiler.stop().decode().splitlines()
+    assert lines
+    stack, count = lines[0].rsplit(' ', 1)
+    assert int(count) >= 1 and 'busy_wait' in stack.split(';')[-1]
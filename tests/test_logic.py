@@ -1,9 +1,11 @@
 # tests/test_logic.py
+import calendar
+import json
 import pytest
 from datetime import date
 from src.models import Property, Unit, Resident, Occupancy, Rent, UnitStatus
 from src.services.rent_roll import generate_rent_roll
-from src.services.kpis import move_in_out_counts, occupancy_rate_for_month
+from src.services.kpis import move_in_out_counts, move_in_out_counts_by_property, occupancy_rate_for_month
 
 # The 'db_session' fixture ensures a clean database state for every test.
 
@@ -185,6 +187,53 @@ def test_generate_rent_roll_no_units(db_session):
     assert report == []
 
 
+def test_rent_roll_columns_expand_to_rows(db_session):
+    """RentRollColumns.rows() reproduces generate_rent_roll, with residents stored once."""
+    from src.services.rent_roll import rent_roll_columns
+    prop, unit, res = setup_property_unit_resident(db_session, prop_name="ColProp", unit_num="C1", res_name="ColRes")
+    other = Unit(property=prop, unit_number="C2")
+    occ = Occupancy(resident=res, unit=unit, move_in_date=date(2024, 1, 3), move_out_date=date(2024, 1, 20))
+    db_session.add_all([other, occ, Rent(occupancy=occ, amount=900, effective_date=date(2024, 1, 3)),
+                        Rent(occupancy=occ, amount=950, effective_date=date(2024, 1, 10)),
+                        UnitStatus(unit=other, status='inactive', start_date=date(2024, 1, 15))])
+    db_session.commit()
+
+    columns = rent_roll_columns(prop.id, date(2024, 1, 1), date(2024, 1, 31))
+    assert len(columns) == 62
+    assert columns.residents == [(res.id, "ColRes Test")]
+    assert list(columns.rows()) == generate_rent_roll(prop.id, date(2024, 1, 1), date(2024, 1, 31))
+    assert len(rent_roll_columns(987654, date(2024, 1, 1), date(2024, 1, 31))) == 0
+
+
+def test_timelines_answer_repeated_lookups_and_follow_writes(db_session, monkeypatch):
+    """Status and rent lookups load each history once and see later flushes and rollbacks."""
+    from src.services import timelines
+    prop, unit, res = setup_property_unit_resident(db_session, prop_name="TimelineProp", unit_num="T1", res_name="Tl")
+    occ = Occupancy(resident=res, unit=unit, move_in_date=date(2024, 1, 1))
+    db_session.add_all([occ, Rent(occupancy=occ, amount=800, effective_date=date(2024, 1, 1)),
+                        Rent(occupancy=occ, amount=850, effective_date=date(2024, 3, 1)),
+                        UnitStatus(unit=unit, status='inactive', start_date=date(2024, 6, 1))])
+    db_session.commit()
+
+    loads = []
+    load_statuses = timelines._load_status_timelines
+    monkeypatch.setattr(timelines, '_load_status_timelines', lambda ids: loads.append(ids) or load_statuses(ids))
+    assert [unit.get_status_on_date(date(2024, 5, day)) for day in (1, 31)] == ['active', 'active']
+    assert unit.get_status_on_date(date(2024, 6, 1)) == 'inactive'
+    assert len(loads) == 1
+    assert [occ.get_rent_on_date(d) for d in (date(2023, 12, 31), date(2024, 2, 29), date(2024, 3, 1))] == [0, 800, 850]
+
+    # A pending row is flushed before the lookup and drops the cached timeline
+    db_session.add(UnitStatus(unit=unit, status='active', start_date=date(2024, 7, 1)))
+    assert unit.get_status_on_date(date(2024, 7, 1)) == 'active'
+    assert len(loads) == 2
+    savepoint = db_session.begin_nested()
+    db_session.add(Rent(occupancy=occ, amount=900, effective_date=date(2024, 4, 1)))
+    assert occ.get_rent_on_date(date(2024, 4, 1)) == 900
+    savepoint.rollback()
+    assert occ.get_rent_on_date(date(2024, 4, 1)) == 850
+
+
 def test_move_in_and_move_out_same_day_results_in_vacant(db_session):
     """
     If an occupancy has the same move_in_date and move_out_date,
@@ -297,3 +346,324 @@ def test_rent_history_returns_latest_effective_amount(db_session):
     # Jun 1 -> should pick 1500
     report_jun1 = generate_rent_roll(prop.id, date(2024, 6, 1), date(2024, 6, 1))[0]
     assert report_jun1['monthly_rent'] == 1500
+
+
+def test_sweep_engine_matches_legacy_engine(db_session):
+    """
+    The bulk-loading sweep engine must produce exactly the same rows as the original
+    per-unit/per-day engine across turnovers, rent changes, status toggles and ties.
+    """
+    prop, unit1, res1 = setup_property_unit_resident(db_session, prop_name="ParityProp", unit_num="1", res_name="PA")
+    unit2 = Unit(property=prop, unit_number="2")
+    unit3 = Unit(property=prop, unit_number="3")
+    res2 = Resident(first_name="PB", last_name="Test")
+    res3 = Resident(first_name="PC", last_name="Test")
+    db_session.add_all([unit2, unit3, res2, res3])
+    db_session.commit()
+
+    # Unit 1: turnover on Jan 10 with rent changes on both leases (two changes on one day)
+    occ1 = Occupancy(resident=res1, unit=unit1, move_in_date=date(2023, 12, 1), move_out_date=date(2024, 1, 10))
+    occ2 = Occupancy(resident=res2, unit=unit1, move_in_date=date(2024, 1, 10))
+    # Unit 2: occupancy with no rent records, then the unit goes inactive and back
+    occ3 = Occupancy(resident=res3, unit=unit2, move_in_date=date(2024, 1, 5), move_out_date=date(2024, 1, 8))
+    db_session.add_all([
+        occ1, occ2, occ3,
+        Rent(occupancy=occ1, amount=900, effective_date=date(2023, 12, 1)),
+        Rent(occupancy=occ1, amount=950, effective_date=date(2024, 1, 3)),
+        Rent(occupancy=occ2, amount=1000, effective_date=date(2024, 1, 10)),
+        Rent(occupancy=occ2, amount=1100, effective_date=date(2024, 1, 15)),
+        Rent(occupancy=occ2, amount=1050, effective_date=date(2024, 1, 15)),
+        UnitStatus(unit=unit2, status='inactive', start_date=date(2024, 1, 12)),
+        UnitStatus(unit=unit2, status='active', start_date=date(2024, 1, 18)),
+        UnitStatus(unit=unit3, status='inactive', start_date=date(2023, 6, 1)),
+    ])
+    db_session.commit()
+
+    for start, end in [(date(2024, 1, 1), date(2024, 1, 31)), (date(2024, 1, 15), date(2024, 1, 15)),
+                       (date(2023, 11, 20), date(2024, 2, 5))]:
+        legacy = generate_rent_roll(prop.id, start, end, engine='legacy')
+        sweep = generate_rent_roll(prop.id, start, end)
+        assert sweep == legacy
+        assert json.dumps(sweep) == json.dumps(legacy)
+
+    jan15 = [r for r in generate_rent_roll(prop.id, date(2024, 1, 15), date(2024, 1, 15)) if r['unit_id'] == unit1.id]
+    # Two changes on the same day: the later-recorded one wins
+    assert jan15[0]['monthly_rent'] == 1050
+
+
+def test_generate_rent_roll_unknown_engine_raises(db_session):
+    prop, _, _ = setup_property_unit_resident(db_session, prop_name="EngineProp")
+    with pytest.raises(ValueError):
+        generate_rent_roll(prop.id, date(2024, 1, 1), date(2024, 1, 1), engine='nope')
+
+
+def test_occupancy_rate_matches_rent_roll_day_count(db_session):
+    """
+    The interval-based occupancy rate must equal the number of distinct (unit, date)
+    rent roll rows with a resident, including overlapping stays and status toggles.
+    """
+    prop, unit1, res1 = setup_property_unit_resident(db_session, prop_name="OccRateProp", unit_num="1", res_name="OA")
+    unit2 = Unit(property=prop, unit_number="2")
+    res2 = Resident(first_name="OB", last_name="Test")
+    db_session.add_all([unit2, res2])
+    db_session.commit()
+    db_session.add_all([
+        # Overlapping stays on unit 1 must not be double counted
+        Occupancy(resident=res1, unit=unit1, move_in_date=date(2024, 1, 20), move_out_date=date(2024, 2, 10)),
+        Occupancy(resident=res2, unit=unit1, move_in_date=date(2024, 2, 5), move_out_date=date(2024, 2, 20)),
+        # Unit 2 occupied all month but inactive for a stretch (with a same-day toggle)
+        Occupancy(resident=res2, unit=unit2, move_in_date=date(2023, 6, 1)),
+        UnitStatus(unit=unit2, status='inactive', start_date=date(2024, 1, 31)),
+        UnitStatus(unit=unit2, status='active', start_date=date(2024, 2, 8)),
+        UnitStatus(unit=unit2, status='inactive', start_date=date(2024, 2, 15)),
+        UnitStatus(unit=unit2, status='active', start_date=date(2024, 2, 15)),
+        UnitStatus(unit=unit2, status='inactive', start_date=date(2024, 2, 27)),
+    ])
+    db_session.commit()
+
+    for year, month in [(2024, 1), (2024, 2), (2024, 3)]:
+        result = occupancy_rate_for_month(prop.id, year, month)
+        days_in_month = calendar.monthrange(year, month)[1]
+        first, last = date(year, month, 1), date(year, month, days_in_month)
+        rows = generate_rent_roll(prop.id, first, last, engine='legacy')
+        expected = len({(r['unit_id'], r['date']) for r in rows if r['resident_id'] is not None})
+        assert result['occupied_days'] == expected
+        assert result['total_units_days'] == 2 * days_in_month
+
+
+def test_move_in_out_counts_by_property_groups_in_sql(db_session):
+    """Grouped counts ignore history outside the window and cover several properties at once."""
+    prop_a, unit_a, res_a = setup_property_unit_resident(db_session, prop_name="MovesA", unit_num="1", res_name="MA")
+    prop_b, unit_b, res_b = setup_property_unit_resident(db_session, prop_name="MovesB", unit_num="1", res_name="MB")
+    prop_c = Property(name="MovesC")
+    res_a2 = Resident(first_name="MA2", last_name="Test")
+    db_session.add_all([prop_c, res_a2])
+    db_session.add_all([
+        Occupancy(resident=res_a, unit=unit_a, move_in_date=date(2010, 1, 1), move_out_date=date(2024, 6, 30)),
+        Occupancy(resident=res_a2, unit=unit_a, move_in_date=date(2024, 7, 1)),
+        Occupancy(resident=res_b, unit=unit_b, move_in_date=date(2015, 3, 1), move_out_date=date(2016, 3, 1)),
+        Occupancy(resident=res_b, unit=unit_b, move_in_date=date(2024, 6, 1), move_out_date=date(2024, 6, 20)),
+    ])
+    db_session.commit()
+
+    counts = move_in_out_counts_by_property(date(2024, 6, 1), date(2024, 7, 31), [prop_a.id, prop_b.id, prop_c.id])
+    assert counts == {
+        prop_a.id: {'move_ins': 1, 'move_outs': 1},
+        prop_b.id: {'move_ins': 1, 'move_outs': 1},
+    }
+    assert move_in_out_counts(prop_c.id, date(2024, 6, 1), date(2024, 7, 31)) == {'move_ins': 0, 'move_outs': 0}
+    assert move_in_out_counts(prop_a.id, date(2010, 1, 1), date(2024, 6, 30)) == {'move_ins': 1, 'move_outs': 1}
+
+
+def test_fact_table_matches_source_tables_and_goes_stale_on_direct_writes(db_session):
+    """
+    Rent rolls and occupancy rates read from the rebuilt fact table equal the ones computed
+    from the source tables; an ORM write that bypasses the refresh marks the unit stale so
+    reports fall back until the unit is refreshed.
+    """
+    from src.services.facts import rebuild_facts, refresh_unit_facts, facts_are_fresh, load_fact_spans
+
+    prop, unit1, res1 = setup_property_unit_resident(db_session, prop_name="FactProp", unit_num="1", res_name="FA")
+    unit2 = Unit(property=prop, unit_number="2")
+    res2 = Resident(first_name="FB", last_name="Test")
+    occ1 = Occupancy(resident=res1, unit=unit1, move_in_date=date(2023, 12, 1), move_out_date=date(2024, 1, 10))
+    occ2 = Occupancy(resident=res2, unit=unit1, move_in_date=date(2024, 1, 10))
+    db_session.add_all([
+        unit2, res2, occ1, occ2,
+        Rent(occupancy=occ1, amount=900, effective_date=date(2023, 12, 1)),
+        Rent(occupancy=occ2, amount=1000, effective_date=date(2024, 1, 10)),
+        Rent(occupancy=occ2, amount=1100, effective_date=date(2024, 1, 15)),
+        UnitStatus(unit=unit2, status='inactive', start_date=date(2024, 1, 12)),
+        UnitStatus(unit=unit2, status='active', start_date=date(2024, 1, 18)),
+    ])
+    db_session.commit()
+    assert not facts_are_fresh(prop.id)
+
+    assert rebuild_facts(prop.id) == 2
+    db_session.commit()
+    assert facts_are_fresh(prop.id)
+    assert load_fact_spans(prop.id, date(2024, 1, 1), date(2024, 1, 31)) is not None
+    for start, end in [(date(2024, 1, 1), date(2024, 1, 31)), (date(2023, 11, 20), date(2024, 2, 5))]:
+        assert generate_rent_roll(prop.id, start, end) == generate_rent_roll(prop.id, start, end, engine='legacy')
+    occupied = len({(r['unit_id'], r['date'])
+                    for r in generate_rent_roll(prop.id, date(2024, 1, 1), date(2024, 1, 31), engine='legacy')
+                    if r['resident_id'] is not None})
+    assert occupancy_rate_for_month(prop.id, 2024, 1)['occupied_days'] == occupied
+
+    db_session.add(Rent(occupancy=occ2, amount=1200, effective_date=date(2024, 1, 20)))
+    db_session.commit()
+    assert not facts_are_fresh(prop.id)
+    assert load_fact_spans(prop.id, date(2024, 1, 1), date(2024, 1, 31)) is None
+    fallback = generate_rent_roll(prop.id, date(2024, 1, 1), date(2024, 1, 31))
+    assert fallback == generate_rent_roll(prop.id, date(2024, 1, 1), date(2024, 1, 31), engine='legacy')
+
+    refresh_unit_facts([unit1.id])
+    db_session.commit()
+    assert facts_are_fresh(prop.id)
+    assert generate_rent_roll(prop.id, date(2024, 1, 1), date(2024, 1, 31)) == fallback
+
+
+def test_report_cache_evicts_least_recently_used_by_count_and_size():
+    from src.services.report_cache import ReportCache
+    cache = ReportCache(max_entries=2, max_bytes=10, max_entry_bytes=6)
+    cache.set('a', 1, 'application/json', b'aaaa')
+    cache.set('b', 1, 'application/json', b'bb')
+    assert cache.get('a', 1) == ('application/json', b'aaaa')
+    cache.set('c', 1, 'application/json', b'c')
+    # 'b' was the least recently used entry
+    assert cache.get('b', 1) is None
+    assert cache.get('a', 1) is not None and cache.get('c', 1) is not None
+    cache.set('d', 1, 'application/json', b'dddddd')
+    assert cache.stats()['bytes'] <= 10
+    assert cache.get('d', 1) is not None
+    # Oversized bodies are not stored, and a version mismatch is a miss that drops the entry
+    cache.set('e', 1, 'application/json', b'eeeeeee')
+    assert cache.get('e', 1) is None
+    assert cache.get('d', 2) is None
+    assert cache.get('d', 1) is None
+
+
+def test_sqlite_report_cache_expires_and_evicts(tmp_path, monkeypatch):
+    from src.services import report_cache
+    cache = report_cache.SQLiteReportCache(str(tmp_path / 'cache.db'), max_entries=2, max_bytes=100, ttl=60)
+    now = [1000.0]
+    monkeypatch.setattr(report_cache.time, 'time', lambda: now[0])
+    cache.set(('rent-roll', (1,), ()), (3,), 'text/csv', b'a,b\n')
+    assert cache.get(('rent-roll', (1,), ()), (3,)) == ('text/csv', b'a,b\n')
+    assert cache.get(('rent-roll', (1,), ()), (4,)) is None
+    cache.set('x', (1,), 'application/json', b'[]')
+    now[0] += 1
+    cache.set('y', (1,), 'application/json', b'[1]')
+    now[0] += 1
+    assert cache.get('x', (1,)) is not None
+    cache.set('z', (1,), 'application/json', b'[2]')
+    # 'y' was the least recently used
+    assert cache.get('y', (1,)) is None
+    assert cache.stats()['entries'] == 2
+    now[0] += 60
+    assert cache.get('x', (1,)) is None
+
+
+@pytest.mark.parametrize("executor", ['thread', 'process'])
+def test_portfolio_rent_roll_parallel_matches_serial(tmp_path, executor):
+    """
+    The parallel portfolio rent roll equals the per-property rent rolls concatenated in the
+    requested property order. Uses a file database so every worker gets its own connection.
+    """
+    from src import create_app, db
+    from src.config import TestingConfig
+    from src.services.rent_roll import iter_portfolio_rent_roll
+
+    class FileConfig(TestingConfig):
+        SQLALCHEMY_DATABASE_URI = 'sqlite:///' + str(tmp_path / 'portfolio.db')
+
+    app = create_app(config_class=FileConfig)
+    with app.app_context():
+        props = [Property(name=f"Portfolio {i}") for i in range(4)]
+        db.session.add_all(props)
+        for i, prop in enumerate(props):
+            for n in range(1, 3 + i):
+                unit = Unit(property=prop, unit_number=str(n))
+                res = Resident(first_name=f"Port{chr(65 + i)}", last_name=f"Res{chr(65 + n)}")
+                occ = Occupancy(resident=res, unit=unit, move_in_date=date(2024, 1, n))
+                db.session.add_all([unit, res, occ, Rent(occupancy=occ, amount=1000 + n, effective_date=date(2024, 1, n))])
+        db.session.commit()
+        ids = [props[2].id, props[0].id, 999999, props[3].id, props[1].id]
+
+        expected = []
+        for pid in ids:
+            expected.extend(generate_rent_roll(pid, date(2024, 1, 1), date(2024, 1, 10)))
+        merged = list(iter_portfolio_rent_roll(ids, date(2024, 1, 1), date(2024, 1, 10), workers=2, executor=executor))
+        assert merged == expected
+        db.session.remove()
+        db.engine.dispose()
+
+
+def test_portfolio_process_pool_inherits_app_config(tmp_path):
+    """Process-pool workers honour USE_FACT_TABLE=False like the thread pool does."""
+    from src import create_app, db
+    from src.config import TestingConfig
+    from src.models import RentRollFact
+    from src.services.facts import rebuild_facts
+    from src.services.rent_roll import iter_portfolio_rent_roll
+    from sqlalchemy import update
+
+    class FileConfig(TestingConfig):
+        SQLALCHEMY_DATABASE_URI = 'sqlite:///' + str(tmp_path / 'process_config.db')
+        USE_FACT_TABLE = False
+
+    app = create_app(config_class=FileConfig)
+    with app.app_context():
+        prop = Property(name="Process Config")
+        unit = Unit(property=prop, unit_number="1")
+        res = Resident(first_name="Proc", last_name="Config")
+        occ = Occupancy(resident=res, unit=unit, move_in_date=date(2024, 1, 1))
+        db.session.add_all([prop, unit, res, occ, Rent(occupancy=occ, amount=1000, effective_date=date(2024, 1, 1))])
+        db.session.flush()
+        rebuild_facts()
+        # Facts still marked fresh but wrong: only a worker that reads them would report 1
+        db.session.execute(update(RentRollFact).values(monthly_rent=1))
+        db.session.commit()
+
+        expected = generate_rent_roll(prop.id, date(2024, 1, 1), date(2024, 1, 5))
+        assert {row['monthly_rent'] for row in expected} == {1000}
+        merged = list(iter_portfolio_rent_roll([prop.id], date(2024, 1, 1), date(2024, 1, 5),
+                                               workers=1, executor='process'))
+        assert merged == expected
+        db.session.remove()
+        db.engine.dispose()
+
+
+def test_synthetic_portfolio_is_deterministic_and_valid(db_session):
+    """The generator reproduces the same data for a seed and keeps to the write endpoints' rules."""
+    from src.services.synthetic import generate_portfolio
+    from src.services.stays import overlapping_items
+
+    def snapshot(prefix):
+        props = db_session.query(Property).filter(Property.name.like(f'{prefix} %')).order_by(Property.id).all()
+        units = [u for p in props for u in p.units.order_by(Unit.id)]
+        return [
+            (u.unit_number,
+             [(s.status, s.start_date) for s in u.status_history.order_by(UnitStatus.start_date)],
+             [(o.move_in_date, o.move_out_date, [(r.effective_date, r.amount) for r in o.rent_history])
+              for o in u.occupancies.order_by(Occupancy.move_in_date)])
+            for u in units
+        ]
+
+    counts = generate_portfolio(properties=2, units_per_property=5, years=3, status_toggles_per_year=1,
+                                seed=7, name_prefix='SynA')
+    generate_portfolio(properties=2, units_per_property=5, years=3, status_toggles_per_year=1,
+                       seed=7, name_prefix='SynB')
+    db_session.commit()
+    assert counts['units'] == 10 and counts['occupancies'] > 10 and counts['unit_statuses'] > 0
+    assert snapshot('SynA') == snapshot('SynB')
+
+    for unit_number, statuses, stays in snapshot('SynA'):
+        assert not overlapping_items({unit_number: [(move_in, move_out, i) for i, (move_in, move_out, _) in enumerate(stays)]})
+        for move_in, move_out, rents in stays:
+            assert rents[0] == (move_in, rents[0][1])
+            inactive = [start for status, start in statuses if status == 'inactive']
+            active = [start for status, start in statuses if status == 'active']
+            assert not any(start <= move_in < end for start, end in zip(inactive, active))
+
+    with pytest.raises(ValueError, match='years must be at least 1'):
+        generate_portfolio(properties=1, units_per_property=2, years=0)
+
+
+def test_benchmark_reports_every_case(tmp_path):
+    """A tiny benchmark run produces wall times, query counts and peak memory for each case."""
+    from src.benchmark import run_benchmarks
+    from src.config import TestingConfig
+    results = run_benchmarks(TestingConfig, scales={'tiny': {'properties': 1, 'units_per_property': 3, 'years': 1}},
+                             repeat=1, database_dir=str(tmp_path))
+    json.dumps(results)
+    (scale,) = results['scales']
+    assert scale['rows']['units'] == 3
+    names = [case['name'] for case in scale['cases']]
+    assert 'rent_roll_sweep_year' in names and 'list_units_page' in names
+    for case in scale['cases']:
+        assert case['wall_seconds']['min'] > 0
+        assert case['queries'] >= 1
+        assert case['peak_memory_bytes'] > 0
+    with pytest.raises(ValueError):
+        run_benchmarks(TestingConfig, scales=['huge'])
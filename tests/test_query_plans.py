@@ -0,0 +1,161 @@
+# tests/test_query_plans.py
+"""
+Query-plan regression suite: records the SELECTs issued by the rent roll, the KPI
+services, the fact table, the occupancy routes and the rent ledgers, runs EXPLAIN QUERY PLAN on each one and fails if
+SQLite would fall back to a full table scan.
+"""
+import re
+from contextlib import contextmanager
+from datetime import date
+import pytest
+from sqlalchemy import event
+from src import db
+from src.models import Property, Unit, Resident, Occupancy, Rent, UnitStatus, ensure_indexes
+from src.services.rent_roll import generate_rent_roll
+from src.services.kpis import move_in_out_counts, occupancy_rate_for_month, kpi_series
+from src.services.facts import rebuild_facts, load_fact_spans
+
+SCAN_RE = re.compile(r'^SCAN (\w+)')
+
+
+@contextmanager
+def recorded_selects():
+    """Collects (statement, parameters) for every SELECT sent to the engine."""
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith('SELECT'):
+            statements.append((statement, parameters))
+
+    event.listen(db.engine, 'before_cursor_execute', before_cursor_execute)
+    try:
+        yield statements
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', before_cursor_execute)
+
+
+def assert_no_full_scans(db_session, statements):
+    assert statements, "no queries were recorded"
+    problems = []
+    for statement, parameters in dict(statements).items():
+        plan = db_session.connection().exec_driver_sql('EXPLAIN QUERY PLAN ' + statement, parameters).all()
+        for row in plan:
+            match = SCAN_RE.match(row[3])
+            if match and match.group(1) in db.metadata.tables:
+                problems.append(f"{row[3]!r} in: {' '.join(statement.split())}")
+    assert not problems, "full table scans:\n" + "\n".join(problems)
+
+
+@pytest.fixture
+def portfolio(db_session):
+    prop = Property(name="PlanProp")
+    units = [Unit(property=prop, unit_number=str(i)) for i in range(1, 4)]
+    residents = [Resident(first_name=f"Plan{chr(65 + i)}", last_name="Test") for i in range(3)]
+    occ1 = Occupancy(resident=residents[0], unit=units[0], move_in_date=date(2024, 1, 1), move_out_date=date(2024, 2, 1))
+    occ2 = Occupancy(resident=residents[1], unit=units[1], move_in_date=date(2024, 1, 15))
+    db_session.add_all([prop] + units + residents + [
+        occ1, occ2,
+        Rent(occupancy=occ1, amount=1000, effective_date=date(2024, 1, 1)),
+        Rent(occupancy=occ2, amount=1100, effective_date=date(2024, 1, 15)),
+        Rent(occupancy=occ2, amount=1200, effective_date=date(2024, 3, 1)),
+        UnitStatus(unit=units[2], status='inactive', start_date=date(2024, 1, 10)),
+    ])
+    db_session.commit()
+    return prop, units, residents, occ2
+
+
+@pytest.mark.parametrize("engine", ['sweep', 'legacy'])
+def test_rent_roll_queries_use_indexes(db_session, portfolio, engine):
+    prop, _, _, _ = portfolio
+    with recorded_selects() as statements:
+        generate_rent_roll(prop.id, date(2024, 1, 1), date(2024, 1, 3), engine=engine)
+    assert_no_full_scans(db_session, statements)
+
+
+def test_fact_table_queries_use_indexes(db_session, portfolio):
+    prop, _, _, _ = portfolio
+    rebuild_facts(prop.id)
+    with recorded_selects() as statements:
+        assert load_fact_spans(prop.id, date(2024, 1, 1), date(2024, 1, 3)) is not None
+        generate_rent_roll(prop.id, date(2024, 1, 1), date(2024, 1, 3))
+        occupancy_rate_for_month(prop.id, 2024, 1)
+    assert_no_full_scans(db_session, statements)
+
+
+def test_kpi_queries_use_indexes(db_session, portfolio):
+    prop, _, _, _ = portfolio
+    with recorded_selects() as statements:
+        occupancy_rate_for_month(prop.id, 2024, 1)
+        move_in_out_counts(prop.id, date(2024, 1, 1), date(2024, 1, 31))
+        kpi_series(prop.id, date(2024, 1, 1), date(2024, 3, 31), 'week')
+    assert_no_full_scans(db_session, statements)
+
+
+def test_occupancy_route_queries_use_indexes(client, db_session, portfolio):
+    _, units, residents, occ = portfolio
+    with recorded_selects() as statements:
+        client.post('/occupancy/move-in', json={
+            "resident_id": residents[2].id, "unit_id": units[0].id, "move_in_date": "2024-02-01", "initial_rent": 900
+        })
+        client.post(f'/occupancy/{occ.id}/rent-change', json={"new_rent": 1300, "effective_date": "2024-04-01"})
+        client.get(f'/occupancy/{occ.id}/rents')
+        client.patch(f'/occupancy/{occ.id}', json={"move_in_date": "2024-01-14"})
+        client.patch(f'/occupancy/{occ.id}', json={"unit_id": units[0].id, "move_in_date": "2024-01-14"})
+        client.put(f'/occupancy/{occ.id}/move-out', json={"move_out_date": "2024-06-01"})
+        client.post('/occupancy/move-in/batch', json={"items": [
+            {"resident_id": residents[2].id, "unit_id": units[1].id, "move_in_date": "2024-07-01", "initial_rent": 900},
+        ]})
+        client.post('/occupancy/rent-change/batch', json={"items": [
+            {"occupancy_id": occ.id, "new_rent": 1400, "effective_date": "2024-05-01"},
+        ]})
+    assert_no_full_scans(db_session, statements)
+
+
+def test_rent_ledger_queries_use_indexes(client, db_session, portfolio):
+    prop, units, _, _ = portfolio
+    with recorded_selects() as statements:
+        client.get(f'/units/{units[1].id}/rents')
+        client.get(f'/properties/{prop.id}/rents').get_data()
+    assert_no_full_scans(db_session, statements)
+
+def test_report_query_counts_do_not_grow_with_units(db_session, portfolio):
+    """The sweep rent roll and the occupancy KPI run the same statements however many units a property has."""
+    from src.instrumentation import count_queries, assert_max_queries
+    prop, _, _, _ = portfolio
+
+    def report_query_counts():
+        with count_queries() as rent_roll:
+            generate_rent_roll(prop.id, date(2024, 1, 1), date(2024, 3, 31))
+        with count_queries() as kpi:
+            occupancy_rate_for_month(prop.id, 2024, 2)
+        return rent_roll.count, kpi.count
+
+    small = report_query_counts()
+    for i in range(4, 24):
+        unit = Unit(property=prop, unit_number=str(i))
+        occ = Occupancy(resident=Resident(first_name=f"Grow{chr(65 + i % 26)}", last_name=f"Unit{chr(65 + i // 26)}"),
+                        unit=unit, move_in_date=date(2024, 1, i % 28 + 1))
+        db_session.add_all([unit, occ, Rent(occupancy=occ, amount=900 + i, effective_date=occ.move_in_date),
+                            Rent(occupancy=occ, amount=1000 + i, effective_date=date(2024, 3, 1))])
+        if i % 3 == 0:
+            db_session.add(UnitStatus(unit=unit, status='inactive', start_date=date(2024, 3, 15)))
+    db_session.commit()
+    assert report_query_counts() == small
+
+    with pytest.raises(AssertionError, match='expected at most 0'):
+        with assert_max_queries(0):
+            generate_rent_roll(prop.id, date(2024, 1, 1), date(2024, 1, 2))
+
+
+def test_ensure_indexes_adds_missing_indexes(db_session):
+    """Databases created before the indexes existed get them on startup."""
+    connection = db_session.connection()
+    connection.exec_driver_sql('DROP INDEX ix_rent_occupancy_effective')
+    assert 'ix_rent_occupancy_effective' not in _index_names(connection, 'rent')
+    ensure_indexes(connection)
+    assert 'ix_rent_occupancy_effective' in _index_names(connection, 'rent')
+
+
+def _index_names(connection, table):
+    return {row[1] for row in connection.exec_driver_sql(f"PRAGMA index_list('{table}')")}
+